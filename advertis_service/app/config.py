@@ -25,6 +25,134 @@ CHROMA_HOST = _parsed_chroma.hostname or "chroma_db"
 CHROMA_PORT = _parsed_chroma.port or 8000
 
 
+# --- LLM Request Hedging ---
+# Comma-separated list of graph nodes that opt in to hedging, e.g. "host_llm".
+# A duplicate request is fired once the first attempt exceeds the given
+# percentile of recently observed latency for that node.
+HEDGE_NODES = [node.strip() for node in os.getenv("HEDGE_NODES", "").split(",") if node.strip()]
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_PER_MINUTE = float(os.getenv("HEDGE_MAX_PER_MINUTE", "30"))
+
+
+# --- LLM Rate-Limit Scheduler ---
+# JSON object of per-model provider limits, e.g.
+# '{"gpt-4.1": {"rpm": 500, "tpm": 30000}, "gpt-4.1-mini": {"rpm": 500, "tpm": 200000}}'.
+# Models without an entry are not rate limited.
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "{}")
+LLM_SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", "30"))
+
+# --- Logging ---
+# Base level for the service's structured (JSON) logs.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Per-node overrides, e.g. "orchestrator=DEBUG,host_llm=WARNING".
+LOG_NODE_LEVELS = os.getenv("LOG_NODE_LEVELS", "")
+# Fraction of DEBUG-enabled requests that also dump full prompts and candidates.
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.0"))
+# Requests from this session always log the old verbose, human-readable output.
+LOG_DEBUG_SESSION_ID = os.getenv("LOG_DEBUG_SESSION_ID")
+
+# --- Transcript Cache ---
+# Messages kept per session (besides the system prompt) when the SDK sends
+# only new messages; this is the history the agent then sees.
+TRANSCRIPT_MAX_MESSAGES = int(os.getenv("TRANSCRIPT_MAX_MESSAGES", "40"))
+
+
+# --- Safety Gate ---
+# Optional JSON file of keyword sets by scope ("*", "<vertical>", "<vertical>:<locale>");
+# see app/services/safety_rules.py. Changes are picked up without a restart.
+SAFETY_KEYWORDS_PATH = os.getenv("SAFETY_KEYWORDS_PATH")
+SAFETY_RULES_RELOAD_SECONDS = float(os.getenv("SAFETY_RULES_RELOAD_SECONDS", "10"))
+# Locale assumed when a request doesn't name one.
+SAFETY_DEFAULT_LOCALE = os.getenv("SAFETY_DEFAULT_LOCALE", "en")
+
+
+# --- Local Gate Classifier ---
+# Artifact written by scripts/train_gate_classifier.py. When set, confident
+# decision-gate outcomes are answered locally and only ambiguous turns reach the LLM.
+GATE_CLASSIFIER_PATH = os.getenv("GATE_CLASSIFIER_PATH")
+# JSONL file collecting the LLM gate's decisions as training data for the classifier.
+GATE_DECISION_LOG_PATH = os.getenv("GATE_DECISION_LOG_PATH")
+
+
+# --- Speculative Pipeline ---
+# When enabled, a passing check-opportunity that carries `recent_history` starts
+# the decision gate and retrieval in the background; the turn's /get-response
+# reuses that work. Unclaimed work is dropped after the TTL and counted as waste.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() == "true"
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "20"))
+
+
+# --- Idempotent Turns ---
+# How long a finished /get-response result is kept for retries of the same turn.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "120"))
+
+
+# --- Economy Mode ---
+# A cheaper way to write the placement: "template" renders the orchestrator's
+# example narration without calling the host LLM; "model" runs the host prompt
+# on ECONOMY_MODEL instead of the full model (the default of the "economy" model route).
+ECONOMY_STRATEGY = os.getenv("ECONOMY_STRATEGY", "template")
+ECONOMY_MODEL = os.getenv("ECONOMY_MODEL", "gpt-4.1-mini")
+# Comma-separated tenant IDs that are always served in economy mode.
+ECONOMY_TENANTS = {tenant.strip() for tenant in os.getenv("ECONOMY_TENANTS", "").split(",") if tenant.strip()}
+# Switch to economy automatically while the LLM scheduler has this many calls
+# waiting, or while the p95 of recent standard turns that generated a response
+# exceeds the SLO (0 disables each).
+ECONOMY_QUEUE_DEPTH = int(os.getenv("ECONOMY_QUEUE_DEPTH", "0"))
+ECONOMY_TURN_P95_SECONDS = float(os.getenv("ECONOMY_TURN_P95_SECONDS", "0"))
+# Only turns this recent count towards the p95, so the SLO check recovers once load drops.
+ECONOMY_LATENCY_WINDOW_SECONDS = float(os.getenv("ECONOMY_LATENCY_WINDOW_SECONDS", "60"))
+
+
+# --- Model Routing ---
+# JSON overrides for the model each graph node uses; see app/services/model_router.py.
+# Routes list a fallback chain of models and optional budgets, and can be
+# overridden per tenant and per UTC hour range, e.g.
+# '{"nodes": {"host_llm": {"models": ["gpt-4.1", "gpt-4.1-mini"], "latency_budget_seconds": 6}},
+#   "tenants": {"budget-co": {"host_llm": {"models": ["gpt-4.1-mini"]}}},
+#   "schedule": [{"hours": [0, 6], "nodes": {"host_llm": {"models": ["gpt-4.1-mini"]}}}]}'.
+MODEL_ROUTES = os.getenv("MODEL_ROUTES", "{}")
+# JSON of USD prices per million tokens, merged over the built-in list prices, e.g.
+# '{"gpt-4.1": {"input": 2.0, "output": 8.0}}'.
+MODEL_PRICES = os.getenv("MODEL_PRICES", "{}")
+# Latency and cost budgets are judged over calls this recent, so a model that
+# was skipped as too slow is retried once its old samples age out.
+ROUTING_WINDOW_SECONDS = float(os.getenv("ROUTING_WINDOW_SECONDS", "300"))
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "20"))
+# Consecutive errors after which a model is skipped for the cooldown.
+ROUTING_FAILURE_THRESHOLD = int(os.getenv("ROUTING_FAILURE_THRESHOLD", "3"))
+ROUTING_COOLDOWN_SECONDS = float(os.getenv("ROUTING_COOLDOWN_SECONDS", "30"))
+
+
+# --- Embeddings ---
+# "openai", "hashing" (local CPU feature hashing) or "onnx" (all-MiniLM-L6-v2 from
+# EMBEDDING_ONNX_DIR, which must hold onnx/model.onnx and onnx/tokenizer.json).
+# Each provider is its own vector space: a collection seeded with one cannot be
+# queried with another, so give each provider its own CHROMA_COLLECTION.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+EMBEDDING_OPENAI_MODEL = os.getenv("EMBEDDING_OPENAI_MODEL", "text-embedding-3-small")
+EMBEDDING_HASHING_DIM = int(os.getenv("EMBEDDING_HASHING_DIM", "1024"))
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "advertis_products")
+# OpenAI query texts arriving within this many milliseconds of each other are
+# embedded in one provider call (0 sends every call straight through).
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+# Provider calls in flight at once; while all are busy, waiting texts keep
+# collecting into the next (larger) batch.
+EMBEDDING_BATCH_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_MAX_CONCURRENCY", "8"))
+
+
+# --- Scene Vectors ---
+# Retrieval queries with the last message blended with a rolling embedding of
+# the session's scene, at this weight (0 queries with the last message alone).
+SCENE_BLEND_WEIGHT = float(os.getenv("SCENE_BLEND_WEIGHT", "0"))
+# How much of the scene each new message keeps (an exponentially decayed mean).
+SCENE_DECAY = float(os.getenv("SCENE_DECAY", "0.7"))
+SCENE_TTL_SECONDS = int(os.getenv("SCENE_TTL_SECONDS", "7200"))
+
+
 # --- Simple Validation ---
 # A check to ensure the most critical variable is set before starting.
 if not OPENAI_API_KEY:
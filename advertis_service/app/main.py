@@ -1,6 +1,16 @@
-from fastapi import FastAPI, HTTPException
-from app.models import CheckRequest, CheckResponse, AdRequest, AdResponse
-from app.services import redis_client
+import time
+from typing import Optional
+
+import redis
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from app.models import CheckRequest, CheckResponse, AdRequest, AdResponse, EligibilityHints
+from app import config
+from app.services import generation_mode, idempotency, metrics, redis_client, safety_rules, speculation, tracing, transcripts
+from app.services.structured_logging import configure_logging, get_logger
+
+configure_logging()
+logger = get_logger("api")
 
 # --- NEW: Production-Grade Dependency Setup ---
 from app.services.verticals.gaming.agent import GamingAgent
@@ -28,32 +38,146 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observes the latency of every request, labelled by its route template."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=route.path if route else "unmatched",
+            status=str(status),
+        )
+
+@app.middleware("http")
+async def attach_trace_context(request: Request, call_next):
+    """
+    Binds the SDK's trace ID (or a new one) to the request and reports the
+    per-step breakdown of where the time went in a `Server-Timing` header.
+    """
+    started = time.perf_counter()
+    trace_id = tracing.start_trace(request.headers.get(tracing.TRACE_HEADER))
+    response = await call_next(request)
+    response.headers[tracing.TRACE_HEADER] = trace_id
+    response.headers["Server-Timing"] = tracing.server_timing_header(
+        tracing.current_timings(), time.perf_counter() - started
+    )
+    return response
+
 @app.get("/health", summary="Health Check")
 async def health_check():
     """A simple endpoint to confirm the service is running."""
     return {"status": "ok"}
 
+@app.get("/metrics", summary="Prometheus Metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Exposes latency histograms and counters in the Prometheus text format."""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/v1/rules/safety", summary="Safety Gate Ruleset")
+async def safety_rules_endpoint(request: Request, vertical: Optional[str] = None, locale: Optional[str] = None):
+    """
+    Publishes the safety gate's ruleset for a vertical and locale so the SDK
+    can run the gate locally. Clients revalidate with `If-None-Match` and get
+    a 304 while it is unchanged.
+    """
+    ruleset = safety_rules.current(vertical, locale)
+    etag = f'"{ruleset.version}"'
+    headers = {"ETag": etag, "Cache-Control": "max-age=300"}
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(ruleset.document, headers=headers)
+
 @app.post("/v1/check-opportunity", response_model=CheckResponse, summary="Pre-flight Check")
 async def check_opportunity_endpoint(request: CheckRequest):
     """
     Runs fast, non-AI checks to see if an ad is even possible.
     This should be called on every conversational turn.
     """
+    tracing.bind_session(request.session_id)
+
+    # 0. Count the turns the SDK skipped locally, so the turn cap stays accurate
+    if request.skipped_turns:
+        redis_client.update_state(request.session_id, ad_shown=False, turns=request.skipped_turns)
+
     # 1. Run the simple keyword-based safety gate
-    is_safe, reason = redis_client.run_safety_gate(request.last_message)
+    is_safe, reason = redis_client.run_safety_gate(request.last_message, request.app_vertical, request.locale)
+    if is_safe:
+        # 1b. Reject turns the decision gate would skip anyway, judging by the history
+        summary = request.history_summary
+        is_safe, reason = redis_client.run_history_gate(request.last_message, summary.turn_count if summary else None)
+    if is_safe:
+        # 2. Run the frequency and cooldown gate against Redis
+        proceed, reason = redis_client.run_frequency_gate(request.session_id)
+    else:
+        proceed = False
+
+    if not proceed:
+        metrics.GATE_REJECTIONS.inc(reason=reason)
+        # A rejected turn never reaches /get-response, so record it here
+        redis_client.update_state(request.session_id, ad_shown=False)
+    elif config.SPECULATION_ENABLED and request.recent_history and request.app_vertical:
+        # 3. Get a head start on the /get-response call that will follow
+        agent = get_agent_from_registry(request.app_vertical)
+        if agent:
+            history, tenant_id = request.recent_history, request.tenant_id
+            speculation.registry.start(request.session_id, history, lambda: agent.speculate(history, tenant_id=tenant_id))
+
+    hints = EligibilityHints(**redis_client.eligibility_hints(request.session_id))
+    return CheckResponse(
+        proceed=proceed, reason=reason, hints=hints,
+        rules_version=safety_rules.current(request.app_vertical, request.locale).version,
+    )
+
+async def run_turn(request: AdRequest, agent, history: list) -> dict:
+    """Decides one turn: the safety gate, then the agent, then the frequency state update."""
+    # The safety gate is enforced here too: an SDK with stale rules (or a client
+    # that skips the pre-flight check) must not get an ad on an unsafe turn
+    last_message = history[-1].get("content") if history else None
+    is_safe, reason = redis_client.run_safety_gate(
+        last_message if isinstance(last_message, str) else None, request.app_vertical, request.locale
+    )
     if not is_safe:
-        return CheckResponse(proceed=False, reason=reason)
+        metrics.GATE_REJECTIONS.inc(reason=reason)
+        metrics.AGENT_OUTCOMES.inc(status="skip")
+        redis_client.update_state(request.session_id, ad_shown=False)
+        return {"status": "skip", "response_text": None, "generation_mode": None}
+
+    # Run the selected agent, reusing work started by check-opportunity, in
+    # economy mode if the request, its tenant, or the current load calls for it
+    precomputed = await speculation.registry.claim(request.session_id, history) if config.SPECULATION_ENABLED else None
+    mode = generation_mode.resolve(request.generation_mode, request.tenant_id)
+    started = time.perf_counter()
+    result = await agent.run(
+        history=history, precomputed=precomputed, generation_mode=mode.mode, tenant_id=request.tenant_id
+    )
+    if mode.mode == generation_mode.STANDARD and result["status"] == "inject":
+        # Only turns that reached the host LLM; fast skips would dilute the p95
+        generation_mode.turn_latency.observe(time.perf_counter() - started)
 
-    # 2. Run the frequency and cooldown gate against Redis
-    proceed, reason = redis_client.run_frequency_gate(request.session_id)
-    return CheckResponse(proceed=proceed, reason=reason)
+    # Update the frequency state in Redis
+    metrics.AGENT_OUTCOMES.inc(status=result["status"])
+    redis_client.update_state(request.session_id, ad_shown=result["status"] == "inject")
+    return {"status": result["status"], "response_text": result["response_text"], "generation_mode": mode.mode}
 
 @app.post("/v1/get-response", response_model=AdResponse, summary="Generate Monetized Response")
-async def get_response_endpoint(request: AdRequest):
+async def get_response_endpoint(
+    request: AdRequest,
+    idempotency_key: Optional[str] = Header(default=None, alias=idempotency.HEADER),
+):
     """
     Runs the full AI agent graph to generate a response.
     This is the expensive call, only made if /check-opportunity succeeds.
     """
+    tracing.bind_session(request.session_id)
+
     # 1. Get the correct agent from the registry based on the request
     agent = get_agent_from_registry(request.app_vertical)
     if not agent:
@@ -62,22 +186,51 @@ async def get_response_endpoint(request: AdRequest):
             detail=f"Unsupported or invalid 'app_vertical': {request.app_vertical}"
         )
 
+    # 2. Rebuild the history from the cached transcript (or store the full one sent)
+    if request.conversation_history is not None:
+        history, transcript_hash = request.conversation_history, None
+        try:
+            history, transcript_hash = transcripts.replace(request.session_id, request.conversation_history)
+        except redis.RedisError as e:
+            # The SDK simply keeps sending full histories until caching works again
+            logger.warning("transcript_cache_unavailable", extra={"fields": {"error": str(e)}})
+    else:
+        try:
+            history, transcript_hash = transcripts.apply_delta(request.session_id, request.base_hash, request.new_messages)
+        except transcripts.TranscriptMismatch:
+            raise HTTPException(
+                status_code=409,
+                detail="Transcript mismatch: resend the full 'conversation_history'."
+            )
+        except redis.RedisError as e:
+            # The delta can't be rebuilt without the stored transcript, so the
+            # SDK resends the full history, which works without the cache
+            logger.warning("transcript_cache_unavailable", extra={"fields": {"error": str(e)}})
+            raise HTTPException(
+                status_code=409,
+                detail="Transcript cache unavailable: resend the full 'conversation_history'."
+            )
+
+    # 3. Run the turn once: concurrent duplicates share the run, and retries get
+    #    the cached result without running the graph or counting the turn again
+    key = idempotency.turn_key(request.session_id, history, idempotency_key)
     try:
-        # 2. Run the selected agent
-        result = await agent.run(history=request.conversation_history)
-        
-        # 3. Update the frequency state in Redis
-        ad_was_shown = (result["status"] == "inject")
-        redis_client.update_state(request.session_id, ad_shown=ad_was_shown)
+        result = idempotency.get_cached(key)
+        if result is not None:
+            metrics.IDEMPOTENT_REPLAYS.inc(source="cache")
+        else:
+            result = await idempotency.run_once(key, lambda: run_turn(request, agent, history))
 
         # 4. Return the final, structured response
         return AdResponse(
             status=result["status"],
-            response_text=result["response_text"]
+            response_text=result["response_text"],
+            transcript_hash=transcript_hash,
+            generation_mode=result.get("generation_mode"),
+            hints=EligibilityHints(**redis_client.eligibility_hints(request.session_id))
         )
 
     except Exception as e:
         # Basic error handling
-        print(f"An error occurred in get_response_endpoint: {e}")
-        # In production, you'd have more robust logging (e.g., to Sentry)
+        logger.error("get_response_failed", exc_info=True, extra={"fields": {"error": str(e)}})
         raise HTTPException(status_code=500, detail="An internal error occurred.")
\ No newline at end of file
@@ -1,29 +1,74 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 
 # --- Models for the /v1/check-opportunity endpoint ---
 
+class HistorySummary(BaseModel):
+    """A compact view of the conversation for the pre-flight check."""
+    turn_count: int = Field(ge=0)  # Non-system messages so far, including the latest
+
 class CheckRequest(BaseModel):
     """The request payload for the pre-flight check."""
     session_id: str
     # The blueprint mentions a simple keyword safety gate, which needs the last message.
     last_message: Optional[str] = None
+    # Turns the SDK skipped locally (based on earlier hints) since its last call.
+    skipped_turns: int = Field(default=0, ge=0, le=1000)
+    # Select the safety gate's keyword set; both are optional.
+    app_vertical: Optional[str] = None
+    locale: Optional[str] = None
+    history_summary: Optional[HistorySummary] = None
+    # The last few messages, verbatim; lets the service start the turn's work early.
+    recent_history: Optional[List[dict]] = Field(default=None, max_length=8)
+    # Same as AdRequest.tenant_id, so speculative work uses the tenant's model routes.
+    tenant_id: Optional[str] = None
+
+class EligibilityHints(BaseModel):
+    """When the frequency gate can next pass, so the SDK can skip doomed pre-flight calls."""
+    session_exhausted: bool = False
+    turns_until_eligible: int = 0
+    next_eligible_turn: int = 0
+    earliest_eligible_at: int = 0  # Unix timestamp (seconds)
+    seconds_until_eligible: int = 0  # Same, relative to the server's clock
 
 class CheckResponse(BaseModel):
     """The response from the pre-flight check."""
     proceed: bool
     reason: str
+    hints: Optional[EligibilityHints] = None
+    # Version of the safety ruleset in force, so the SDK can tell its copy is stale.
+    rules_version: Optional[str] = None
 
 
 # --- Models for the /v1/get-response endpoint ---
 
 class AdRequest(BaseModel):
-    """The request payload for the main response generation call."""
+    """
+    The request payload for the main response generation call. The history is
+    sent either in full (`conversation_history`) or as the messages added since
+    the last call (`new_messages`) plus the hash of the transcript they extend.
+    """
     session_id: str
     app_vertical: str
-    conversation_history: List[dict]
+    conversation_history: Optional[List[dict]] = None
+    new_messages: Optional[List[dict]] = None
+    base_hash: Optional[str] = None
+    locale: Optional[str] = None
+    # Force a generation mode; by default the service picks one per tenant and load.
+    generation_mode: Optional[Literal["standard", "economy"]] = None
+    tenant_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_history_form(self):
+        if self.conversation_history is None and (self.new_messages is None or self.base_hash is None):
+            raise ValueError("Send either 'conversation_history' or both 'new_messages' and 'base_hash'.")
+        return self
 
 class AdResponse(BaseModel):
     """The final response containing the status and generated text."""
     status: str  # Will be "inject" or "skip"
-    response_text: Optional[str] = None # Will be null if status is "skip"
\ No newline at end of file
+    response_text: Optional[str] = None # Will be null if status is "skip"
+    # Hash of the server-side transcript after this call; the base for the next delta.
+    transcript_hash: Optional[str] = None
+    hints: Optional[EligibilityHints] = None
+    generation_mode: Optional[str] = None  # "standard" or "economy"; null if the agent never ran
\ No newline at end of file
@@ -0,0 +1,139 @@
+# advertis_service/app/services/embedding_batcher.py
+# Micro-batches embedding requests. Every orchestrator turn embeds its query
+# text through the collection's embedding function; under load that is many
+# one-text requests to the provider. The batcher holds texts that arrive
+# within a short window (or until a batch fills), embeds them with one call,
+# and hands each caller its own vector. Identical texts in a batch are
+# embedded once.
+#
+# One collector thread forms the batches and hands each to a small pool of
+# callers, so a slow provider call doesn't hold up the batches behind it.
+# Callers block on a future (the agent's retrieval runs on worker threads);
+# async callers can await `embed_async` instead.
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from app import config
+from app.services import metrics
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self, embed: Callable[[List[str]], Sequence[Any]], window_seconds: float = 0.005,
+        max_batch_size: int = 64, max_concurrency: int = 8,
+    ):
+        self.embed_batch = embed
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, Future, float]] = []
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._calls = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embedding-call")
+        self._free_slots = threading.Semaphore(max_concurrency)
+
+    def submit(self, texts: Sequence[str]) -> List[Future]:
+        """Queues texts for the next batch; each future resolves to that text's vector."""
+        futures = [Future() for _ in texts]
+        now = time.monotonic()
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+            self._pending.extend((text, future, now) for text, future in zip(texts, futures))
+            self._condition.notify()
+        return futures
+
+    def embed(self, texts: Sequence[str]) -> List[Any]:
+        return [future.result() for future in self.submit(texts)]
+
+    async def embed_async(self, texts: Sequence[str]) -> List[Any]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in self.submit(texts))))
+
+    def _next_batch(self) -> List[Tuple[str, Future, float]]:
+        """Waits for a batch: the window after its first text has passed, or the batch is full."""
+        with self._condition:
+            while True:
+                if self._pending:
+                    remaining = self._pending[0][2] + self.window_seconds - time.monotonic()
+                    if remaining <= 0 or len(self._pending) >= self.max_batch_size:
+                        batch = self._pending[:self.max_batch_size]
+                        del self._pending[:self.max_batch_size]
+                        return batch
+                    self._condition.wait(timeout=remaining)
+                else:
+                    self._condition.wait()
+
+    def _run(self):
+        while True:
+            # Only take a batch once a call slot is free; until then texts keep
+            # joining the pending batch instead of queueing behind busy calls
+            self._free_slots.acquire()
+            self._calls.submit(self._embed, self._next_batch())
+
+    def _embed(self, batch: List[Tuple[str, Future, float]]):
+        try:
+            # Identical texts (e.g. the same opening line in many sessions) are embedded once
+            unique: Dict[str, int] = {}
+            for text, _, _ in batch:
+                unique.setdefault(text, len(unique))
+            now = time.monotonic()
+            metrics.EMBEDDING_BATCH_SIZE.observe(len(unique))
+            metrics.EMBEDDING_BATCH_WAIT.observe(now - batch[0][2])
+            try:
+                vectors = self.embed_batch(list(unique))
+                results = [vectors[unique[text]] for text, _, _ in batch]
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+            for (_, future, _), vector in zip(batch, results):
+                future.set_result(vector)
+        finally:
+            self._free_slots.release()
+
+
+class BatchingEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Wraps a Chroma embedding function so concurrent calls share batches. It
+    reports the wrapped function's name and config, so the collection's stored
+    embedding settings are unchanged.
+    """
+    def __init__(self, inner: EmbeddingFunction, window_seconds: float, max_batch_size: int, max_concurrency: int = 8):
+        self.inner = inner
+        self.batcher = EmbeddingBatcher(lambda texts: inner(texts), window_seconds, max_batch_size, max_concurrency)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.batcher.embed(list(input))
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        return self.__call__(input)
+
+    def name(self) -> str:
+        return self.inner.name()
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.inner.get_config()
+
+    def default_space(self):
+        return self.inner.default_space()
+
+    def supported_spaces(self):
+        return self.inner.supported_spaces()
+
+    def is_legacy(self) -> bool:
+        return self.inner.is_legacy()
+
+
+def wrap(inner: EmbeddingFunction) -> EmbeddingFunction:
+    """Adds micro-batching to an embedding function, unless it is disabled in config."""
+    if config.EMBEDDING_BATCH_WINDOW_MS <= 0:
+        return inner
+    return BatchingEmbeddingFunction(
+        inner, config.EMBEDDING_BATCH_WINDOW_MS / 1000.0, config.EMBEDDING_BATCH_MAX_SIZE,
+        config.EMBEDDING_BATCH_MAX_CONCURRENCY,
+    )
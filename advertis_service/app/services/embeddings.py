@@ -0,0 +1,169 @@
+# advertis_service/app/services/embeddings.py
+# Embedding providers for the product collection. "openai" calls the OpenAI
+# embeddings API (micro-batched); "hashing" is a local, CPU-only projection of
+# words, word pairs and character n-grams into a fixed number of signed hash
+# buckets; "onnx" runs Chroma's all-MiniLM-L6-v2 model from a local directory.
+#
+# Vectors from different providers (or settings) live in different spaces and
+# must never share a collection. Each provider names its space, the collection
+# records the space it was seeded with, and `check_space` refuses a mismatch.
+import functools
+import math
+import os
+import re
+import zlib
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+from chromadb.utils.embedding_functions import register_embedding_function
+from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+from app import config
+from app.services import embedding_batcher
+
+SPACE_KEY = "embedding_space"
+# Collections seeded before spaces were recorded used the OpenAI model.
+LEGACY_SPACE = "openai:text-embedding-3-small"
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in into is it its me my of on or our so that the their them "
+    "then there they this to up was we with you your".split()
+)
+
+
+class EmbeddingSpaceMismatch(ValueError):
+    """Raised when a collection holds vectors from a different embedding space than the configured provider."""
+
+
+class EmbeddingBackend(NamedTuple):
+    function: EmbeddingFunction
+    space: str  # Identifies the vector space, e.g. "advertis-hashing:v1:1024"
+
+
+@register_embedding_function
+class HashingEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Signed feature hashing of word unigrams and bigrams (stopwords dropped)
+    and character 4-grams, with sublinear term weights, L2-normalized.
+    Deterministic across processes, so seeding and querying agree.
+    """
+    VERSION = 1
+    # Character n-grams let "drinking" match "drink", but shouldn't outvote whole
+    # words (tuned with scripts/compare_embeddings.py).
+    NGRAM_WEIGHT = 0.5
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def embed_text(self, text: str) -> List[float]:
+        words = [w for w in _TOKEN.findall(text.lower()) if w not in STOPWORDS]
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 4]}" for i in range(len(padded) - 3)]
+        counts: Dict[str, int] = {}
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+
+        vector = [0.0] * self.dim
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            weight = self.NGRAM_WEIGHT if feature.startswith("c:") else 1.0
+            vector[h % self.dim] += sign * weight * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [self.embed_text(text) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "advertis-hashing"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim, "version": self.VERSION}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "HashingEmbeddingFunction":
+        return HashingEmbeddingFunction(dim=config["dim"])
+
+    def default_space(self):
+        return "cosine"
+
+    def supported_spaces(self):
+        return ["cosine", "l2", "ip"]
+
+
+class LocalONNXMiniLM(ONNXMiniLM_L6_V2):
+    """Chroma's MiniLM model, loaded from a local directory instead of being downloaded."""
+    def __init__(self, model_dir: str):
+        for filename in ("model.onnx", "tokenizer.json"):
+            if not os.path.exists(os.path.join(model_dir, self.EXTRACTED_FOLDER_NAME, filename)):
+                raise ValueError(f"EMBEDDING_ONNX_DIR has no '{self.EXTRACTED_FOLDER_NAME}/{filename}': {model_dir}")
+        self.DOWNLOAD_PATH = model_dir
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+
+
+def _openai() -> EmbeddingBackend:
+    model = config.EMBEDDING_OPENAI_MODEL
+    function = embedding_functions.OpenAIEmbeddingFunction(api_key=config.OPENAI_API_KEY, model_name=model)
+    # Concurrent queries share embedding calls
+    return EmbeddingBackend(embedding_batcher.wrap(function), f"openai:{model}")
+
+
+def _hashing() -> EmbeddingBackend:
+    function = HashingEmbeddingFunction(dim=config.EMBEDDING_HASHING_DIM)
+    return EmbeddingBackend(function, f"{function.name()}:v{function.VERSION}:{function.dim}")
+
+
+def _onnx() -> EmbeddingBackend:
+    if not config.EMBEDDING_ONNX_DIR:
+        raise ValueError("EMBEDDING_PROVIDER=onnx requires EMBEDDING_ONNX_DIR.")
+    return EmbeddingBackend(LocalONNXMiniLM(config.EMBEDDING_ONNX_DIR), f"onnx:{ONNXMiniLM_L6_V2.MODEL_NAME}")
+
+
+PROVIDERS: Dict[str, Callable[[], EmbeddingBackend]] = {
+    "openai": _openai,
+    "hashing": _hashing,
+    "onnx": _onnx,
+}
+
+
+def create_backend(provider: str = None) -> EmbeddingBackend:
+    """Builds the configured (or named) embedding provider."""
+    provider = provider or config.EMBEDDING_PROVIDER
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}'; expected one of {sorted(PROVIDERS)}.")
+    return PROVIDERS[provider]()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_backend(provider: str = None) -> EmbeddingBackend:
+    """
+    One backend per provider for the process, so the collection and anything
+    embedding outside it (scene vectors) share the function and its batcher.
+    """
+    return create_backend(provider)
+
+
+def check_space(collection, space: str):
+    """
+    Ensures the collection's vectors are in `space`. An empty collection that
+    doesn't record a space yet adopts this one.
+    """
+    metadata = dict(collection.metadata or {})
+    stored = metadata.get(SPACE_KEY)
+    if stored is None:
+        if collection.count() == 0:
+            collection.modify(metadata={**metadata, SPACE_KEY: space})
+            return
+        stored = LEGACY_SPACE
+    if stored != space:
+        raise EmbeddingSpaceMismatch(
+            f"Collection '{collection.name}' holds '{stored}' embeddings but the provider produces '{space}'. "
+            "Point CHROMA_COLLECTION at a collection for this provider, or reseed it."
+        )
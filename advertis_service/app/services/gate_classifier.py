@@ -0,0 +1,206 @@
+# advertis_service/app/services/gate_classifier.py
+# A CPU-only classifier that answers the decision gate's obvious cases (first
+# messages, out-of-character chatter, plain scene-setting) locally, so only
+# ambiguous turns pay for an LLM call. It is a logistic regression over hashed
+# word and character n-grams, trained offline by
+# scripts/train_gate_classifier.py from the dataset and logged LLM decisions.
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app import config
+from app.services.structured_logging import get_logger, log_event
+
+ARTIFACT_FORMAT = "advertis-gate-classifier"
+ARTIFACT_VERSION = 1
+DEFAULT_DIM = 2 ** 18
+
+logger = get_logger("gate_classifier")
+
+_TOKEN = re.compile(r"[a-z0-9']+|[^\sa-z0-9]")
+
+
+class GateVerdict(NamedTuple):
+    """`opportunity` is None when the classifier isn't confident and defers to the LLM."""
+    opportunity: Optional[bool]
+    probability: float
+
+
+def _bucket(n: int) -> str:
+    return str(n) if n < 4 else "4-7" if n < 8 else "8-15" if n < 16 else "16+"
+
+
+def extract_features(history: Sequence[Dict]) -> List[str]:
+    """
+    Features of the last message (word uni/bigrams, character trigrams), the
+    words of the message before it, and coarse conversation shape.
+    """
+    turns = [m for m in history if m.get("role") != "system"]
+    last = str(turns[-1].get("content") or "") if turns else ""
+    words = _TOKEN.findall(last.lower())
+
+    features = [f"turns:{_bucket(len(turns))}", f"len:{_bucket(len(words))}"]
+    features += [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(["<s>"] + words, words + ["</s>"])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    if len(turns) > 1:
+        features += [f"p:{w}" for w in _TOKEN.findall(str(turns[-2].get("content") or "").lower())]
+    return features
+
+
+def hash_features(features: Iterable[str], dim: int) -> Dict[int, float]:
+    """Hashes features into `dim` buckets (crc32, stable across processes), L2-normalized."""
+    vector: Dict[int, float] = {}
+    for feature in features:
+        index = zlib.crc32(feature.encode("utf-8")) % dim
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {i: v / norm for i, v in vector.items()}
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+class GateClassifier:
+    """
+    Logistic regression over hashed features, with two confidence thresholds:
+    probabilities at or above `opportunity_above` are answered "opportunity",
+    at or below `skip_below` are answered "skip", and anything between defers.
+    """
+    def __init__(
+        self,
+        weights: Dict[int, float],
+        bias: float,
+        dim: int = DEFAULT_DIM,
+        skip_below: float = 0.0,
+        opportunity_above: float = 1.0,
+        report: Optional[Dict] = None,
+    ):
+        self.weights = weights
+        self.bias = bias
+        self.dim = dim
+        self.skip_below = skip_below
+        self.opportunity_above = opportunity_above
+        self.report = report or {}
+
+    def probability(self, history: Sequence[Dict]) -> float:
+        vector = hash_features(extract_features(history), self.dim)
+        return _sigmoid(self.bias + sum(self.weights.get(i, 0.0) * v for i, v in vector.items()))
+
+    def decide(self, history: Sequence[Dict]) -> GateVerdict:
+        p = self.probability(history)
+        if p >= self.opportunity_above:
+            return GateVerdict(True, p)
+        if p <= self.skip_below:
+            return GateVerdict(False, p)
+        return GateVerdict(None, p)
+
+    # --- Artifact ---
+
+    def to_dict(self) -> Dict:
+        return {
+            "format": ARTIFACT_FORMAT,
+            "version": ARTIFACT_VERSION,
+            "dim": self.dim,
+            "bias": self.bias,
+            # Sparse: only non-zero buckets, keyed by index
+            "weights": {str(i): round(w, 6) for i, w in sorted(self.weights.items()) if w},
+            "thresholds": {"skip_below": self.skip_below, "opportunity_above": self.opportunity_above},
+            "report": self.report,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GateClassifier":
+        if data.get("format") != ARTIFACT_FORMAT or data.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported gate classifier artifact: {data.get('format')} v{data.get('version')}")
+        thresholds = data["thresholds"]
+        return cls(
+            weights={int(i): float(w) for i, w in data["weights"].items()},
+            bias=float(data["bias"]),
+            dim=int(data["dim"]),
+            skip_below=float(thresholds["skip_below"]),
+            opportunity_above=float(thresholds["opportunity_above"]),
+            report=data.get("report"),
+        )
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "GateClassifier":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def train(
+    examples: Sequence[Tuple[Sequence[Dict], bool]],
+    dim: int = DEFAULT_DIM,
+    epochs: int = 40,
+    learning_rate: float = 0.5,
+    l2: float = 1e-4,
+    seed: int = 7,
+) -> GateClassifier:
+    """Fits the weights with plain SGD on log loss. Thresholds are left for the caller to set."""
+    data = [(hash_features(extract_features(history), dim), 1.0 if label else 0.0) for history, label in examples]
+    weights: Dict[int, float] = {}
+    bias = 0.0
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        rate = learning_rate / (1.0 + epoch * 0.1)
+        for vector, label in data:
+            p = _sigmoid(bias + sum(weights.get(i, 0.0) * v for i, v in vector.items()))
+            gradient = p - label
+            bias -= rate * gradient
+            for i, v in vector.items():
+                w = weights.get(i, 0.0)
+                weights[i] = w - rate * (gradient * v + l2 * w)
+    return GateClassifier(weights, bias, dim)
+
+
+# --- Service defaults ---
+
+def load_default() -> Optional[GateClassifier]:
+    """Loads the configured artifact; without one (or if it is unreadable) every turn goes to the LLM."""
+    if not config.GATE_CLASSIFIER_PATH:
+        return None
+    try:
+        classifier = GateClassifier.load(config.GATE_CLASSIFIER_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        log_event(logger, logging.ERROR, "gate_classifier_load_failed", path=config.GATE_CLASSIFIER_PATH, error=str(e))
+        return None
+    log_event(
+        logger, logging.INFO, "gate_classifier_loaded", path=config.GATE_CLASSIFIER_PATH,
+        skip_below=classifier.skip_below, opportunity_above=classifier.opportunity_above,
+    )
+    return classifier
+
+
+default_classifier = load_default()
+
+_decision_log_lock = threading.Lock()
+
+
+def record_decision(history: Sequence[Dict], opportunity: bool):
+    """Appends an LLM gate decision to the decision log, as training data for the classifier."""
+    if not config.GATE_DECISION_LOG_PATH:
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "history": list(history), "opportunity": opportunity})
+    try:
+        with _decision_log_lock, open(config.GATE_DECISION_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        log_event(logger, logging.WARNING, "gate_decision_log_failed", error=str(e))
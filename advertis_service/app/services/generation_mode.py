@@ -0,0 +1,74 @@
+# advertis_service/app/services/generation_mode.py
+# Chooses how a /get-response turn writes its placement. "standard" runs the
+# host LLM on the full model; "economy" uses the cheaper strategy configured
+# by ECONOMY_STRATEGY. Economy is picked when the request asks for it, when
+# the tenant is configured for it, or automatically while the service is
+# overloaded (LLM scheduler backlog, or standard turns breaching the p95 SLO).
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from app import config
+from app.services import llm_scheduler, metrics
+
+STANDARD = "standard"
+ECONOMY = "economy"
+
+
+class ModeChoice(NamedTuple):
+    mode: str
+    reason: str  # requested, tenant, queue_depth, latency_slo, or default
+
+
+class RecentLatency:
+    """
+    Latencies of recent standard turns that reached the host LLM (gate and
+    orchestrator skips are fast and would hide a slow generator). Samples older than the window are
+    ignored, so while every turn runs in economy mode the window drains and
+    the next turn probes the standard path again.
+    """
+    def __init__(self, window_seconds: float, min_samples: int = 20, max_samples: int = 500):
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile (0-100) of the window, or None with fewer than `min_samples` recent turns."""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(seconds for _, seconds in self._samples)
+        return ordered[min(len(ordered) - 1, int(round((p / 100.0) * (len(ordered) - 1))))]
+
+
+turn_latency = RecentLatency(config.ECONOMY_LATENCY_WINDOW_SECONDS)
+
+
+def resolve(requested: Optional[str] = None, tenant_id: Optional[str] = None, scheduler=None) -> ModeChoice:
+    """Picks the generation mode for a turn and records the choice."""
+    choice = _choose(requested, tenant_id, scheduler or llm_scheduler.default_scheduler)
+    metrics.GENERATION_MODES.inc(mode=choice.mode, reason=choice.reason)
+    return choice
+
+
+def _choose(requested: Optional[str], tenant_id: Optional[str], scheduler) -> ModeChoice:
+    if requested:
+        return ModeChoice(requested, "requested")
+    if tenant_id and tenant_id in config.ECONOMY_TENANTS:
+        return ModeChoice(ECONOMY, "tenant")
+    if config.ECONOMY_QUEUE_DEPTH and scheduler.queue_depth() >= config.ECONOMY_QUEUE_DEPTH:
+        return ModeChoice(ECONOMY, "queue_depth")
+    if config.ECONOMY_TURN_P95_SECONDS:
+        p95 = turn_latency.percentile(95)
+        if p95 is not None and p95 >= config.ECONOMY_TURN_P95_SECONDS:
+            return ModeChoice(ECONOMY, "latency_slo")
+    return ModeChoice(STANDARD, "default")
@@ -0,0 +1,207 @@
+# advertis_service/app/services/hedging.py
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from app import config
+from app.services import metrics
+from app.services.structured_logging import get_logger, log_event
+
+logger = get_logger("hedging")
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """
+    Keeps a rolling window of recently observed call latencies for one node
+    and answers percentile queries over it.
+    """
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Returns the p-th percentile (0-100) of the window, or None while the
+        window holds fewer than `min_samples` observations.
+        """
+        with self._lock:
+            if len(self._samples) < self._min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round((p / 100.0) * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    A token bucket that caps how many duplicate requests may be fired per minute,
+    so that hedging can never more than marginally inflate LLM spend.
+    """
+    def __init__(self, max_per_minute: float):
+        self.capacity = max(max_per_minute, 0.0)
+        self._tokens = self.capacity
+        self._refill_per_second = self.capacity / 60.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self._refill_per_second)
+            self._last_refill = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class RequestHedger:
+    """
+    Runs LLM calls for opted-in nodes with request hedging: if the first attempt
+    has not finished by the configured percentile of recent latency, a duplicate
+    is fired and whichever finishes first wins.
+
+    Calls are blocking (the agent nodes are synchronous), so a duplicate that has
+    already started cannot be interrupted. The loser is cancelled if it has not
+    started yet; otherwise its result is discarded and its token usage is counted
+    as extra cost.
+    """
+    def __init__(
+        self,
+        enabled_nodes: List[str],
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        max_hedges_per_minute: float = 30.0,
+        max_workers: int = 16,
+    ):
+        self.enabled_nodes = set(enabled_nodes)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = HedgeBudget(max_hedges_per_minute)
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge") if self.enabled_nodes else None
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    # --- Bookkeeping ---
+    def _tracker(self, node: str) -> LatencyTracker:
+        tracker = self._trackers.get(node)
+        if tracker is None:
+            tracker = self._trackers.setdefault(node, LatencyTracker(min_samples=self.min_samples))
+        return tracker
+
+    def _bump(self, node: str, field: str, amount: int = 1):
+        with self._stats_lock:
+            node_stats = self._stats.setdefault(node, {
+                "calls": 0, "hedges_fired": 0, "hedge_wins": 0,
+                "budget_exhausted": 0, "extra_tokens": 0,
+            })
+            node_stats[field] += amount
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns a snapshot of per-node hedging counters."""
+        with self._stats_lock:
+            return {node: dict(values) for node, values in self._stats.items()}
+
+    def _timed(self, node: str, fn: Callable[[], T]) -> Callable[[], T]:
+        """Wraps `fn` so that every attempt, winner or loser, feeds the latency window."""
+        def run() -> T:
+            started = time.perf_counter()
+            result = fn()
+            self._tracker(node).observe(time.perf_counter() - started)
+            return result
+        return run
+
+    def _charge_loser(self, node: str, future):
+        """Counts the tokens spent by an attempt whose result was thrown away."""
+        def on_done(done_future):
+            if done_future.cancelled() or done_future.exception() is not None:
+                return
+            usage = getattr(done_future.result(), "usage_metadata", None)
+            if isinstance(usage, dict) and usage.get("total_tokens"):
+                self._bump(node, "extra_tokens", usage["total_tokens"])
+        future.add_done_callback(on_done)
+
+    # --- Public API ---
+    def call(self, node: str, fn: Callable[[], T]) -> T:
+        """Executes `fn`, hedging it if `node` has opted in and the latency window is warm."""
+        if node not in self.enabled_nodes:
+            return fn()
+
+        self._bump(node, "calls")
+        attempt = self._timed(node, fn)
+        hedge_after = self._tracker(node).percentile(self.percentile)
+        if hedge_after is None:
+            return attempt()
+
+        # Attempts run on the hedge pool, so carry the caller's trace context along.
+        primary = self._executor.submit(contextvars.copy_context().run, attempt)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        if not self.budget.try_acquire():
+            self._bump(node, "budget_exhausted")
+            return primary.result()
+
+        self._bump(node, "hedges_fired")
+        hedge = self._executor.submit(contextvars.copy_context().run, attempt)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for winner in done:
+                if winner.exception() is not None:
+                    first_error = first_error or winner.exception()
+                    continue
+                for loser in pending:
+                    if not loser.cancel():
+                        self._charge_loser(node, loser)
+                if winner is hedge:
+                    self._bump(node, "hedge_wins")
+                    log_event(logger, logging.INFO, "hedge_won", node=node, hedged_after_ms=round(hedge_after * 1000))
+                return winner.result()
+        raise first_error
+
+
+def create_default_hedger() -> RequestHedger:
+    """Builds the process-wide hedger from the environment configuration."""
+    return RequestHedger(
+        enabled_nodes=config.HEDGE_NODES,
+        percentile=config.HEDGE_PERCENTILE,
+        min_samples=config.HEDGE_MIN_SAMPLES,
+        max_hedges_per_minute=config.HEDGE_MAX_PER_MINUTE,
+    )
+
+
+# A single hedger is shared by every agent so the hedge budget is process-wide.
+default_hedger = create_default_hedger()
+
+
+def _hedge_stat(field: str):
+    return lambda: {(node,): values[field] for node, values in default_hedger.stats().items()}
+
+
+metrics.register(metrics.CallbackMetric(
+    "advertis_llm_hedges_fired_total", "Duplicate LLM requests fired by hedging.",
+    "counter", ["node"], _hedge_stat("hedges_fired"),
+))
+metrics.register(metrics.CallbackMetric(
+    "advertis_llm_hedge_wins_total", "Hedged calls where the duplicate finished first.",
+    "counter", ["node"], _hedge_stat("hedge_wins"),
+))
+metrics.register(metrics.CallbackMetric(
+    "advertis_llm_hedge_extra_tokens_total", "Tokens spent by discarded hedge attempts.",
+    "counter", ["node"], _hedge_stat("extra_tokens"),
+))
@@ -0,0 +1,71 @@
+# advertis_service/app/services/idempotency.py
+# Idempotent /get-response turns. Each turn gets a key (sent by the SDK, or
+# derived from the session and the end of its history). Concurrent duplicates
+# of a turn share one agent run, and the finished result is kept in Redis for
+# a short while so retries are answered without running the graph again, or
+# counting the turn twice in the frequency state.
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import redis
+
+from app import config
+from app.services import metrics, redis_client, transcripts
+from app.services.structured_logging import get_logger, log_event
+
+HEADER = "Idempotency-Key"
+# Enough of the history to tell one turn from the next.
+KEY_TAIL_MESSAGES = 6
+
+logger = get_logger("idempotency")
+
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+def turn_key(session_id: str, history: List[Dict], supplied: Optional[str] = None) -> str:
+    """The key for this turn, namespaced by session so clients can't collide across sessions."""
+    if supplied:
+        suffix = hashlib.sha256(supplied.encode("utf-8")).hexdigest()[:32]
+    else:
+        suffix = transcripts.extend_hash(transcripts.EMPTY_HASH, history[-KEY_TAIL_MESSAGES:])[:32]
+    return f"idempotency:{session_id}:{suffix}"
+
+
+def get_cached(key: str) -> Optional[Dict]:
+    try:
+        stored = redis_client.redis_client.get(key)
+    except redis.RedisError as e:
+        log_event(logger, logging.WARNING, "idempotency_cache_unavailable", error=str(e))
+        return None
+    return json.loads(stored) if stored else None
+
+
+def _store(key: str, result: Dict):
+    try:
+        redis_client.redis_client.set(key, json.dumps(result), ex=config.IDEMPOTENCY_TTL_SECONDS)
+    except redis.RedisError as e:
+        log_event(logger, logging.WARNING, "idempotency_cache_unavailable", error=str(e))
+
+
+async def run_once(key: str, work: Callable[[], Awaitable[Dict]]) -> Dict:
+    """
+    Runs `work` for this key unless a run is already in flight, in which case
+    its result is shared. The run is detached from the callers, so it finishes
+    (and is cached for retries) even if the client that started it disconnects.
+    """
+    task = _in_flight.get(key)
+    if task is not None:
+        metrics.IDEMPOTENT_REPLAYS.inc(source="coalesced")
+    else:
+        async def run() -> Dict:
+            result = await work()
+            _store(key, result)
+            return result
+
+        task = asyncio.get_running_loop().create_task(run())
+        _in_flight[key] = task
+        task.add_done_callback(lambda done: _in_flight.pop(key, None) if _in_flight.get(key) is done else None)
+    return await asyncio.shield(task)
@@ -0,0 +1,266 @@
+# advertis_service/app/services/llm_scheduler.py
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from app import config
+from app.services import metrics, redis_client
+from app.services.structured_logging import get_logger, log_event
+
+logger = get_logger("llm_scheduler")
+
+# --- Priority Classes ---
+# Lower numbers are served first. Finishing a generation that has already been
+# approved is worth more than starting a new pre-check for another session.
+PRIORITY_HOST_LLM = 0
+PRIORITY_ORCHESTRATOR = 1
+PRIORITY_DECISION_GATE = 2
+
+NODE_PRIORITIES = {
+    "host_llm": PRIORITY_HOST_LLM,
+    "orchestrator": PRIORITY_ORCHESTRATOR,
+    "decision_gate": PRIORITY_DECISION_GATE,
+}
+
+# Rough completion budget added to every estimate, since the output length is
+# unknown before dispatch.
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 512
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call waits longer than the scheduler allows for capacity."""
+
+
+def estimate_tokens(payload: Any, expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS) -> int:
+    """
+    Cheaply estimates the tokens a request will consume, using the common
+    ~4 characters per token heuristic for the prompt plus an output budget.
+    """
+    if isinstance(payload, str):
+        chars = len(payload)
+    elif isinstance(payload, (list, tuple)):
+        chars = 0
+        for message in payload:
+            if isinstance(message, dict):
+                chars += len(str(message.get("content", "")))
+            elif isinstance(message, tuple) and len(message) == 2:
+                chars += len(str(message[1]))
+            else:
+                chars += len(str(getattr(message, "content", message)))
+    else:
+        chars = len(str(payload))
+    return chars // 4 + expected_output_tokens
+
+
+# --- Token Buckets ---
+
+# Atomically refills and, if both have room, debits the request and token
+# buckets for one model. Returns 0 on success, otherwise the milliseconds to
+# wait before the reservation could succeed. Redis' own clock is used so that
+# every replica agrees on the refill timeline.
+_RESERVE_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local function refill(key, capacity)
+    local state = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, level + (now - ts) * capacity / 60000)
+end
+
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = math.min(tonumber(ARGV[3]), tpm)
+
+local requests = refill(KEYS[1], rpm)
+local tokens = refill(KEYS[2], tpm)
+
+local wait_ms = 0
+if requests < 1 then
+    wait_ms = math.max(wait_ms, (1 - requests) * 60000 / rpm)
+end
+if tokens < cost then
+    wait_ms = math.max(wait_ms, (cost - tokens) * 60000 / tpm)
+end
+
+if wait_ms == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 'level', requests, 'ts', now)
+redis.call('HSET', KEYS[2], 'level', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+return math.ceil(wait_ms)
+"""
+
+
+class LocalTokenBucket:
+    """
+    In-process equivalent of the Redis bucket. Used directly in tests and as a
+    per-replica fallback when Redis is unreachable.
+    """
+    def __init__(self):
+        self._levels: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _refill(self, key: str, capacity: float, now: float) -> float:
+        level, ts = self._levels.get(key, (capacity, now))
+        return min(capacity, level + (now - ts) * capacity / 60.0)
+
+    def reserve(self, model: str, rpm: int, tpm: int, cost: int) -> float:
+        """Returns 0 if the reservation was taken, otherwise seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            cost = min(cost, tpm)
+            requests = self._refill(f"{model}:requests", rpm, now)
+            tokens = self._refill(f"{model}:tokens", tpm, now)
+            wait_s = 0.0
+            if requests < 1:
+                wait_s = max(wait_s, (1 - requests) * 60.0 / rpm)
+            if tokens < cost:
+                wait_s = max(wait_s, (cost - tokens) * 60.0 / tpm)
+            if wait_s == 0:
+                requests -= 1
+                tokens -= cost
+            self._levels[f"{model}:requests"] = (requests, now)
+            self._levels[f"{model}:tokens"] = (tokens, now)
+            return wait_s
+
+    def adjust(self, model: str, delta_tokens: int):
+        """Debits (or credits, if negative) tokens once actual usage is known."""
+        with self._lock:
+            key = f"{model}:tokens"
+            if key in self._levels:
+                level, ts = self._levels[key]
+                self._levels[key] = (level - delta_tokens, ts)
+
+
+class RedisTokenBucket:
+    """
+    Token buckets stored in Redis so that per-model limits hold across every
+    replica of the service. Falls back to a local bucket if Redis errors.
+    """
+    KEY_PREFIX = "llm_ratelimit"
+
+    def __init__(self):
+        self._script = None
+        self._fallback = LocalTokenBucket()
+
+    def _keys(self, model: str) -> List[str]:
+        return [f"{self.KEY_PREFIX}:{model}:requests", f"{self.KEY_PREFIX}:{model}:tokens"]
+
+    def reserve(self, model: str, rpm: int, tpm: int, cost: int) -> float:
+        client = redis_client.redis_client
+        try:
+            if self._script is None:
+                self._script = client.register_script(_RESERVE_LUA)
+            wait_ms = self._script(keys=self._keys(model), args=[rpm, tpm, cost], client=client)
+            return int(wait_ms) / 1000.0
+        except redis.RedisError as e:
+            log_event(logger, logging.WARNING, "redis_bucket_unavailable", model=model, error=str(e))
+            return self._fallback.reserve(model, rpm, tpm, cost)
+
+    def adjust(self, model: str, delta_tokens: int):
+        try:
+            redis_client.redis_client.hincrbyfloat(self._keys(model)[1], "level", -delta_tokens)
+        except redis.RedisError:
+            self._fallback.adjust(model, delta_tokens)
+
+
+# --- Scheduler ---
+
+class LLMScheduler:
+    """
+    Gates every LLM call on per-model requests-per-minute and tokens-per-minute
+    budgets. Waiting calls for the same model are served strictly by priority
+    class, then arrival order.
+
+    The agent nodes run synchronously on LangGraph's worker threads, so callers
+    block in `acquire`; async callers can use `acquire_async`.
+    """
+    def __init__(self, limits: Dict[str, Dict[str, int]], bucket=None, max_wait_seconds: float = 30.0):
+        self.limits = limits
+        self.bucket = bucket if bucket is not None else RedisTokenBucket()
+        self.max_wait_seconds = max_wait_seconds
+        self._queues: Dict[str, tuple] = {}
+        self._queues_lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def _queue(self, model: str) -> tuple:
+        with self._queues_lock:
+            if model not in self._queues:
+                self._queues[model] = (threading.Condition(), [])
+            return self._queues[model]
+
+    def queue_depth(self, model: Optional[str] = None) -> int:
+        """Number of calls currently waiting for capacity (for one model, or all)."""
+        with self._queues_lock:
+            if model is None:
+                queues = list(self._queues.values())
+            else:
+                queues = [self._queues[model]] if model in self._queues else []
+        return sum(len(heap) for _, heap in queues)
+
+    def acquire(self, model: str, estimated_tokens: int, priority: int = PRIORITY_DECISION_GATE):
+        """Blocks until the model's buckets have room for this call."""
+        limit = self.limits.get(model)
+        if not limit:
+            return
+
+        condition, heap = self._queue(model)
+        entry = [priority, next(self._sequence)]
+        deadline = time.monotonic() + self.max_wait_seconds
+        with condition:
+            heapq.heappush(heap, entry)
+            condition.notify_all()
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"Timed out waiting for '{model}' rate-limit capacity.")
+                    if heap[0] is not entry:
+                        condition.wait(timeout=remaining)
+                        continue
+                    wait_s = self.bucket.reserve(model, limit["rpm"], limit["tpm"], estimated_tokens)
+                    if wait_s <= 0:
+                        return
+                    condition.wait(timeout=min(wait_s, remaining))
+            finally:
+                heap.remove(entry)
+                heapq.heapify(heap)
+                condition.notify_all()
+
+    async def acquire_async(self, model: str, estimated_tokens: int, priority: int = PRIORITY_DECISION_GATE):
+        await asyncio.to_thread(self.acquire, model, estimated_tokens, priority)
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrects the token bucket with the actual usage reported by the provider."""
+        if model in self.limits and actual_tokens:
+            self.bucket.adjust(model, actual_tokens - estimated_tokens)
+
+
+def create_default_scheduler() -> LLMScheduler:
+    """Builds the process-wide scheduler from the environment configuration."""
+    return LLMScheduler(
+        limits=json.loads(config.LLM_RATE_LIMITS),
+        max_wait_seconds=config.LLM_SCHEDULER_MAX_WAIT_SECONDS,
+    )
+
+
+# All agents share one scheduler so priorities are enforced across sessions.
+default_scheduler = create_default_scheduler()
+
+metrics.register(metrics.CallbackMetric(
+    "advertis_llm_scheduler_queue_depth", "LLM calls waiting for rate-limit capacity.",
+    "gauge", ["model"],
+    lambda: {(model,): default_scheduler.queue_depth(model) for model in default_scheduler.limits},
+))
@@ -0,0 +1,272 @@
+# advertis_service/app/services/metrics.py
+# A small, dependency-free metrics registry that renders the Prometheus text
+# exposition format for the `/metrics` endpoint.
+#
+# Recording is lock-free: every thread writes only to its own shard of each
+# metric, so the request path never contends on a shared lock. Shards are
+# summed when `/metrics` is scraped.
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}.0"
+
+
+class _ShardedMetric:
+    """Base class holding one private shard per recording thread."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # list.append is atomic, so registering a new shard needs no lock.
+            self._shards.append(shard)
+        return shard
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _snapshots(self) -> List[dict]:
+        # dict.copy() runs atomically under the GIL, so a concurrent writer
+        # cannot invalidate the iteration below.
+        return [shard.copy() for shard in list(self._shards)]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        return sum(snapshot.get(key, 0.0) for snapshot in self._snapshots())
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for snapshot in self._snapshots():
+            for key, value in snapshot.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(totals.items())]
+
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        shard = self._shard()
+        key = self._key(labels)
+        series = shard.get(key)
+        if series is None:
+            # [per-bucket counts (+Inf last), sum, count]
+            series = shard[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = self._key(labels)
+        return sum(snapshot[key][2] for snapshot in self._snapshots() if key in snapshot)
+
+    def render(self) -> List[str]:
+        merged: Dict[Tuple[str, ...], list] = {}
+        for snapshot in self._snapshots():
+            for key, (counts, total, count) in snapshot.items():
+                target = merged.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                for i, c in enumerate(list(counts)):
+                    target[0][i] += c
+                target[1] += total
+                target[2] += count
+
+        lines = []
+        for key, (counts, total, count) in sorted(merged.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    A metric whose values are read from another component at scrape time,
+    e.g. counters the hedger already keeps.
+    """
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Iterable[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(self._collect().items())]
+
+
+# --- Registry ---
+
+_REGISTRY: List = []
+
+
+def register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render_latest() -> str:
+    """Renders every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Service Metrics ---
+
+REQUEST_LATENCY = register(Histogram(
+    "advertis_http_request_duration_seconds",
+    "Latency of HTTP requests by endpoint.",
+    ["method", "endpoint", "status"],
+))
+
+AGENT_STEP_LATENCY = register(Histogram(
+    "advertis_agent_step_duration_seconds",
+    "Latency of each agent graph step (decision_gate, retrieval, orchestrator_llm, host_llm).",
+    ["step"],
+))
+
+EMBEDDING_BATCH_SIZE = register(Histogram(
+    "advertis_embedding_batch_size",
+    "Distinct texts per embedding call made by the micro-batcher.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+))
+
+EMBEDDING_BATCH_WAIT = register(Histogram(
+    "advertis_embedding_batch_wait_seconds",
+    "Time the oldest text in a batch waited before the embedding call.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+))
+
+GATE_REJECTIONS = register(Counter(
+    "advertis_gate_rejections_total",
+    "Pre-flight gate rejections by reason.",
+    ["reason"],
+))
+
+AGENT_OUTCOMES = register(Counter(
+    "advertis_agent_outcomes_total",
+    "Final agent decisions by status (inject or skip).",
+    ["status"],
+))
+
+GATE_CLASSIFIER_DECISIONS = register(Counter(
+    "advertis_gate_classifier_decisions_total",
+    "Decision-gate outcomes of the local classifier (opportunity, skip, or deferred to the LLM).",
+    ["outcome"],
+))
+
+SPECULATIONS = register(Counter(
+    "advertis_speculations_total",
+    "Speculative pipeline runs by outcome (started, used, or why they were wasted).",
+    ["outcome"],
+))
+
+SPECULATION_WASTED_SECONDS = register(Counter(
+    "advertis_speculation_wasted_seconds_total",
+    "Time spent on speculative work that was never used, by reason.",
+    ["reason"],
+))
+
+IDEMPOTENT_REPLAYS = register(Counter(
+    "advertis_idempotent_replays_total",
+    "Duplicate /get-response turns served without a new agent run, by source (cache or coalesced).",
+    ["source"],
+))
+
+GENERATION_MODES = register(Counter(
+    "advertis_generation_modes_total",
+    "/get-response turns by generation mode (standard or economy) and why it was chosen.",
+    ["mode", "reason"],
+))
+
+MODEL_ROUTE_CALLS = register(Counter(
+    "advertis_model_route_calls_total",
+    "Routed LLM calls by route, model, and outcome (ok or error).",
+    ["route", "model", "outcome"],
+))
+
+MODEL_ROUTE_SKIPS = register(Counter(
+    "advertis_model_route_skips_total",
+    "Models passed over in a route's fallback chain, by reason (circuit_open, latency_budget, cost_budget).",
+    ["route", "model", "reason"],
+))
+
+LLM_COST_USD = register(Counter(
+    "advertis_llm_cost_usd_total",
+    "Estimated LLM spend in USD by route and model, from reported token usage and list prices.",
+    ["route", "model"],
+))
+
+LLM_TOKENS = register(Counter(
+    "advertis_llm_tokens_total",
+    "LLM token usage by model and token kind.",
+    ["model", "kind"],
+))
+
+
+def record_token_usage(model: str, usage: Dict[str, int]):
+    """Records input/output token counts from a LangChain usage_metadata dict."""
+    if usage.get("input_tokens"):
+        LLM_TOKENS.inc(usage["input_tokens"], model=model, kind="input")
+    if usage.get("output_tokens"):
+        LLM_TOKENS.inc(usage["output_tokens"], model=model, kind="output")
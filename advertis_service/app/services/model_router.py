@@ -0,0 +1,215 @@
+# advertis_service/app/services/model_router.py
+# Resolves which model each graph node calls. A route names a fallback chain
+# of models, a temperature, and optional budgets. Routes come from built-in
+# defaults, overlaid by MODEL_ROUTES (globally, per UTC hour range, then per
+# tenant). When a call runs, models that are erroring, or whose recent p95
+# latency or average cost breaks the route's budget, are moved to the back of
+# the chain; every call feeds those statistics back in.
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app import config
+from app.services import metrics
+from app.services.structured_logging import get_logger, log_event
+
+logger = get_logger("model_router")
+
+# USD per million tokens; MODEL_PRICES overrides or extends these.
+DEFAULT_PRICES = {
+    "gpt-4.1": {"input": 2.0, "output": 8.0},
+    "gpt-4.1-mini": {"input": 0.4, "output": 1.6},
+    "gpt-4.1-nano": {"input": 0.1, "output": 0.4},
+}
+
+
+def default_routes() -> Dict[str, Dict]:
+    """The routes used when nothing is configured: the models the agent has always used."""
+    return {
+        "decision_gate": {"models": ["gpt-4.1-mini"], "temperature": 0},
+        "orchestrator": {"models": ["gpt-4.1-mini"], "temperature": 0.7},
+        "host_llm": {"models": ["gpt-4.1"], "temperature": 0.7},
+        "economy": {"models": [config.ECONOMY_MODEL], "temperature": 0.7},
+    }
+
+
+class Route(NamedTuple):
+    name: str
+    models: List[str]
+    temperature: float
+    latency_budget_seconds: Optional[float] = None  # p95 over the routing window
+    cost_budget_usd: Optional[float] = None  # Average per call over the routing window
+
+
+class ModelStats:
+    """Recent calls of one model on one route, and its error streak."""
+    def __init__(self, window_seconds: float, max_samples: int = 500):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)  # (monotonic time, seconds, cost)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, cost: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, cost))
+            self.consecutive_failures = 0
+
+    def fail(self, threshold: int, cooldown_seconds: float) -> bool:
+        """Counts an error; returns True when it opens the circuit."""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= threshold:
+                self.consecutive_failures = 0
+                self.open_until = time.monotonic() + cooldown_seconds
+                return True
+            return False
+
+    def recent(self, min_samples: int) -> Optional[Tuple[float, float]]:
+        """(p95 latency, average cost) of the window, or None with fewer than `min_samples` calls."""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            if len(self._samples) < min_samples:
+                return None
+            latencies = sorted(seconds for _, seconds, _ in self._samples)
+            average_cost = sum(cost for _, _, cost in self._samples) / len(self._samples)
+        return latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))], average_cost
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        routes_config: Optional[Dict] = None,
+        prices: Optional[Dict[str, Dict[str, float]]] = None,
+        window_seconds: float = 300.0,
+        min_samples: int = 20,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+    ):
+        routes_config = routes_config or {}
+        self.node_overrides: Dict[str, Dict] = routes_config.get("nodes", {})
+        self.tenant_overrides: Dict[str, Dict[str, Dict]] = routes_config.get("tenants", {})
+        self.schedule: List[Dict] = routes_config.get("schedule", [])
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._stats: Dict[Tuple[str, str], ModelStats] = {}
+        self._stats_lock = threading.Lock()
+
+    # --- Resolution ---
+    def resolve(self, name: str, tenant_id: Optional[str] = None, now: Optional[datetime] = None) -> Route:
+        """The route for a node: defaults, then global, scheduled and tenant overrides, most specific last."""
+        hour = (now or datetime.now(timezone.utc)).hour
+        route = dict(default_routes().get(name, {}))
+        route.update(self.node_overrides.get(name, {}))
+        for window in self.schedule:
+            start, end = window["hours"]
+            if (start <= hour < end) if start <= end else (hour >= start or hour < end):
+                route.update(window.get("nodes", {}).get(name, {}))
+        if tenant_id:
+            route.update(self.tenant_overrides.get(tenant_id, {}).get(name, {}))
+        if not route.get("models"):
+            raise ValueError(f"No models are routed for '{name}'.")
+        return Route(
+            name=name,
+            models=list(route["models"]),
+            temperature=route.get("temperature", 0.7),
+            latency_budget_seconds=route.get("latency_budget_seconds"),
+            cost_budget_usd=route.get("cost_budget_usd"),
+        )
+
+    def plan(self, route: Route) -> List[str]:
+        """
+        The order to try the route's models in: healthy models in their
+        configured order, then the others as a last resort, so a call is
+        always attempted even when every model is degraded.
+        """
+        healthy, degraded = [], []
+        for model in route.models:
+            reason = self._degraded_reason(route, model)
+            if reason is None:
+                healthy.append(model)
+            else:
+                metrics.MODEL_ROUTE_SKIPS.inc(route=route.name, model=model, reason=reason)
+                degraded.append(model)
+        return healthy + degraded
+
+    def _degraded_reason(self, route: Route, model: str) -> Optional[str]:
+        stats = self._model_stats(route.name, model)
+        if stats.open_until > time.monotonic():
+            return "circuit_open"
+        recent = stats.recent(self.min_samples)
+        if recent is None:
+            return None
+        p95, average_cost = recent
+        if route.latency_budget_seconds and p95 > route.latency_budget_seconds:
+            return "latency_budget"
+        if route.cost_budget_usd and average_cost > route.cost_budget_usd:
+            return "cost_budget"
+        return None
+
+    # --- Feedback ---
+    def _model_stats(self, route_name: str, model: str) -> ModelStats:
+        key = (route_name, model)
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(key, ModelStats(self.window_seconds))
+        return stats
+
+    def cost(self, model: str, usage: Dict[str, int]) -> float:
+        price = self.prices.get(model)
+        if not price:
+            return 0.0
+        return (usage.get("input_tokens", 0) * price["input"] + usage.get("output_tokens", 0) * price["output"]) / 1_000_000
+
+    def record_success(self, route: Route, model: str, seconds: float, usage: Dict[str, int]):
+        cost = self.cost(model, usage)
+        self._model_stats(route.name, model).observe(seconds, cost)
+        metrics.MODEL_ROUTE_CALLS.inc(route=route.name, model=model, outcome="ok")
+        if cost:
+            metrics.LLM_COST_USD.inc(cost, route=route.name, model=model)
+
+    def record_failure(self, route: Route, model: str, error: Exception):
+        metrics.MODEL_ROUTE_CALLS.inc(route=route.name, model=model, outcome="error")
+        opened = self._model_stats(route.name, model).fail(self.failure_threshold, self.cooldown_seconds)
+        log_event(
+            logger, logging.WARNING, "model_call_failed",
+            route=route.name, model=model, error=str(error), circuit_opened=opened,
+        )
+
+    def snapshot(self) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """(p95 latency, average cost) per (route, model) with enough recent calls."""
+        with self._stats_lock:
+            items = list(self._stats.items())
+        return {key: recent for key, stats in items if (recent := stats.recent(1)) is not None}
+
+
+def create_default_router() -> ModelRouter:
+    """Builds the process-wide router from the environment configuration."""
+    return ModelRouter(
+        routes_config=json.loads(config.MODEL_ROUTES),
+        prices=json.loads(config.MODEL_PRICES),
+        window_seconds=config.ROUTING_WINDOW_SECONDS,
+        min_samples=config.ROUTING_MIN_SAMPLES,
+        failure_threshold=config.ROUTING_FAILURE_THRESHOLD,
+        cooldown_seconds=config.ROUTING_COOLDOWN_SECONDS,
+    )
+
+
+# Shared by every agent so the latency and error history covers all sessions.
+default_router = create_default_router()
+
+metrics.register(metrics.CallbackMetric(
+    "advertis_model_route_latency_p95_seconds", "Recent p95 latency of each model on each route.",
+    "gauge", ["route", "model"],
+    lambda: {key: p95 for key, (p95, _) in default_router.snapshot().items()},
+))
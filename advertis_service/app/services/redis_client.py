@@ -2,6 +2,7 @@ import redis
 import json
 from datetime import datetime
 from app import config
+from app.services import safety_rules
 
 # --- Client Initialization ---
 # This creates a single, reusable connection pool to our Redis service.
@@ -11,13 +12,18 @@ redis_client = redis.from_url(config.REDIS_URL, decode_responses=True)
 MAX_ADS_PER_SESSION = 15
 MIN_TURNS_BETWEEN_ADS = 3
 COOLDOWN_SECONDS = 15
-HIGH_CONSEQUENCE_KEYWORDS = ["help", "stuck", "hint", "rule", "stuck", "confused"]
+HIGH_CONSEQUENCE_KEYWORDS = safety_rules.HIGH_CONSEQUENCE_KEYWORDS
+# The decision gate's "initial user interaction" red flag: a first message this short.
+INITIAL_INTERACTION_TURNS = 1
+INITIAL_MESSAGE_MAX_WORDS = 3
+OUT_OF_CHARACTER_PREFIXES = ("(ooc", "ooc:", "((")
 
 # --- Gate Functions ---
 
-def update_state(session_id: str, ad_shown: bool = False):
+def update_state(session_id: str, ad_shown: bool = False, turns: int = 1):
     """
-    Updates the session state in Redis after a turn.
+    Updates the session state in Redis after a turn (or after `turns` turns,
+    e.g. ones the SDK skipped locally without calling the service).
     This will be called by the main endpoint logic later.
     """
     state_str = redis_client.get(session_id)
@@ -29,7 +35,7 @@ def update_state(session_id: str, ad_shown: bool = False):
         'last_ad_timestamp': 0
     }
 
-    state['total_turns'] += 1
+    state['total_turns'] += turns
     if ad_shown:
         state['ads_shown'] += 1
         state['last_ad_timestamp'] = int(datetime.now().timestamp())
@@ -59,12 +65,56 @@ def run_frequency_gate(session_id: str) -> tuple[bool, str]:
 
     return True, "Frequency Gate: Passed"
 
-def run_safety_gate(last_message: str | None) -> tuple[bool, str]:
-    """Scans the last message for keywords indicating player frustration."""
+def eligibility_hints(session_id: str) -> dict:
+    """
+    Tells the caller when the frequency gate can next pass for this session,
+    so the SDK can skip pre-flight calls that are certain to be rejected.
+    `turns_until_eligible` counts turns still to be played (each of which is
+    recorded as a rejected turn) before the turn cap is met.
+    """
+    state_str = redis_client.get(session_id)
+    if not state_str:
+        return {"session_exhausted": False, "turns_until_eligible": 0, "next_eligible_turn": 0,
+                "earliest_eligible_at": 0, "seconds_until_eligible": 0}
+
+    state = json.loads(state_str)
+    now = int(datetime.now().timestamp())
+    total_turns = state.get('total_turns', 0)
+    next_eligible_turn = state.get('last_ad_turn', 0) + MIN_TURNS_BETWEEN_ADS
+    earliest_eligible_at = state.get('last_ad_timestamp', 0) + COOLDOWN_SECONDS
+    return {
+        "session_exhausted": state.get('ads_shown', 0) >= MAX_ADS_PER_SESSION,
+        "turns_until_eligible": max(0, next_eligible_turn - total_turns),
+        "next_eligible_turn": next_eligible_turn,
+        "earliest_eligible_at": earliest_eligible_at,
+        "seconds_until_eligible": max(0, earliest_eligible_at - now),
+    }
+
+def run_safety_gate(last_message: str | None, vertical: str | None = None, locale: str | None = None) -> tuple[bool, str]:
+    """Scans the last message for keywords (for its vertical and locale) indicating player frustration."""
     if not last_message:
         return True, "Safety Gate: Passed (No message)"
 
-    if any(keyword in last_message.lower() for keyword in HIGH_CONSEQUENCE_KEYWORDS):
+    if safety_rules.current(vertical, locale).matches(last_message):
         return False, "Safety Gate: REJECTED (High-consequence keyword detected)"
 
-    return True, "Safety Gate: Passed"
\ No newline at end of file
+    return True, "Safety Gate: Passed"
+
+def run_history_gate(last_message: str | None, turn_count: int | None) -> tuple[bool, str]:
+    """
+    Deterministic versions of the decision gate's cheap red flags, so turns it
+    would always skip never reach /get-response. Without a history summary
+    (`turn_count` is None) the gate passes.
+    """
+    if turn_count is None:
+        return True, "History Gate: Passed (No summary)"
+
+    message = (last_message or "").strip()
+    if not message:
+        return False, "History Gate: REJECTED (Empty message)"
+    if turn_count <= INITIAL_INTERACTION_TURNS and len(message.split()) <= INITIAL_MESSAGE_MAX_WORDS:
+        return False, "History Gate: REJECTED (Initial user interaction)"
+    if message.lower().startswith(OUT_OF_CHARACTER_PREFIXES):
+        return False, "History Gate: REJECTED (Out-of-character message)"
+
+    return True, "History Gate: Passed"
\ No newline at end of file
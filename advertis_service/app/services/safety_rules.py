@@ -0,0 +1,192 @@
+# advertis_service/app/services/safety_rules.py
+# The safety gate's rules, compiled once per vertical and locale and published
+# (with a version) so the SDK can evaluate the same rules locally before
+# calling the service.
+#
+# Keyword sets can be loaded from a JSON file (SAFETY_KEYWORDS_PATH) mapping a
+# scope to a list of keywords:
+#   {"*": ["help", "stuck"], "*:es": ["ayuda"], "gaming": ["walkthrough"],
+#    "gaming:es": ["atascado"]}
+# A message is checked against the union of "*", "*:<locale>", "<vertical>"
+# and "<vertical>:<locale>". Keywords match whole words only; a keyword with
+# spaces is a phrase (any whitespace between its words), and a trailing "*"
+# matches any word that starts with it ("confus*").
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+from app.services.structured_logging import get_logger, log_event
+
+RULES_FORMAT = 1
+
+HIGH_CONSEQUENCE_KEYWORDS = [
+    "help", "stuck", "hint", "hints", "rule", "rules", "confused", "confusing",
+    "i give up", "what do i do",
+]
+DEFAULT_KEYWORD_SETS: Dict[str, List[str]] = {"*": HIGH_CONSEQUENCE_KEYWORDS}
+
+logger = get_logger("safety_rules")
+
+# Trie markers; neither can collide with a single character key.
+_END = ""
+_WILD = "**"
+
+
+def _normalize(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+def _trie_pattern(keywords: List[str]) -> str:
+    """
+    Builds one regex alternation shaped like a trie ("hel(?:p|lo)"), so the
+    engine branches on each character once instead of trying every keyword
+    at every position.
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        wild = keyword.endswith("*")
+        node = trie
+        for char in keyword.rstrip("*"):
+            node = node.setdefault(char, {})
+        node[_WILD if wild else _END] = True
+
+    def emit(node: Dict) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + emit(node[char])
+            for char in sorted(k for k in node if k not in (_END, _WILD))
+        ]
+        if _WILD in node:
+            branches.append(r"\w*")
+        optional = _END in node and _WILD not in node
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return emit(trie)
+
+
+class SafetyRuleset:
+    """
+    A compiled set of keywords that flag messages where an ad would be
+    inappropriate. `document` is the portable form served to the SDK: a list
+    of regular expressions matched case-insensitively anywhere in a message.
+    """
+    def __init__(self, keywords: List[str], vertical: Optional[str] = None, locale: Optional[str] = None):
+        self.keywords = [k for k in dict.fromkeys(_normalize(k) for k in keywords) if k.rstrip("*")]
+        # Lookarounds rather than \b, so keywords may start or end with punctuation.
+        self.patterns = [r"(?<!\w)(?:" + _trie_pattern(self.keywords) + r")(?!\w)"] if self.keywords else []
+        self.regex: Optional[re.Pattern] = re.compile(self.patterns[0], re.IGNORECASE) if self.patterns else None
+
+        document = {"format": RULES_FORMAT, "patterns": self.patterns, "flags": ["IGNORECASE"]}
+        canonical = json.dumps(document, sort_keys=True, separators=(",", ":"))
+        self.version = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+        self.document: Dict = {**document, "version": self.version, "vertical": vertical, "locale": locale}
+
+    def matches(self, message: str) -> bool:
+        return bool(self.regex and self.regex.search(message))
+
+
+def _scope_key(vertical: Optional[str], locale: Optional[str]) -> Tuple[str, str]:
+    # Only the primary language subtag selects keywords: "en-US" -> "en".
+    language = (locale or config.SAFETY_DEFAULT_LOCALE).split("-")[0].split("_")[0].lower()
+    return (vertical or "*").lower(), language
+
+
+class SafetyRulebook:
+    """
+    Keyword sets by scope, compiled lazily into one ruleset per (vertical,
+    locale). Verticals and languages come from clients, so any without a
+    scope of their own share the "*" ruleset; the cache stays bounded by the
+    configured scopes.
+    """
+    def __init__(self, keyword_sets: Dict[str, List[str]], mtime: Optional[float] = None):
+        self.keyword_sets = {scope.lower(): list(words) for scope, words in keyword_sets.items()}
+        self.mtime = mtime
+        self._verticals = {scope.split(":")[0] for scope in self.keyword_sets}
+        self._languages = {scope.split(":", 1)[1] for scope in self.keyword_sets if ":" in scope}
+        self._compiled: Dict[Tuple[str, str], SafetyRuleset] = {}
+
+    def ruleset(self, vertical: Optional[str] = None, locale: Optional[str] = None) -> SafetyRuleset:
+        vertical_key, language = _scope_key(vertical, locale)
+        key = (
+            vertical_key if vertical_key in self._verticals else "*",
+            language if language in self._languages else "*",
+        )
+        ruleset = self._compiled.get(key)
+        if ruleset is None:
+            vertical_key, language = key
+            scopes = ["*", f"*:{language}", vertical_key, f"{vertical_key}:{language}"]
+            keywords = [word for scope in dict.fromkeys(scopes) for word in self.keyword_sets.get(scope, [])]
+            ruleset = self._compiled[key] = SafetyRuleset(keywords, vertical_key, language)
+        return ruleset
+
+
+def load_keyword_sets(path: str) -> Dict[str, List[str]]:
+    """Reads and validates a keyword-set file. Raises ValueError if it is malformed."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not all(
+        isinstance(scope, str) and isinstance(words, list) and all(isinstance(w, str) for w in words)
+        for scope, words in data.items()
+    ):
+        raise ValueError(f"{path} must map scopes to lists of keywords")
+    return data
+
+
+def _build_rulebook() -> SafetyRulebook:
+    path = config.SAFETY_KEYWORDS_PATH
+    if not path:
+        return SafetyRulebook(DEFAULT_KEYWORD_SETS)
+    mtime = os.stat(path).st_mtime
+    return SafetyRulebook(load_keyword_sets(path), mtime)
+
+
+_rulebook = _build_rulebook()
+_reload_lock = threading.Lock()
+_last_reload_check = time.monotonic()
+
+
+def reload() -> SafetyRulebook:
+    """
+    Re-reads the keyword file and swaps in the new rules in one assignment, so
+    concurrent requests see either the old rules or the new ones, never a mix.
+    Raises (and keeps the old rules) if the file is missing or malformed.
+    """
+    global _rulebook
+    rulebook = _build_rulebook()
+    _rulebook = rulebook
+    log_event(logger, logging.INFO, "safety_rules_reloaded", scopes=sorted(rulebook.keyword_sets))
+    return rulebook
+
+
+def _maybe_reload():
+    """Reloads the keyword file when it has changed, checking at most every few seconds."""
+    global _last_reload_check
+    path = config.SAFETY_KEYWORDS_PATH
+    now = time.monotonic()
+    if not path or now - _last_reload_check < config.SAFETY_RULES_RELOAD_SECONDS:
+        return
+    if not _reload_lock.acquire(blocking=False):
+        return  # Another request is already checking
+    try:
+        _last_reload_check = now
+        if os.stat(path).st_mtime != _rulebook.mtime:
+            reload()
+    except (OSError, ValueError) as e:
+        log_event(logger, logging.ERROR, "safety_rules_reload_failed", error=str(e))
+    finally:
+        _reload_lock.release()
+
+
+def current(vertical: Optional[str] = None, locale: Optional[str] = None) -> SafetyRuleset:
+    """Returns the ruleset in force for a vertical and locale."""
+    _maybe_reload()
+    return _rulebook.ruleset(vertical, locale)
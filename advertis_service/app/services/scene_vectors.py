@@ -0,0 +1,140 @@
+# advertis_service/app/services/scene_vectors.py
+# A rolling embedding of each session's scene. Retrieval used to embed only
+# the last message, losing the scene around it; re-embedding the whole history
+# every turn would cost more each turn. Instead each session keeps an
+# exponentially decayed mean of its message embeddings in Redis:
+#
+#     scene = decay * scene + (1 - decay) * message
+#
+# and retrieval queries with a blend of the scene and the last message. Only
+# messages not folded in yet are embedded, in one batched call, so the cost of
+# a turn doesn't grow with the length of the session.
+#
+# Retrieval only runs on turns that pass the gates; the messages of the turns
+# in between are folded in on the next turn that reaches it. At most
+# MAX_FOLDED_MESSAGES are embedded per update, so a cold start (a new or
+# expired scene) or a long gap starts from the recent messages rather than
+# embedding the whole history.
+import base64
+import json
+import logging
+import math
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+
+import redis
+
+from app import config
+from app.services import embeddings, redis_client, transcripts
+from app.services.structured_logging import get_logger, log_event
+
+logger = get_logger("scene_vectors")
+
+# Hashes of the last few folded messages are kept to find where the new ones
+# start, even in a partial history (e.g. the recent messages a speculative
+# run gets).
+FOLDED_TAIL_MESSAGES = 4
+# Older messages would carry less than decay ** 8 (under 6% at the default
+# decay) of the scene, so they aren't worth an embedding.
+MAX_FOLDED_MESSAGES = 8
+
+
+def _pack(vector: Sequence[float]) -> str:
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def _unpack(packed: str) -> List[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(packed))
+    return values.tolist()
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _message_hash(message: Dict) -> str:
+    return transcripts.extend_hash(transcripts.EMPTY_HASH, [message])
+
+
+def _unfolded_start(hashes: List[str], folded_tail: List[str]) -> int:
+    """
+    Index of the first message after the last folded one, or 0 if none of
+    the folded messages is in the history.
+    """
+    for end in range(len(hashes), 0, -1):
+        overlap = min(len(folded_tail), end)
+        if overlap and hashes[end - overlap:end] == folded_tail[-overlap:]:
+            return end
+    return 0
+
+
+class SceneTracker:
+    def __init__(self, embed: Callable[[List[str]], Sequence[Sequence[float]]], decay: float = 0.7, blend_weight: float = 0.3):
+        self.embed = embed
+        self.decay = decay
+        self.blend_weight = blend_weight
+
+    def _key(self, session_id: str) -> str:
+        return f"scene:{session_id}"
+
+    def _load(self, session_id: str) -> Optional[Dict]:
+        try:
+            stored = redis_client.redis_client.get(self._key(session_id))
+        except redis.RedisError as e:
+            log_event(logger, logging.WARNING, "scene_store_unavailable", error=str(e))
+            return None
+        return json.loads(stored) if stored else None
+
+    def _save(self, session_id: str, state: Dict):
+        try:
+            redis_client.redis_client.set(self._key(session_id), json.dumps(state), ex=config.SCENE_TTL_SECONDS)
+        except redis.RedisError as e:
+            log_event(logger, logging.WARNING, "scene_store_unavailable", error=str(e))
+
+    def update(self, session_id: str, history: List[Dict]) -> Dict[str, List[float]]:
+        """
+        Folds the history's messages that aren't in the session's scene yet
+        (at most the last MAX_FOLDED_MESSAGES) into it, and returns the scene
+        and the last message's vector. Repeated calls for the same turn embed
+        nothing.
+        """
+        messages = [m for m in history if m.get("role") != "system" and m.get("content")]
+        hashes = [_message_hash(m) for m in messages]
+        stored = self._load(session_id)
+        start = _unfolded_start(hashes, stored["tail"]) if stored else 0
+        if stored and start == len(messages):
+            return {"scene": _unpack(stored["scene"]), "message": _unpack(stored["message"])}
+        start = max(start, len(messages) - MAX_FOLDED_MESSAGES)
+
+        vectors = [_normalize([float(v) for v in vector]) for vector in self.embed([m["content"] for m in messages[start:]])]
+        scene = _unpack(stored["scene"]) if stored else None
+        for vector in vectors:
+            if scene is None or len(scene) != len(vector):
+                scene = vector  # First message, or the embedding space changed
+            else:
+                scene = [self.decay * s + (1.0 - self.decay) * v for s, v in zip(scene, vector)]
+        message = vectors[-1]
+        self._save(session_id, {
+            "tail": hashes[-FOLDED_TAIL_MESSAGES:], "scene": _pack(scene), "message": _pack(message),
+        })
+        return {"scene": scene, "message": message}
+
+    def query_vector(self, session_id: str, history: List[Dict]) -> List[float]:
+        """The retrieval query for this turn: the last message blended with the scene."""
+        vectors = self.update(session_id, history)
+        w = self.blend_weight
+        return _normalize([(1.0 - w) * m + w * s for m, s in zip(vectors["message"], _normalize(vectors["scene"]))])
+
+
+def create_default_tracker() -> Optional[SceneTracker]:
+    """The configured tracker, or None while scene blending is disabled."""
+    if config.SCENE_BLEND_WEIGHT <= 0:
+        return None
+    return SceneTracker(
+        embeddings.shared_backend().function, decay=config.SCENE_DECAY, blend_weight=config.SCENE_BLEND_WEIGHT,
+    )
+
+
+default_tracker = create_default_tracker()
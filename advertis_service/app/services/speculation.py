@@ -0,0 +1,109 @@
+# advertis_service/app/services/speculation.py
+# Speculative pipeline work. A passing check-opportunity can start the agent's
+# first steps (decision gate, retrieval) for the turn it just approved, under a
+# per-session key; the /get-response call that follows attaches to that work
+# instead of starting again. Work that is never claimed, or that was started
+# for a different history, expires and is reported as waste.
+#
+# The registry lives in the process: futures can't be shared through Redis,
+# so this only pays off when both calls of a turn reach the same worker.
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app import config
+from app.services import metrics, transcripts
+from app.services.structured_logging import get_logger, log_event
+
+# The decision gate sees the last 4 messages and retrieval the last one, so
+# speculative work is valid for any history that ends the same way.
+CONTEXT_MESSAGES = 4
+
+logger = get_logger("speculation")
+
+
+def fingerprint(history: List[Dict]) -> str:
+    return transcripts.extend_hash(transcripts.EMPTY_HASH, history[-CONTEXT_MESSAGES:])
+
+
+class Speculation:
+    def __init__(self, session_id: str, fingerprint: str):
+        self.session_id = session_id
+        self.fingerprint = fingerprint
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def busy_seconds(self) -> float:
+        """Time spent on the work so far (or in total, once finished)."""
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class SpeculationRegistry:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Speculation] = {}
+
+    def start(self, session_id: str, history: List[Dict], work: Callable[[], Awaitable[Dict]]):
+        """Starts `work` in the background for this session's next turn, replacing any earlier speculation."""
+        self.sweep()
+        previous = self._entries.pop(session_id, None)
+        if previous is not None:
+            self._discard(previous, "replaced")
+
+        speculation = Speculation(session_id, fingerprint(history))
+
+        async def run() -> Dict:
+            try:
+                return await work()
+            finally:
+                speculation.finished_at = time.monotonic()
+
+        speculation.task = asyncio.get_running_loop().create_task(run())
+        self._entries[session_id] = speculation
+        metrics.SPECULATIONS.inc(outcome="started")
+
+    async def claim(self, session_id: str, history: List[Dict]) -> Optional[Dict]:
+        """
+        Returns the speculative result for this turn, waiting for it if it is
+        still running, or None if there is no usable speculation.
+        """
+        self.sweep()
+        speculation = self._entries.pop(session_id, None)
+        if speculation is None:
+            return None
+        if speculation.fingerprint != fingerprint(history):
+            self._discard(speculation, "mismatch")
+            return None
+        try:
+            result = await speculation.task
+        except Exception as e:
+            self._discard(speculation, "failed", error=str(e))
+            return None
+        metrics.SPECULATIONS.inc(outcome="used")
+        return result
+
+    def sweep(self):
+        """Discards speculations that were not claimed in time."""
+        now = time.monotonic()
+        expired = [s for s in self._entries.values() if now - s.started_at > self.ttl_seconds]
+        for speculation in expired:
+            del self._entries[speculation.session_id]
+            self._discard(speculation, "expired")
+
+    def _discard(self, speculation: Speculation, reason: str, **fields):
+        # Cancelling stops work that hasn't started; a step already running in
+        # a worker thread finishes anyway, and its time counts as waste.
+        if speculation.task is not None and not speculation.task.done():
+            speculation.task.cancel()
+        wasted = speculation.busy_seconds()
+        metrics.SPECULATIONS.inc(outcome=reason)
+        metrics.SPECULATION_WASTED_SECONDS.inc(wasted, reason=reason)
+        log_event(
+            logger, logging.INFO, "speculation_wasted",
+            session_id=speculation.session_id, reason=reason, wasted_seconds=round(wasted, 3), **fields,
+        )
+
+
+registry = SpeculationRegistry(config.SPECULATION_TTL_SECONDS)
@@ -0,0 +1,165 @@
+# advertis_service/app/services/structured_logging.py
+# Structured, non-blocking logging for the request path. Records are
+# formatted as one JSON object per line and handed to a queue; a single
+# background listener thread does the actual stdout writes.
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Any, Dict, Optional
+
+from app import config
+from app.services import tracing
+
+ROOT_LOGGER = "advertis"
+DEBUG_SESSION_LOGGER = f"{ROOT_LOGGER}.debug_session"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns a logger under the service namespace, e.g. 'agent.orchestrator'."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, legacy_text: Optional[str] = None, **fields: Any):
+    """
+    Logs a structured event; keyword arguments become JSON fields. For the
+    debug session, `legacy_text` (the old print output) is emitted instead.
+    """
+    if legacy_text is not None and is_debug_session():
+        logging.getLogger(DEBUG_SESSION_LOGGER).warning(legacy_text)
+    elif logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+# --- Verbose payload dumps ---
+
+def is_debug_session() -> bool:
+    """True when the current request belongs to the configured debug session."""
+    return bool(config.LOG_DEBUG_SESSION_ID) and tracing.current_session_id() == config.LOG_DEBUG_SESSION_ID
+
+
+def should_dump_payload(logger: logging.Logger) -> bool:
+    """
+    Decides whether to build and emit a verbose payload dump (full prompts,
+    candidate lists). Always true for the debug session; otherwise only for a
+    sampled fraction of requests whose logger is at DEBUG level. The sample
+    is drawn once per request, so a sampled request gets all of its dumps.
+    """
+    if is_debug_session():
+        return True
+    return logger.isEnabledFor(logging.DEBUG) and tracing.current_sample() < config.LOG_PAYLOAD_SAMPLE_RATE
+
+
+def dump_payload(logger: logging.Logger, title: str, body: str, legacy_text: str):
+    """
+    Emits a verbose payload. Callers should check `should_dump_payload` first
+    so the (potentially large) body is only built when it will be logged.
+    """
+    log_event(logger, logging.DEBUG, "payload_dump", legacy_text=legacy_text, title=title, body=body)
+
+
+# --- Formatting ---
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps each record with the request's trace and session IDs. It runs on the
+    calling thread, before the record is queued, while the context is live.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = tracing.current_trace_id()
+        record.session_id = tracing.current_session_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+            "session_id": getattr(record, "session_id", None),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text  # Formatted before the record was queued
+        return json.dumps(entry, default=str)
+
+
+class EventQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for the JSON listener. The stock `prepare` appends the
+    traceback to the message, which would change the event name; this keeps
+    the event as the message and the formatted traceback in `exc_text`.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None  # Don't keep the traceback's frames alive on the queue
+        return record
+
+
+def _parse_node_levels(spec: str) -> Dict[str, str]:
+    """Parses 'orchestrator=DEBUG,host_llm=WARNING' into {node: level}."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            node, level = item.split("=", 1)
+            levels[node.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """
+    Installs the queue-backed handlers and per-node levels. Safe to call more
+    than once; only the first call starts the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(config.LOG_LEVEL.upper())
+    root.propagate = False
+    for node, level in _parse_node_levels(config.LOG_NODE_LEVELS).items():
+        get_logger(f"agent.{node}").setLevel(level)
+
+    json_handler = logging.StreamHandler(sys.stdout)
+    json_handler.setFormatter(JsonFormatter())
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = EventQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    root.addHandler(queue_handler)
+
+    # The debug session keeps the old human-readable dumps on a separate,
+    # unformatted stream so they can be read exactly as before.
+    debug_stream = logging.StreamHandler(sys.stdout)
+    debug_stream.setFormatter(logging.Formatter("%(message)s"))
+    debug_logger = logging.getLogger(DEBUG_SESSION_LOGGER)
+    debug_logger.setLevel(logging.DEBUG)
+    debug_logger.propagate = False
+    debug_queue: queue.SimpleQueue = queue.SimpleQueue()
+    debug_logger.addHandler(logging.handlers.QueueHandler(debug_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, json_handler, respect_handler_level=True)
+    _listener.start()
+    debug_listener = logging.handlers.QueueListener(debug_queue, debug_stream)
+    debug_listener.start()
+
+    def shutdown():
+        _listener.stop()
+        debug_listener.stop()
+
+    atexit.register(shutdown)
@@ -0,0 +1,103 @@
+# advertis_service/app/services/tracing.py
+# Per-request trace context. The trace ID sent by the SDK (or generated here)
+# and the step timings collected while serving a request live in context
+# variables, which LangGraph and the hedger copy into their worker threads.
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from app.services import metrics
+
+TRACE_HEADER = "X-Trace-Id"
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Server-Timing metric names for each agent step, in the order they run.
+SERVER_TIMING_NAMES = {
+    "decision_gate": "gate",
+    "retrieval": "retrieval",
+    "orchestrator_llm": "orchestrator",
+    "host_llm": "host_llm",
+}
+
+trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+timings_var: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+# One random draw per request, so everything sampled for a request (e.g. its
+# payload dumps) is taken or skipped together.
+sample_var: ContextVar[Optional[float]] = ContextVar("sample", default=None)
+
+
+def start_trace(trace_id: Optional[str] = None) -> str:
+    """
+    Binds a trace ID and a fresh timings dict to the current context. IDs that
+    are missing or malformed are replaced so they are always safe to log.
+    """
+    if not trace_id or not _VALID_TRACE_ID.match(trace_id):
+        trace_id = uuid.uuid4().hex
+    trace_id_var.set(trace_id)
+    timings_var.set({})
+    sample_var.set(random.random())
+    return trace_id
+
+
+def bind_session(session_id: Optional[str]):
+    """Records which session the current request belongs to."""
+    session_id_var.set(session_id)
+
+
+def current_trace_id() -> Optional[str]:
+    return trace_id_var.get()
+
+
+def current_session_id() -> Optional[str]:
+    return session_id_var.get()
+
+
+def current_sample() -> float:
+    """The request's sampling draw in [0, 1); outside a request, a fresh one each call."""
+    sample = sample_var.get()
+    return random.random() if sample is None else sample
+
+
+def current_timings() -> Dict[str, float]:
+    return timings_var.get() or {}
+
+
+@contextmanager
+def timed_step(step: str):
+    """
+    Times one agent step. The duration feeds the step latency histogram and,
+    when a trace is active, the request's Server-Timing breakdown.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.AGENT_STEP_LATENCY.observe(elapsed, step=step)
+        timings = timings_var.get()
+        if timings is not None:
+            timings[step] = timings.get(step, 0.0) + elapsed
+
+
+def llm_run_config() -> Dict:
+    """LangChain run config that tags LLM and graph runs with the current trace."""
+    trace_id = trace_id_var.get()
+    if not trace_id:
+        return {}
+    return {"metadata": {"trace_id": trace_id}, "tags": [f"trace:{trace_id}"]}
+
+
+def server_timing_header(timings: Dict[str, float], total_seconds: float) -> str:
+    """Formats step timings as a `Server-Timing` header value (durations in ms)."""
+    entries = [
+        f"{name};dur={timings[step] * 1000:.1f}"
+        for step, name in SERVER_TIMING_NAMES.items()
+        if step in timings
+    ]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
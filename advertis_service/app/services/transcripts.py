@@ -0,0 +1,83 @@
+# advertis_service/app/services/transcripts.py
+# Server-side copy of each session's conversation, so the SDK only has to send
+# the messages that are new since its last call. Both sides identify the
+# transcript by a chained hash: each message extends the hash of everything
+# before it, so appending never requires rehashing the whole history.
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+from app.services import redis_client
+
+EMPTY_HASH = ""
+TRANSCRIPT_TTL_SECONDS = 7200  # Matches the session state expiry
+
+
+class TranscriptMismatch(Exception):
+    """The SDK's base hash does not match the transcript stored for the session."""
+
+
+def _canonical(message: Dict) -> str:
+    return json.dumps(message, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def extend_hash(base_hash: str, messages: List[Dict]) -> str:
+    """Returns the hash of the transcript identified by `base_hash` with `messages` appended."""
+    digest = base_hash
+    for message in messages:
+        digest = hashlib.sha256((digest + _canonical(message)).encode("utf-8")).hexdigest()
+    return digest
+
+
+def _key(session_id: str) -> str:
+    return f"transcript:{session_id}"
+
+
+def _cap(messages: List[Dict]) -> List[Dict]:
+    """Keeps the system message (if any) plus the most recent messages."""
+    limit = config.TRANSCRIPT_MAX_MESSAGES
+    head = messages[:1] if messages and messages[0].get("role") == "system" else []
+    body = messages[len(head):]
+    return head + body[-limit:] if len(body) > limit else messages
+
+
+def load(session_id: str) -> Optional[Dict]:
+    stored = redis_client.redis_client.get(_key(session_id))
+    return json.loads(stored) if stored else None
+
+
+def _save(session_id: str, transcript_hash: str, messages: List[Dict]):
+    redis_client.redis_client.set(
+        _key(session_id),
+        json.dumps({"hash": transcript_hash, "messages": _cap(messages)}),
+        ex=TRANSCRIPT_TTL_SECONDS,
+    )
+
+
+def replace(session_id: str, history: List[Dict]) -> Tuple[List[Dict], str]:
+    """
+    Stores a full history sent by the SDK, starting a new hash chain. Returns
+    the capped history, as `apply_delta` does, so the agent sees the same
+    context whichever way the history arrived.
+    """
+    transcript_hash = extend_hash(EMPTY_HASH, history)
+    _save(session_id, transcript_hash, history)
+    return _cap(history), transcript_hash
+
+
+def apply_delta(session_id: str, base_hash: str, new_messages: List[Dict]) -> Tuple[List[Dict], str]:
+    """
+    Appends the SDK's new messages to the stored transcript and returns the
+    reconstructed history with its new hash. Raises TranscriptMismatch if the
+    transcript is missing (e.g. expired) or the SDK built on a different one.
+    """
+    stored = load(session_id)
+    transcript_hash = extend_hash(base_hash, new_messages)
+    if stored is not None and stored["hash"] == transcript_hash:
+        return stored["messages"], transcript_hash  # A retry of a delta that was already applied
+    if stored is None or stored["hash"] != base_hash:
+        raise TranscriptMismatch(session_id)
+    history = stored["messages"] + new_messages
+    _save(session_id, transcript_hash, history)
+    return _cap(history), transcript_hash
@@ -1,13 +1,14 @@
 # advertis_service/app/services/vector_store.py
 import chromadb
-from chromadb.utils import embedding_functions
 from app import config
+from app.services import embeddings
 from chromadb.api.models.Collection import Collection
 
-def create_chroma_collection() -> Collection:
+def create_chroma_collection(provider: str = None) -> Collection:
     """
     Creates and returns a ChromaDB collection object.
     This function is the single source of truth for our vector store connection.
+    The collection must hold vectors from the configured embedding provider.
     """
     print("VECTOR_STORE: Creating ChromaDB client and collection...")
     
@@ -16,14 +17,13 @@ def create_chroma_collection() -> Collection:
         port=config.CHROMA_PORT
     )
 
-    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=config.OPENAI_API_KEY,
-                model_name="text-embedding-3-small"
-            )
+    backend = embeddings.shared_backend(provider)
 
     product_collection = chroma_client.get_or_create_collection(
-        name="advertis_products",
-        embedding_function=openai_ef
+        name=config.CHROMA_COLLECTION,
+        embedding_function=backend.function,
+        metadata={embeddings.SPACE_KEY: backend.space}
     )
+    embeddings.check_space(product_collection, backend.space)
     
-    return product_collection
\ No newline at end of file
+    return product_collection
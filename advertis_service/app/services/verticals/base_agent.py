@@ -1,6 +1,6 @@
 # advertis_service/app/services/verticals/base_agent.py
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class BaseAgent(ABC):
     """
@@ -9,9 +9,23 @@ class BaseAgent(ABC):
     """
     
     @abstractmethod
-    async def run(self, history: List[dict]) -> Dict:
+    async def run(
+        self, history: List[dict], precomputed: Optional[Dict] = None,
+        generation_mode: str = "standard", tenant_id: Optional[str] = None,
+    ) -> Dict:
         """
         The main entry point to run the agent.
-        Every vertical agent MUST implement this method.
+        Every vertical agent MUST implement this method. `precomputed` holds
+        results of `speculate` for the same turn, which the agent may reuse.
+        In "economy" `generation_mode` the agent writes its response more cheaply;
+        `tenant_id` selects tenant-specific model routes.
         """
-        pass 
\ No newline at end of file
+        pass
+
+    async def speculate(self, history: List[dict], tenant_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Runs the agent's first steps ahead of time for a turn that is likely to
+        follow, on `tenant_id`'s model routes. Agents without speculative steps
+        return None.
+        """
+        return None 
\ No newline at end of file
@@ -1,13 +1,19 @@
 # advertis_service/app/services/verticals/gaming/agent.py
+import asyncio
 import json
-from typing import TypedDict, List, Optional
+import logging
+import time
+from typing import Any, Dict, NamedTuple, TypedDict, List, Optional
 
 from app import config
 from app.services.verticals.base_agent import BaseAgent
 from app.services.verticals.gaming import prompts
+from app.services import gate_classifier, generation_mode, hedging, llm_scheduler, metrics, model_router, scene_vectors, tracing
+from app.services.structured_logging import get_logger, log_event, should_dump_payload, dump_payload
 from chromadb.api.models.Collection import Collection
 
 from pydantic import BaseModel, Field
+from langchain_core.callbacks import UsageMetadataCallbackHandler
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 import re
@@ -22,6 +28,8 @@ class AgentState(TypedDict):
     orchestration_result: dict
     final_response: Optional[str]
     final_decision: str
+    generation_mode: str
+    tenant_id: Optional[str]
 
 
 # --- 2. Define Pydantic Models for AI responses (for reliable parsing) ---
@@ -42,15 +50,40 @@ class OrchestratorResponse(BaseModel):
     creative_brief: Optional[CreativeBrief] = None
 
 
+class LLMCallResult(NamedTuple):
+    """The raw LLM response together with the token usage it reported."""
+    response: Any
+    usage_metadata: Dict[str, int]
+
+
 class GamingAgent(BaseAgent):
-    def __init__(self, chroma_collection: Collection):
+    def __init__(
+        self,
+        chroma_collection: Collection,
+        hedger: Optional[hedging.RequestHedger] = None,
+        scheduler: Optional[llm_scheduler.LLMScheduler] = None,
+        classifier: Optional[gate_classifier.GateClassifier] = None,
+        router: Optional[model_router.ModelRouter] = None,
+        scene_tracker: Optional[scene_vectors.SceneTracker] = None,
+    ):
         # All LangGraph assembly logic goes here.
         workflow = StateGraph(AgentState)
         self.chroma_collection = chroma_collection
+        self.hedger = hedger or hedging.default_hedger
+        self.scheduler = scheduler or llm_scheduler.default_scheduler
+        self.gate_classifier = classifier or gate_classifier.default_classifier
+        self.router = router or model_router.default_router
+        self.scene_tracker = scene_tracker or scene_vectors.default_tracker
+        # One logger per node so verbosity can be tuned node by node.
+        self.loggers = {
+            node: get_logger(f"agent.{node}")
+            for node in ("decision_gate", "orchestrator", "host_llm", "economy", "skip_node")
+        }
 
         workflow.add_node("decision_gate", self.decision_gate_node)
         workflow.add_node("orchestrator", self.orchestrator_node)
         workflow.add_node("host_llm", self.host_llm_node)
+        workflow.add_node("economy", self.economy_node)
         workflow.add_node("skip_node", self.skip_node)
 
         workflow.set_entry_point("decision_gate")
@@ -62,57 +95,146 @@ class GamingAgent(BaseAgent):
 
         workflow.add_conditional_edges("orchestrator", self.should_generate, {
             "host_llm": "host_llm",
+            "economy": "economy",
             "skip_node": "skip_node"
         })
 
         workflow.add_edge("host_llm", END)
+        workflow.add_edge("economy", END)
         workflow.add_edge("skip_node", END)
 
         self.app = workflow.compile()
 
-    # --- Node methods ---
-    def decision_gate_node(self, state: AgentState):
-        print("---AGENT: Running Decision Gate---")
-        llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0, api_key=config.OPENAI_API_KEY).with_structured_output(ConversationAnalysis)
-        history_str = json.dumps(state["conversation_history"][-4:])
-
-        response = llm.invoke(prompts.DECISION_GATE_PROMPT + f"\n\nConversation History (last 4 turns):\n{history_str}")
-
-        return {"opportunity_assessment": response.model_dump()}
-
-    def orchestrator_node(self, state: AgentState):
-        print("---AGENT: Running Orchestrator---")
-        last_user_message = state["conversation_history"][-1]["content"]
-        results = self.chroma_collection.query(
-            query_texts=[last_user_message],
-            n_results=5,
-            where={"target_vertical": "gaming"}
-        )
+    # --- LLM call helper ---
+    def _invoke_llm(self, node: str, model: str, llm, payload):
+        """
+        Single choke point for every LLM call made by the graph nodes. Each
+        attempt (including hedged duplicates) waits for rate-limit capacity.
+        Returns the winning attempt's LLMCallResult.
+        """
+        estimated_tokens = llm_scheduler.estimate_tokens(payload)
+        priority = llm_scheduler.NODE_PRIORITIES.get(node, llm_scheduler.PRIORITY_DECISION_GATE)
+
+        def attempt() -> LLMCallResult:
+            self.scheduler.acquire(model, estimated_tokens, priority)
+            usage_handler = UsageMetadataCallbackHandler()
+            response = llm.invoke(payload, config={"callbacks": [usage_handler], **tracing.llm_run_config()})
+            usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+            for reported in usage_handler.usage_metadata.values():
+                for field in usage:
+                    usage[field] += reported.get(field, 0)
+            self.scheduler.settle(model, estimated_tokens, usage["total_tokens"])
+            metrics.record_token_usage(model, usage)
+            return LLMCallResult(response=response, usage_metadata=usage)
+
+        return self.hedger.call(node, attempt)
+
+    def _call_routed(self, node: str, state: AgentState, payload, structured_output=None, route_name: Optional[str] = None):
+        """
+        Calls the model the router picks for this node (and tenant), falling
+        back along the route's chain when a model errors.
+        """
+        route = self.router.resolve(route_name or node, state.get("tenant_id"))
+        last_error = None
+        for model in self.router.plan(route):
+            llm = ChatOpenAI(model=model, temperature=route.temperature, api_key=config.OPENAI_API_KEY)
+            if structured_output is not None:
+                llm = llm.with_structured_output(structured_output)
+            started = time.perf_counter()
+            try:
+                result = self._invoke_llm(node, model, llm, payload)
+            except Exception as e:
+                self.router.record_failure(route, model, e)
+                last_error = e
+                continue
+            self.router.record_success(route, model, time.perf_counter() - started, result.usage_metadata)
+            return result.response
+        raise last_error
+
+    # --- Retrieval step ---
+    def retrieve_candidates(self, state: AgentState) -> List[str]:
+        """
+        Queries the vector store for products matching the latest user message,
+        blended with the session's scene when scene vectors are enabled.
+        """
+        with tracing.timed_step("retrieval"):
+            last_user_message = state["conversation_history"][-1]["content"]
+            session_id = tracing.current_session_id()
+            if self.scene_tracker is not None and session_id and last_user_message:
+                query = {"query_embeddings": [self.scene_tracker.query_vector(session_id, state["conversation_history"])]}
+            else:
+                query = {"query_texts": [last_user_message]}
+            results = self.chroma_collection.query(
+                **query,
+                n_results=5,
+                where={"target_vertical": "gaming"}
+            )
 
         candidate_docs = []
         if results['ids'][0]:
             for i, doc in enumerate(results['documents'][0]):
                 meta = results['metadatas'][0][i]
                 candidate_docs.append(f"Product {i+1}:\nID: {results['ids'][0][i]}\nDescription: {doc}\nMetadata: {json.dumps(meta, indent=2)}")
+        return candidate_docs
 
-        print("\n---ORCHESTRATOR DEBUG: Candidate Products---")
-        if candidate_docs:
-            print("\n".join(candidate_docs))
-        else:
-            print("No relevant products found in vector store.")
-        print("-------------------------------------------\n")
+    # --- Node methods ---
+    def decision_gate_node(self, state: AgentState):
+        log_event(self.loggers["decision_gate"], logging.DEBUG, "node_started", legacy_text="---AGENT: Running Decision Gate---", node="decision_gate")
+        if state.get("opportunity_assessment"):
+            return {"opportunity_assessment": state["opportunity_assessment"]}  # Already decided speculatively
+        recent_history = state["conversation_history"][-4:]
+
+        # Obvious cases are answered locally; only ambiguous ones reach the LLM
+        if self.gate_classifier is not None:
+            with tracing.timed_step("decision_gate"):
+                verdict = self.gate_classifier.decide(recent_history)
+            if verdict.opportunity is not None:
+                metrics.GATE_CLASSIFIER_DECISIONS.inc(outcome="opportunity" if verdict.opportunity else "skip")
+                return {"opportunity_assessment": {
+                    "opportunity": verdict.opportunity,
+                    "reasoning": f"Local classifier (p={verdict.probability:.2f}).",
+                }}
+            metrics.GATE_CLASSIFIER_DECISIONS.inc(outcome="deferred")
+
+        history_str = json.dumps(recent_history)
+
+        with tracing.timed_step("decision_gate"):
+            response = self._call_routed(
+                "decision_gate", state, prompts.DECISION_GATE_PROMPT + f"\n\nConversation History (last 4 turns):\n{history_str}",
+                structured_output=ConversationAnalysis,
+            )
+
+        gate_classifier.record_decision(recent_history, response.opportunity)
+        return {"opportunity_assessment": response.model_dump()}
+
+    def orchestrator_node(self, state: AgentState):
+        logger = self.loggers["orchestrator"]
+        log_event(logger, logging.DEBUG, "node_started", legacy_text="---AGENT: Running Orchestrator---", node="orchestrator")
+        candidate_docs = state.get("candidate_products")
+        if candidate_docs is None:
+            candidate_docs = self.retrieve_candidates(state)
+        log_event(logger, logging.INFO, "candidates_retrieved", candidates=len(candidate_docs))
+
+        if should_dump_payload(logger):
+            body = "\n".join(candidate_docs) if candidate_docs else "No relevant products found in vector store."
+            dump_payload(
+                logger, "candidate_products", body,
+                legacy_text=f"\n---ORCHESTRATOR DEBUG: Candidate Products---\n{body}\n-------------------------------------------\n",
+            )
 
         if not candidate_docs:
             return {"orchestration_result": {"decision": "skip"}}
 
-        llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0.7, api_key=config.OPENAI_API_KEY)
         full_prompt = prompts.ORCHESTRATOR_PROMPT + f"\n\nConversation History:\n{json.dumps(state['conversation_history'])}\n\nCandidate Products:\n" + "\n".join(candidate_docs)
 
-        print("\n---ORCHESTRATOR DEBUG: Full Prompt to LLM---")
-        print(full_prompt)
-        print("--------------------------------------------\n")
+        if should_dump_payload(logger):
+            dump_payload(
+                logger, "orchestrator_prompt", full_prompt,
+                legacy_text=f"\n---ORCHESTRATOR DEBUG: Full Prompt to LLM---\n{full_prompt}\n--------------------------------------------\n",
+            )
 
-        response_str = llm.invoke(full_prompt).content
+        with tracing.timed_step("orchestrator_llm"):
+            response_str = self._call_routed("orchestrator", state, full_prompt).content
 
         try:
             json_match = re.search(r"\{.*\}", response_str, re.DOTALL)
@@ -125,13 +247,35 @@ class GamingAgent(BaseAgent):
             return {"orchestration_result": validated_response.model_dump()}
 
         except (json.JSONDecodeError, Exception) as e:
-            print(f"---AGENT: ERROR - Failed to parse Orchestrator response. Forcing skip. Error: {e}---")
-            print(f"---AGENT: Raw LLM Output was: {response_str}---")
+            log_event(
+                logger, logging.WARNING, "orchestrator_parse_failed",
+                legacy_text=f"---AGENT: ERROR - Failed to parse Orchestrator response. Forcing skip. Error: {e}---\n---AGENT: Raw LLM Output was: {response_str}---",
+                error=str(e), raw_output=response_str[:2000],
+            )
             return {"orchestration_result": {"decision": "skip"}}
 
     def host_llm_node(self, state: AgentState):
-        print("---AGENT: Running Host LLM---")
-        llm = ChatOpenAI(model="gpt-4.1", temperature=0.7, api_key=config.OPENAI_API_KEY)
+        log_event(self.loggers["host_llm"], logging.DEBUG, "node_started", legacy_text="---AGENT: Running Host LLM---", node="host_llm")
+        return self._write_placement(state, "host_llm")
+
+    def economy_node(self, state: AgentState):
+        """
+        Writes the placement cheaply under load: either the orchestrator's
+        example narration dropped into a fixed template, with no further LLM
+        call, or the host prompt on the smaller economy model.
+        """
+        log_event(self.loggers["economy"], logging.DEBUG, "node_started", node="economy", strategy=config.ECONOMY_STRATEGY)
+        narration = (state["orchestration_result"]["creative_brief"].get("example_narration") or "").strip().strip('"').strip()
+        if config.ECONOMY_STRATEGY == "template" and narration:
+            if narration[-1] not in ".!?":
+                narration += "."
+            return {
+                "final_response": prompts.ECONOMY_TEMPLATE.format(narration=narration),
+                "final_decision": "inject"
+            }
+        return self._write_placement(state, "economy")
+
+    def _write_placement(self, state: AgentState, route_name: str):
         system_prompt = prompts.HOST_LLM_PROMPT
         brief_str = json.dumps(state["orchestration_result"]["creative_brief"])
         brief_instruction = f"--- DIRECTOR'S BRIEF ---\n{brief_str}\n--- END BRIEF ---"
@@ -142,7 +286,8 @@ class GamingAgent(BaseAgent):
             ("system", brief_instruction)
         ]
 
-        final_response = llm.invoke(messages)
+        with tracing.timed_step("host_llm"):
+            final_response = self._call_routed("host_llm", state, messages, route_name=route_name)
 
         return {
             "final_response": final_response.content,
@@ -150,7 +295,7 @@ class GamingAgent(BaseAgent):
         }
 
     def skip_node(self, state: AgentState):
-        print("---AGENT: Skipping ad injection.---")
+        log_event(self.loggers["skip_node"], logging.INFO, "ad_skipped", legacy_text="---AGENT: Skipping ad injection.---")
         return {
             "final_response": None,
             "final_decision": "skip"
@@ -159,23 +304,51 @@ class GamingAgent(BaseAgent):
     # --- Conditional edge methods ---
     def should_orchestrate(self, state: AgentState):
         assessment = state['opportunity_assessment']
-        print(f"---AGENT: Decision Gate result: {assessment['opportunity']} | Reason: {assessment['reasoning']}---")
+        log_event(
+            self.loggers["decision_gate"], logging.INFO, "decision_gate_result",
+            legacy_text=f"---AGENT: Decision Gate result: {assessment['opportunity']} | Reason: {assessment['reasoning']}---",
+            opportunity=assessment["opportunity"], reasoning=assessment["reasoning"],
+        )
         if assessment["opportunity"]:
             return "orchestrator"
         else:
             return "skip_node"
 
     def should_generate(self, state: AgentState):
-        print(f"---AGENT: Orchestrator result: {state['orchestration_result']['decision']}---")
+        log_event(
+            self.loggers["orchestrator"], logging.INFO, "orchestrator_result",
+            legacy_text=f"---AGENT: Orchestrator result: {state['orchestration_result']['decision']}---",
+            decision=state["orchestration_result"]["decision"],
+            product_id=state["orchestration_result"].get("product_id"),
+        )
         if state["orchestration_result"]["decision"] == "inject":
-            return "host_llm"
+            return "economy" if state.get("generation_mode") == generation_mode.ECONOMY else "host_llm"
         else:
             return "skip_node"
 
+    # --- Speculation ---
+    async def speculate(self, history: list[dict], tenant_id: Optional[str] = None) -> dict:
+        """
+        Runs the decision gate and retrieval side by side for a turn whose
+        /get-response is expected shortly; `run` picks up where they left off.
+        """
+        state = {"conversation_history": history, "app_vertical": "gaming", "tenant_id": tenant_id}
+        gate_update, candidate_docs = await asyncio.gather(
+            asyncio.to_thread(self.decision_gate_node, state),
+            asyncio.to_thread(self.retrieve_candidates, state),
+        )
+        return {**gate_update, "candidate_products": candidate_docs}
+
     # --- Public run method ---
-    async def run(self, history: list[dict]) -> dict:
-        inputs = {"conversation_history": history, "app_vertical": "gaming"}
-        final_state = await self.app.ainvoke(inputs)
+    async def run(
+        self, history: list[dict], precomputed: Optional[dict] = None,
+        generation_mode: str = "standard", tenant_id: Optional[str] = None,
+    ) -> dict:
+        inputs = {
+            "conversation_history": history, "app_vertical": "gaming",
+            "generation_mode": generation_mode, "tenant_id": tenant_id, **(precomputed or {}),
+        }
+        final_state = await self.app.ainvoke(inputs, config=tracing.llm_run_config())
         return {
             "status": final_state["final_decision"],
             "response_text": final_state["final_response"]
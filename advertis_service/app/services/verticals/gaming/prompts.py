@@ -82,4 +82,8 @@ Your sole function is to generate a single, high-quality narrative response that
 ---
 
 Execute your mission.
-"""
\ No newline at end of file
+"""
+
+# Economy mode's placement when the host LLM is skipped: the orchestrator's
+# example narration, followed by a neutral hand-back to the player.
+ECONOMY_TEMPLATE = "{narration} What do you do next?"
@@ -0,0 +1,147 @@
+"""
+eval_economy_mode.py
+
+Reports the quality delta of economy mode against the standard host LLM on
+the evaluation dataset's inject cases, using the live OpenAI API and ChromaDB.
+Each case runs the decision gate and orchestrator once; the same brief is
+then written by the host LLM, by the economy template, and by the economy
+model, so the three outputs are compared on identical placements.
+
+Per mode it reports:
+  - snippet hits: the case's `ideal_response_snippet` appears in the response
+  - narration kept: the brief's `example_narration` appears almost verbatim
+  - continuity: share of the player's last-message words echoed in the response
+  - words and latency per response
+
+Like test_live_llm.py, this is run manually, not as part of the pytest suite.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from difflib import SequenceMatcher
+from statistics import mean
+from typing import Any, Callable, Dict, List
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+os.environ["CHROMA_URL"] = "http://localhost:8001"
+
+from app import config
+from app.services.verticals.gaming.agent import GamingAgent
+from app.services.vector_store import create_chroma_collection
+
+load_dotenv()
+if not os.getenv("OPENAI_API_KEY"):
+    raise ValueError("FATAL: OPENAI_API_KEY environment variable is missing.")
+
+_WORD = re.compile(r"[a-z']+")
+STOPWORDS = {"i", "a", "an", "the", "to", "and", "of", "my", "in", "on", "at", "into", "with", "for", "it", "is"}
+
+
+def load_inject_cases() -> List[Dict[str, Any]]:
+    data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'test_dataset.json')
+    with open(data_path, "r") as f:
+        return [case for case in json.load(f) if case["expected_status"] == "inject"]
+
+
+def score(case: Dict[str, Any], brief: Dict[str, Any], response: str) -> Dict[str, float]:
+    text = response.lower()
+    narration = (brief.get("example_narration") or "").strip().strip('"').lower()
+    last_words = {w for w in _WORD.findall(case["last_message"].lower()) if w not in STOPWORDS}
+    best_match = max(
+        (SequenceMatcher(None, narration, text[i:i + len(narration)]).ratio() for i in range(0, max(len(text) - len(narration), 0) + 1, 5)),
+        default=0.0,
+    )
+    return {
+        "snippet_hit": float(case["ideal_response_snippet"].lower() in text),
+        "narration_kept": float(best_match >= 0.8),
+        "continuity": len(last_words & set(_WORD.findall(text))) / max(len(last_words), 1),
+        "words": float(len(text.split())),
+    }
+
+
+def timed(write: Callable[[], Dict[str, Any]]):
+    started = time.perf_counter()
+    update = write()
+    return update["final_response"], time.perf_counter() - started
+
+
+def write_with_strategy(agent: GamingAgent, state: Dict[str, Any], strategy: str) -> Callable[[], Dict[str, Any]]:
+    def write():
+        previous, config.ECONOMY_STRATEGY = config.ECONOMY_STRATEGY, strategy
+        try:
+            return agent.economy_node(state)
+        finally:
+            config.ECONOMY_STRATEGY = previous
+    return write
+
+
+async def evaluate_case(agent: GamingAgent, case: Dict[str, Any]) -> Dict[str, Any]:
+    state: Dict[str, Any] = {"conversation_history": case["history"], "app_vertical": "gaming"}
+    state.update(await asyncio.to_thread(agent.decision_gate_node, state))
+    if not state["opportunity_assessment"]["opportunity"]:
+        return {"case_id": case["id"], "skipped": "decision_gate"}
+    state.update(await asyncio.to_thread(agent.orchestrator_node, state))
+    if state["orchestration_result"]["decision"] != "inject":
+        return {"case_id": case["id"], "skipped": "orchestrator"}
+
+    brief = state["orchestration_result"]["creative_brief"]
+    writers = {
+        "standard": lambda: agent.host_llm_node(state),
+        "economy/template": write_with_strategy(agent, state, "template"),
+        f"economy/model ({config.ECONOMY_MODEL})": write_with_strategy(agent, state, "model"),
+    }
+    modes = {}
+    for mode, write in writers.items():
+        response, seconds = await asyncio.to_thread(timed, write)
+        modes[mode] = {**score(case, brief, response), "latency_s": seconds, "response": response}
+    return {"case_id": case["id"], "modes": modes}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    compared = [r for r in results if "modes" in r]
+    if not compared:
+        return {}
+    summary = {}
+    for mode in compared[0]["modes"]:
+        rows = [r["modes"][mode] for r in compared]
+        summary[mode] = {metric: round(mean(row[metric] for row in rows), 3) for metric in ("snippet_hit", "narration_kept", "continuity", "words", "latency_s")}
+    standard = summary["standard"]
+    for mode, values in summary.items():
+        if mode != "standard":
+            values["delta_vs_standard"] = {metric: round(values[metric] - standard[metric], 3) for metric in standard}
+    return summary
+
+
+async def main():
+    print("--- Starting Economy Mode Evaluation ---")
+    try:
+        agent = GamingAgent(chroma_collection=create_chroma_collection())
+    except Exception as e:
+        print("\nFATAL ERROR: Could not connect to ChromaDB for live evaluation.")
+        print("Please ensure the Docker containers are running with 'docker-compose up -d'.")
+        print(f"Details: {e}")
+        return
+
+    cases = load_inject_cases()
+    print(f"\nComparing generation modes on {len(cases)} inject cases...")
+    results = []
+    for case in cases:
+        print(f"  - {case['id']}")
+        results.append(await evaluate_case(agent, case))
+
+    report = {
+        "evaluation_timestamp": time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime()),
+        "summary": {"cases": len(cases), "compared": sum("modes" in r for r in results), "modes": summarize(results)},
+        "detailed_results": results,
+    }
+    print("\n--- Economy Mode Evaluation Complete ---")
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
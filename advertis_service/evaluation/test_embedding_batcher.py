@@ -0,0 +1,141 @@
+"""
+test_embedding_batcher.py
+
+Unit tests for micro-batched embeddings in `app.services.embedding_batcher`:
+concurrent texts share one provider call, batches respect the size cap,
+duplicates are embedded once, a slow call doesn't hold up later batches, and
+failures reach every waiting caller.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import embedding_batcher, metrics
+
+
+class RecordingEmbedder:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("provider down")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_concurrent_queries_share_one_call():
+    """
+    GIVEN: A batcher with a 50 ms window.
+    WHEN: Eight threads embed different texts at the same time.
+    THEN: One provider call embeds all eight, each caller gets its own vector,
+          and the batch size is recorded.
+    """
+    embedder = RecordingEmbedder()
+    batcher = embedding_batcher.EmbeddingBatcher(embedder, window_seconds=0.05, max_batch_size=64)
+    texts = [f"I walk into bar number {'x' * i}" for i in range(8)]
+    batches_before = metrics.EMBEDDING_BATCH_SIZE.count()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda text: batcher.embed([text])[0], texts))
+
+    assert len(embedder.calls) == 1
+    assert sorted(embedder.calls[0]) == sorted(texts)
+    assert results == [[float(len(text)), 1.0] for text in texts]
+    assert metrics.EMBEDDING_BATCH_SIZE.count() == batches_before + 1
+
+
+def test_full_batches_are_sent_without_waiting_and_duplicates_embedded_once():
+    """
+    GIVEN: A batcher with a long window and a batch size of 3.
+    WHEN: Six texts (two of them identical) are submitted at once.
+    THEN: They go out as two full batches right away, and the duplicate pair
+          is embedded once but answered twice.
+    """
+    embedder = RecordingEmbedder()
+    batcher = embedding_batcher.EmbeddingBatcher(embedder, window_seconds=30, max_batch_size=3)
+
+    vectors = batcher.embed(["a", "a", "bb", "ccc", "dddd", "eeeee"])
+
+    assert sorted(embedder.calls) == [["a", "bb"], ["ccc", "dddd", "eeeee"]]
+    assert vectors[0] == vectors[1] == [1.0, 1.0]
+
+
+def test_a_slow_batch_does_not_hold_up_the_next():
+    """
+    GIVEN: A provider whose first call hangs until released.
+    WHEN: A second text is embedded while the first batch is still in flight.
+    THEN: The second batch is sent and answered before the first returns.
+    """
+    started, release = threading.Event(), threading.Event()
+
+    class HangingEmbedder(RecordingEmbedder):
+        def __call__(self, texts):
+            if texts == ["slow"]:
+                started.set()
+                release.wait(5)
+            return super().__call__(texts)
+
+    embedder = HangingEmbedder()
+    batcher = embedding_batcher.EmbeddingBatcher(embedder, window_seconds=0.01)
+    slow = batcher.submit(["slow"])[0]
+    assert started.wait(5)
+
+    try:
+        assert batcher.embed(["fast"]) == [[4.0, 1.0]]
+        assert not slow.done()
+    finally:
+        release.set()
+    assert slow.result(timeout=5) == [4.0, 1.0]
+    assert embedder.calls == [["fast"], ["slow"]]
+
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_waiting_caller():
+    """
+    GIVEN: A provider that raises.
+    WHEN: Two async callers embed in the same batch.
+    THEN: Both see the provider's error.
+    """
+    batcher = embedding_batcher.EmbeddingBatcher(RecordingEmbedder(fail=True), window_seconds=0.01)
+
+    results = await asyncio.gather(batcher.embed_async(["a"]), batcher.embed_async(["b"]), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_wrapped_function_keeps_the_collection_settings(monkeypatch):
+    """
+    GIVEN: A Chroma embedding function wrapped by the batcher.
+    WHEN: Chroma asks for its name and config, and embeds a query.
+    THEN: It reports the inner function's settings and returns its vectors;
+          with a zero window the function is left unwrapped.
+    """
+    class Inner(embedding_batcher.EmbeddingFunction):
+        def __init__(self):
+            pass
+
+        def __call__(self, input):
+            return [[1.0, 2.0] for _ in input]
+
+        def name(self):
+            return "openai"
+
+        def get_config(self):
+            return {"model_name": "text-embedding-3-small"}
+
+    inner = Inner()
+    monkeypatch.setattr(embedding_batcher.config, "EMBEDDING_BATCH_WINDOW_MS", 1)
+    wrapped = embedding_batcher.wrap(inner)
+
+    assert wrapped.name() == "openai"
+    assert wrapped.get_config() == {"model_name": "text-embedding-3-small"}
+    assert [list(v) for v in wrapped.embed_query(["I order a drink."])] == [[1.0, 2.0]]
+
+    monkeypatch.setattr(embedding_batcher.config, "EMBEDDING_BATCH_WINDOW_MS", 0)
+    assert embedding_batcher.wrap(inner) is inner
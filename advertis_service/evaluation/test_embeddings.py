@@ -0,0 +1,87 @@
+"""
+test_embeddings.py
+
+Unit tests for the embedding providers in `app.services.embeddings`: the
+local hashing backend, provider selection, and the consistency check that
+keeps one collection in one embedding space.
+"""
+import math
+
+import pytest
+
+from app.services import embeddings
+
+
+class FakeCollection:
+    def __init__(self, metadata=None, count=0):
+        self.name = "advertis_products"
+        self.metadata = metadata
+        self._count = count
+
+    def count(self):
+        return self._count
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+
+def _cosine(a, b):
+    return float(sum(x * y for x, y in zip(a, b)))
+
+
+def test_hashing_embeddings_are_deterministic_normalized_and_lexical():
+    """
+    GIVEN: The local hashing embedding function.
+    WHEN: It embeds a query, the same query again, a related and an unrelated text.
+    THEN: Vectors are stable and unit-length, and the related text is closer.
+    """
+    function = embeddings.HashingEmbeddingFunction(dim=512)
+    query, again, related, unrelated = function([
+        "I order a whiskey at the bar.",
+        "I order a whiskey at the bar.",
+        "A bottle of whiskey sits on the bar.",
+        "The starship jumps to hyperspace.",
+    ])
+
+    assert list(query) == list(again)
+    assert len(query) == 512
+    assert math.isclose(float(sum(v * v for v in query)), 1.0, rel_tol=1e-6)
+    assert _cosine(query, related) > _cosine(query, unrelated)
+
+
+def test_create_backend_names_its_space():
+    """
+    GIVEN: The hashing provider and an unknown provider name.
+    WHEN: Backends are created.
+    THEN: The hashing backend reports a space tied to its settings; the
+          unknown name is refused.
+    """
+    backend = embeddings.create_backend("hashing")
+
+    assert backend.space.startswith("advertis-hashing:v1:")
+    with pytest.raises(ValueError):
+        embeddings.create_backend("word2vec")
+
+
+@pytest.mark.parametrize("metadata, count, space, error", [
+    ({embeddings.SPACE_KEY: "advertis-hashing:v1:1024"}, 80, "advertis-hashing:v1:1024", False),
+    ({embeddings.SPACE_KEY: "advertis-hashing:v1:1024"}, 80, "advertis-hashing:v1:2048", True),  # Same provider, other settings
+    (None, 80, embeddings.LEGACY_SPACE, False),  # Seeded before spaces were recorded
+    (None, 80, "advertis-hashing:v1:1024", True),
+    (None, 0, "advertis-hashing:v1:1024", False),  # Empty: adopts the space
+])
+def test_check_space_refuses_mixed_spaces(metadata, count, space, error):
+    """
+    GIVEN: Collections seeded in various embedding spaces (or not at all).
+    WHEN: They are opened with a provider's space.
+    THEN: Only a matching (or empty) collection is accepted.
+    """
+    collection = FakeCollection(metadata, count)
+
+    if error:
+        with pytest.raises(embeddings.EmbeddingSpaceMismatch):
+            embeddings.check_space(collection, space)
+    else:
+        embeddings.check_space(collection, space)
+        if count == 0:
+            assert collection.metadata[embeddings.SPACE_KEY] == space
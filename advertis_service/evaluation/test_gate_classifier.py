@@ -0,0 +1,123 @@
+"""
+test_gate_classifier.py
+
+Unit tests for the local decision-gate classifier in
+`app.services.gate_classifier`, and for how `decision_gate_node` uses it:
+confident verdicts skip the LLM, ambiguous ones defer to it (and are logged
+as training data).
+"""
+import json
+
+import pytest
+
+from app import config
+from app.services import gate_classifier
+from app.services.verticals.gaming.agent import GamingAgent, ConversationAnalysis
+from evaluation.test_utils import MockChromaCollection, MockLLM
+
+OPPORTUNITIES = [
+    "I walk into the bar and order a drink.",
+    "I grab a coffee at the diner before the stakeout.",
+    "I pack my bag with gear for the long trip.",
+    "I drive across the city in my car.",
+]
+SKIPS = ["hi", "go north", "(OOC: great story!)", "hello there"]
+
+
+def _history(message):
+    return [{"role": "system", "content": "You are a GM."}, {"role": "user", "content": message}]
+
+
+@pytest.fixture(scope="module")
+def trained():
+    examples = [(_history(m), True) for m in OPPORTUNITIES] + [(_history(m), False) for m in SKIPS]
+    model = gate_classifier.train(examples, dim=2 ** 12, epochs=60)
+    model.skip_below, model.opportunity_above = 0.3, 0.7
+    return model
+
+
+def test_hashed_features_are_stable_and_normalized():
+    """
+    GIVEN: The same history featurized twice.
+    WHEN: Its features are hashed.
+    THEN: The vectors are identical (stable hashing) and have unit length.
+    """
+    features = gate_classifier.extract_features(_history("I walk into the bar."))
+    first = gate_classifier.hash_features(features, 2 ** 12)
+
+    assert first == gate_classifier.hash_features(list(features), 2 ** 12)
+    assert abs(sum(v * v for v in first.values()) - 1.0) < 1e-9
+    assert "w:bar" in features and "b:<s> i" in features
+
+
+def test_trained_classifier_answers_obvious_cases(trained):
+    """
+    GIVEN: A classifier trained on clear opportunities and clear skips.
+    WHEN: It sees a training-like scene and a greeting.
+    THEN: It answers both confidently and correctly.
+    """
+    assert trained.decide(_history("I walk into the bar and order a drink.")).opportunity is True
+    assert trained.decide(_history("hi")).opportunity is False
+
+
+def test_artifact_round_trip(tmp_path, trained):
+    """
+    GIVEN: A trained classifier saved as an artifact.
+    WHEN: It is loaded back, and a file in an unknown format is loaded.
+    THEN: The copy gives the same probabilities; the unknown format is refused.
+    """
+    path = tmp_path / "gate.json"
+    trained.save(str(path))
+    loaded = gate_classifier.GateClassifier.load(str(path))
+
+    history = _history("I order a coffee.")
+    assert loaded.probability(history) == pytest.approx(trained.probability(history), abs=1e-4)
+    assert (loaded.skip_below, loaded.opportunity_above) == (0.3, 0.7)
+
+    path.write_text(json.dumps({"format": "something-else", "version": 1}))
+    with pytest.raises(ValueError):
+        gate_classifier.GateClassifier.load(str(path))
+
+
+class FixedClassifier:
+    def __init__(self, opportunity):
+        self.verdict = gate_classifier.GateVerdict(opportunity, 0.5)
+
+    def decide(self, history):
+        return self.verdict
+
+
+def test_decision_gate_node_skips_llm_on_confident_verdict(mocker):
+    """
+    GIVEN: An agent whose classifier is confident the turn is not an opportunity.
+    WHEN: The `decision_gate_node` is executed.
+    THEN: The classifier's verdict is returned and no LLM is constructed.
+    """
+    chat = mocker.patch("app.services.verticals.gaming.agent.ChatOpenAI")
+    agent = GamingAgent(chroma_collection=MockChromaCollection(), classifier=FixedClassifier(False))
+
+    result = agent.decision_gate_node({"conversation_history": _history("hi")})
+
+    assert result["opportunity_assessment"]["opportunity"] is False
+    assert "Local classifier" in result["opportunity_assessment"]["reasoning"]
+    chat.assert_not_called()
+
+
+def test_decision_gate_node_defers_ambiguous_turns_and_logs_them(mocker, monkeypatch, tmp_path):
+    """
+    GIVEN: An agent whose classifier is unsure, and a decision log path.
+    WHEN: The `decision_gate_node` is executed.
+    THEN: The LLM gate decides, and its decision is appended to the log.
+    """
+    log_path = tmp_path / "decisions.jsonl"
+    monkeypatch.setattr(config, "GATE_DECISION_LOG_PATH", str(log_path))
+    mock_llm = MockLLM(response_map={"Brand Safety Analyst": ConversationAnalysis(opportunity=True, reasoning="Scene.")})
+    mocker.patch("app.services.verticals.gaming.agent.ChatOpenAI", return_value=mock_llm)
+    agent = GamingAgent(chroma_collection=MockChromaCollection(), classifier=FixedClassifier(None))
+
+    result = agent.decision_gate_node({"conversation_history": _history("I enter the bar.")})
+
+    assert result["opportunity_assessment"] == {"opportunity": True, "reasoning": "Scene."}
+    entry = json.loads(log_path.read_text())
+    assert entry["opportunity"] is True
+    assert entry["history"][-1]["content"] == "I enter the bar."
@@ -44,6 +44,7 @@ def mock_redis() -> MockRedisClient:
     ("The story is great, I'm having fun!", True, "Safety Gate: Passed"),
     ("I attack the dragon with my sword.", True, "Safety Gate: Passed"),
     ("A normal conversational turn.", True, "Safety Gate: Passed"),
+    ("I flip through the rulebook.", True, "Safety Gate: Passed"),  # Keywords match whole words only
 
     # Edge cases
     (None, True, "Safety Gate: Passed (No message)"),
@@ -65,6 +66,28 @@ def test_run_safety_gate(message: str, expected_pass: bool, reason_keyword: str)
     assert proceed == expected_pass
     assert reason == reason_keyword
 
+# --- Test Suite for the History Gate ---
+
+@pytest.mark.parametrize("message, turn_count, expected_pass, reason", [
+    ("hi", 1, False, "History Gate: REJECTED (Initial user interaction)"),
+    ("let's start", 1, False, "History Gate: REJECTED (Initial user interaction)"),
+    ("   ", 3, False, "History Gate: REJECTED (Empty message)"),
+    ("(OOC: great story so far!)", 4, False, "History Gate: REJECTED (Out-of-character message)"),
+    # A short message later in the conversation, or a full first message, is fine
+    ("go north", 5, True, "History Gate: Passed"),
+    ("I walk into the dimly lit bar.", 1, True, "History Gate: Passed"),
+    # Without a history summary the gate cannot judge, so it passes
+    ("hi", None, True, "History Gate: Passed (No summary)"),
+])
+def test_run_history_gate(message, turn_count, expected_pass, reason):
+    """
+    GIVEN: A last message and the conversation's turn count.
+    WHEN: The `run_history_gate` function is called.
+    THEN: It rejects the decision gate's cheap red flags (first-message
+          greetings, empty and out-of-character messages) and passes the rest.
+    """
+    assert redis_client.run_history_gate(message, turn_count) == (expected_pass, reason)
+
 # --- Test Suite for the Frequency Gate ---
 
 def test_run_frequency_gate_new_session(mock_redis: MockRedisClient):
@@ -246,4 +269,51 @@ def test_update_state_for_existing_session_with_ad(mock_redis: MockRedisClient):
     state = json.loads(state_str)
     assert state['total_turns'] == 6 # Incremented
     assert state['ads_shown'] == 2 # Incremented
-    assert state['last_ad_turn'] == 6 # Updated to current turn
\ No newline at end of file
+    assert state['last_ad_turn'] == 6 # Updated to current turn
+
+
+def test_update_state_records_several_skipped_turns(mock_redis: MockRedisClient):
+    """
+    GIVEN: An existing session state in Redis.
+    WHEN: `update_state` is called with `turns=3` (turns the SDK skipped locally).
+    THEN: The turn count advances by three and no ad is recorded.
+    """
+    session_id = "skipped_turns_session"
+    mock_redis.preload_state(session_id, {'total_turns': 5, 'ads_shown': 1, 'last_ad_turn': 5, 'last_ad_timestamp': 0})
+
+    redis_client.update_state(session_id, ad_shown=False, turns=3)
+
+    state = json.loads(mock_redis.get(session_id))
+    assert state['total_turns'] == 8
+    assert state['ads_shown'] == 1
+
+def test_eligibility_hints_after_an_ad(mock_redis: MockRedisClient):
+    """
+    GIVEN: A session that has just been shown an ad on turn 10.
+    WHEN: Its eligibility hints are requested.
+    THEN: They report the turns and seconds left before the frequency gate can
+          pass, and the session is not exhausted.
+    """
+    session_id = "hints_after_ad"
+    mock_redis.preload_state(session_id, {'total_turns': 10, 'ads_shown': 1, 'last_ad_turn': 10, 'last_ad_timestamp': "now-5"})
+
+    hints = redis_client.eligibility_hints(session_id)
+
+    assert hints["session_exhausted"] is False
+    assert hints["turns_until_eligible"] == redis_client.MIN_TURNS_BETWEEN_ADS
+    assert hints["next_eligible_turn"] == 10 + redis_client.MIN_TURNS_BETWEEN_ADS
+    assert 0 < hints["seconds_until_eligible"] <= redis_client.COOLDOWN_SECONDS - 5
+
+def test_eligibility_hints_for_new_and_exhausted_sessions(mock_redis: MockRedisClient):
+    """
+    GIVEN: A session unknown to Redis and one that reached the ad limit.
+    WHEN: Their eligibility hints are requested.
+    THEN: The new session is immediately eligible and the other is exhausted.
+    """
+    mock_redis.preload_state("exhausted", {'total_turns': 80, 'ads_shown': redis_client.MAX_ADS_PER_SESSION, 'last_ad_turn': 70, 'last_ad_timestamp': 0})
+
+    fresh = redis_client.eligibility_hints("never_seen")
+    exhausted = redis_client.eligibility_hints("exhausted")
+
+    assert fresh["turns_until_eligible"] == 0 and fresh["seconds_until_eligible"] == 0
+    assert exhausted["session_exhausted"] is True
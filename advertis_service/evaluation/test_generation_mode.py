@@ -0,0 +1,124 @@
+"""
+test_generation_mode.py
+
+Unit tests for economy mode: how `app.services.generation_mode` picks a mode
+for a turn (request, tenant, then load), and how the GamingAgent writes an
+economy placement without the host LLM.
+"""
+import pytest
+
+from app import config
+from app.services import generation_mode, metrics
+from app.services.verticals.gaming.agent import GamingAgent, ConversationAnalysis
+from evaluation.test_utils import MockChromaCollection, MockLLM
+
+HISTORY = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "I walk into the bar."},
+]
+
+
+class FixedScheduler:
+    def __init__(self, depth):
+        self.depth = depth
+
+    def queue_depth(self, model=None):
+        return self.depth
+
+
+@pytest.fixture
+def economy_config(monkeypatch):
+    monkeypatch.setattr(config, "ECONOMY_TENANTS", {"budget-co"})
+    monkeypatch.setattr(config, "ECONOMY_QUEUE_DEPTH", 10)
+    monkeypatch.setattr(config, "ECONOMY_TURN_P95_SECONDS", 2.0)
+    monkeypatch.setattr(generation_mode, "turn_latency", generation_mode.RecentLatency(60, min_samples=3))
+
+
+@pytest.mark.parametrize("requested, tenant, depth, latencies, expected", [
+    ("standard", "budget-co", 50, [], ("standard", "requested")),
+    ("economy", None, 0, [], ("economy", "requested")),
+    (None, "budget-co", 0, [], ("economy", "tenant")),
+    (None, "other", 10, [], ("economy", "queue_depth")),
+    (None, "other", 9, [3.0, 3.0, 3.0], ("economy", "latency_slo")),
+    (None, "other", 9, [3.0, 3.0], ("standard", "default")),  # Too few samples to judge the SLO
+    (None, None, 0, [0.5, 0.5, 0.5], ("standard", "default")),
+])
+def test_resolve_precedence(economy_config, requested, tenant, depth, latencies, expected):
+    """
+    GIVEN: An economy tenant, a queue-depth threshold, a p95 SLO, and some load.
+    WHEN: A turn's generation mode is resolved.
+    THEN: An explicit request wins, then the tenant, then the load checks.
+    """
+    for seconds in latencies:
+        generation_mode.turn_latency.observe(seconds)
+    before = metrics.GENERATION_MODES.value(mode=expected[0], reason=expected[1])
+
+    choice = generation_mode.resolve(requested, tenant, scheduler=FixedScheduler(depth))
+
+    assert tuple(choice) == expected
+    assert metrics.GENERATION_MODES.value(mode=expected[0], reason=expected[1]) == before + 1
+
+
+def test_latency_window_drains_old_turns():
+    """
+    GIVEN: Slow turns observed longer ago than the window.
+    WHEN: The p95 is queried.
+    THEN: They no longer count, so the service returns to standard mode.
+    """
+    latency = generation_mode.RecentLatency(window_seconds=0, min_samples=1)
+    latency.observe(5.0)
+    assert latency.percentile(95) is None
+
+
+ORCHESTRATOR_INJECT = (
+    '{"decision": "inject", "product_id": "jack-daniels", "creative_brief": {"placement_type": "Environmental", '
+    '"goal": "Mood.", "tone": "Gritty", "implementation_details": "On the bar.", '
+    '"example_narration": "\\"A bottle of Jack Daniel\'s sits on the bar\\""}}'
+)
+
+
+@pytest.fixture
+def inject_agent(mocker):
+    collection = MockChromaCollection()
+    collection.set_query_results(ids=["jack-daniels"], documents=["Whiskey"], metadatas=[{"name": "Jack Daniel's"}])
+    mock_llm = MockLLM(response_map={
+        "Brand Safety Analyst": ConversationAnalysis(opportunity=True, reasoning="Scene."),
+        "AI Creative Director": ORCHESTRATOR_INJECT,
+        "Narrative Execution Engine": "The bartender nods. A bottle of Jack Daniel's sits on the bar.",
+    })
+    chat = mocker.patch("app.services.verticals.gaming.agent.ChatOpenAI", return_value=mock_llm)
+    return GamingAgent(chroma_collection=collection), chat
+
+
+@pytest.mark.asyncio
+async def test_economy_template_skips_host_llm(inject_agent, monkeypatch):
+    """
+    GIVEN: An agent whose orchestrator decides to inject, and the template strategy.
+    WHEN: The turn runs in economy mode.
+    THEN: The response is the brief's narration in the template, and only the
+          gate and orchestrator models were constructed.
+    """
+    agent, chat = inject_agent
+    monkeypatch.setattr(config, "ECONOMY_STRATEGY", "template")
+
+    result = await agent.run(history=HISTORY, generation_mode="economy")
+
+    assert result == {"status": "inject", "response_text": "A bottle of Jack Daniel's sits on the bar. What do you do next?"}
+    assert [call.kwargs["model"] for call in chat.call_args_list] == ["gpt-4.1-mini", "gpt-4.1-mini"]
+
+
+@pytest.mark.asyncio
+async def test_economy_model_strategy_uses_the_smaller_model(inject_agent, monkeypatch):
+    """
+    GIVEN: The "model" economy strategy with a configured economy model.
+    WHEN: The turn runs in economy mode.
+    THEN: The host prompt runs on the economy model instead of the full one.
+    """
+    agent, chat = inject_agent
+    monkeypatch.setattr(config, "ECONOMY_STRATEGY", "model")
+    monkeypatch.setattr(config, "ECONOMY_MODEL", "gpt-4.1-nano")
+
+    result = await agent.run(history=HISTORY, generation_mode="economy")
+
+    assert result["status"] == "inject"
+    assert chat.call_args_list[-1].kwargs["model"] == "gpt-4.1-nano"
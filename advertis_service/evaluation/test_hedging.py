@@ -0,0 +1,108 @@
+"""
+test_hedging.py
+
+Unit tests for the request hedging logic in `app.services.hedging`. These tests
+use tiny sleeps instead of real LLM calls to simulate a slow first attempt and a
+fast duplicate, verifying that the hedger picks the first result to finish,
+respects its rate-limited budget, and leaves non-opted-in nodes untouched.
+"""
+import threading
+import time
+
+from app.services.hedging import HedgeBudget, LatencyTracker, RequestHedger
+
+
+def _warm_hedger(hedger: RequestHedger, node: str, latency: float, samples: int):
+    """Feeds the node's latency window so hedging becomes active."""
+    for _ in range(samples):
+        hedger._tracker(node).observe(latency)
+
+
+def test_latency_tracker_returns_none_until_warm():
+    """
+    GIVEN: A latency tracker that requires 3 samples.
+    WHEN: Fewer samples than required have been observed.
+    THEN: No percentile is reported, so hedging stays off during warm-up.
+    """
+    tracker = LatencyTracker(min_samples=3)
+    tracker.observe(0.1)
+    tracker.observe(0.2)
+    assert tracker.percentile(95) is None
+
+    tracker.observe(0.3)
+    assert tracker.percentile(95) == 0.3
+    assert tracker.percentile(0) == 0.1
+
+
+def test_hedge_budget_caps_duplicates():
+    """
+    GIVEN: A hedge budget of 2 per minute.
+    WHEN: Three hedges are requested back to back.
+    THEN: Only the first two are allowed.
+    """
+    budget = HedgeBudget(max_per_minute=2)
+    assert budget.try_acquire() is True
+    assert budget.try_acquire() is True
+    assert budget.try_acquire() is False
+
+
+def test_hedger_passes_through_for_nodes_that_did_not_opt_in():
+    """
+    GIVEN: A hedger where only 'host_llm' opted in.
+    WHEN: A call is made for the 'decision_gate' node.
+    THEN: The function is executed directly and no stats are recorded.
+    """
+    hedger = RequestHedger(enabled_nodes=["host_llm"], min_samples=1)
+    assert hedger.call("decision_gate", lambda: "ok") == "ok"
+    assert hedger.stats() == {}
+
+
+def test_hedger_fires_duplicate_and_takes_first_result():
+    """
+    GIVEN: A warm latency window of ~10ms and a first attempt that stalls.
+    WHEN: The hedged call is made.
+    THEN: A duplicate is fired, its fast result is returned, and the hedge win is reported.
+    """
+    hedger = RequestHedger(enabled_nodes=["host_llm"], percentile=50, min_samples=5, max_hedges_per_minute=10)
+    _warm_hedger(hedger, "host_llm", 0.01, 5)
+
+    attempts = []
+    lock = threading.Lock()
+
+    def flaky_call():
+        with lock:
+            attempts.append(1)
+            attempt_number = len(attempts)
+        if attempt_number == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    started = time.perf_counter()
+    result = hedger.call("host_llm", flaky_call)
+    elapsed = time.perf_counter() - started
+
+    assert result == "fast"
+    assert elapsed < 0.4
+    stats = hedger.stats()["host_llm"]
+    assert stats["hedges_fired"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_hedger_waits_for_primary_when_budget_exhausted():
+    """
+    GIVEN: A warm latency window but a hedge budget of zero.
+    WHEN: The first attempt is slow.
+    THEN: No duplicate is fired and the primary's result is returned.
+    """
+    hedger = RequestHedger(enabled_nodes=["host_llm"], percentile=50, min_samples=5, max_hedges_per_minute=0)
+    _warm_hedger(hedger, "host_llm", 0.01, 5)
+
+    def slow_call():
+        time.sleep(0.05)
+        return "primary"
+
+    assert hedger.call("host_llm", slow_call) == "primary"
+    stats = hedger.stats()["host_llm"]
+    assert stats["hedges_fired"] == 0
+    assert stats["budget_exhausted"] == 1
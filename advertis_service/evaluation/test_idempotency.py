@@ -0,0 +1,93 @@
+"""
+test_idempotency.py
+
+Unit tests for idempotent /get-response turns in `app.services.idempotency`:
+turn keys, coalescing of concurrent duplicates onto one run, and the Redis
+result cache that answers retries. Redis is replaced by MockRedisClient.
+"""
+import asyncio
+
+import pytest
+
+from app.services import idempotency, metrics, redis_client
+from evaluation.test_utils import MockRedisClient
+
+HISTORY = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "I walk into the bar."},
+]
+
+
+@pytest.fixture(autouse=True)
+def mock_redis(monkeypatch):
+    client = MockRedisClient()
+    monkeypatch.setattr(redis_client, "redis_client", client)
+    return client
+
+
+def test_turn_keys_identify_the_turn_within_a_session():
+    """
+    GIVEN: Two sessions, two histories, and a key supplied by the SDK.
+    WHEN: Turn keys are built.
+    THEN: Keys match only for the same session and turn, and a supplied key
+          is still namespaced by session.
+    """
+    next_turn = HISTORY + [{"role": "assistant", "content": "..."}, {"role": "user", "content": "I sit."}]
+
+    assert idempotency.turn_key("s1", HISTORY) == idempotency.turn_key("s1", list(HISTORY))
+    assert idempotency.turn_key("s1", HISTORY) != idempotency.turn_key("s1", next_turn)
+    assert idempotency.turn_key("s1", HISTORY) != idempotency.turn_key("s2", HISTORY)
+    assert idempotency.turn_key("s1", HISTORY, "abc") != idempotency.turn_key("s2", HISTORY, "abc")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_run_and_result_is_cached():
+    """
+    GIVEN: Three concurrent requests for the same turn.
+    WHEN: Each runs the turn through `run_once`.
+    THEN: The work runs once, all three get its result, and the result is
+          cached for later retries.
+    """
+    key = idempotency.turn_key("s1", HISTORY)
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {"status": "inject", "response_text": "A bottle sits on the bar."}
+
+    coalesced = metrics.IDEMPOTENT_REPLAYS.value(source="coalesced")
+    results = await asyncio.gather(*(idempotency.run_once(key, work) for _ in range(3)))
+
+    assert runs == [1]
+    assert all(r["status"] == "inject" for r in results)
+    assert metrics.IDEMPOTENT_REPLAYS.value(source="coalesced") == coalesced + 2
+    assert idempotency.get_cached(key) == results[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_runs_are_not_cached():
+    """
+    GIVEN: A turn whose run fails.
+    WHEN: Two concurrent requests run it, and a third retries afterwards.
+    THEN: Both see the error, nothing is cached, and the retry runs again.
+    """
+    key = idempotency.turn_key("s-fail", HISTORY)
+    runs = []
+
+    async def failing():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM down")
+
+    results = await asyncio.gather(*(idempotency.run_once(key, failing) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert idempotency.get_cached(key) is None
+
+    async def succeeding():
+        runs.append(1)
+        return {"status": "skip", "response_text": None}
+
+    assert (await idempotency.run_once(key, succeeding))["status"] == "skip"
+    assert len(runs) == 2
@@ -0,0 +1,109 @@
+"""
+test_llm_scheduler.py
+
+Unit tests for the rate-limit aware LLM scheduler in `app.services.llm_scheduler`.
+The scheduler is exercised with the in-process `LocalTokenBucket`, which shares
+the refill arithmetic of the Redis Lua script, so these tests need neither a
+live Redis instance nor any LLM calls.
+"""
+import threading
+import time
+
+import pytest
+
+from app.services import llm_scheduler
+from app.services.llm_scheduler import LLMScheduler, LocalTokenBucket, RateLimitTimeout
+
+
+def test_estimate_tokens_handles_prompt_and_message_formats():
+    """
+    GIVEN: A plain prompt string and a list of (role, content) messages.
+    WHEN: `estimate_tokens` is called without an output budget.
+    THEN: Both are estimated at roughly four characters per token.
+    """
+    assert llm_scheduler.estimate_tokens("x" * 400, expected_output_tokens=0) == 100
+    messages = [("system", "x" * 40), {"role": "user", "content": "y" * 40}]
+    assert llm_scheduler.estimate_tokens(messages, expected_output_tokens=0) == 20
+
+
+def test_local_bucket_enforces_requests_per_minute():
+    """
+    GIVEN: A bucket allowing 2 requests per minute.
+    WHEN: Three reservations are made immediately.
+    THEN: The third one is told to wait about half a minute for a refill.
+    """
+    bucket = LocalTokenBucket()
+    assert bucket.reserve("gpt-4.1", rpm=2, tpm=10_000, cost=10) == 0
+    assert bucket.reserve("gpt-4.1", rpm=2, tpm=10_000, cost=10) == 0
+    wait_s = bucket.reserve("gpt-4.1", rpm=2, tpm=10_000, cost=10)
+    assert 29 < wait_s <= 30
+
+
+def test_local_bucket_enforces_tokens_per_minute():
+    """
+    GIVEN: A bucket allowing 600 tokens per minute.
+    WHEN: A 500-token request is followed by another 500-token request.
+    THEN: The second must wait until ~400 more tokens have refilled (~40s).
+    """
+    bucket = LocalTokenBucket()
+    assert bucket.reserve("gpt-4.1-mini", rpm=100, tpm=600, cost=500) == 0
+    wait_s = bucket.reserve("gpt-4.1-mini", rpm=100, tpm=600, cost=500)
+    assert 39 < wait_s <= 40
+
+
+def test_scheduler_passes_through_models_without_limits():
+    """
+    GIVEN: A scheduler with no configured limits.
+    WHEN: A call is acquired for any model.
+    THEN: It returns immediately without touching the bucket.
+    """
+    class ExplodingBucket:
+        def reserve(self, *args):
+            raise AssertionError("bucket should not be consulted")
+
+    scheduler = LLMScheduler(limits={}, bucket=ExplodingBucket())
+    scheduler.acquire("gpt-4.1", estimated_tokens=10_000)
+
+
+def test_scheduler_serves_higher_priority_first():
+    """
+    GIVEN: A model limited to 60 requests per minute (one per second) whose bucket is empty.
+    WHEN: A decision-gate call queues first and a host-LLM call queues after it.
+    THEN: The host-LLM call is granted capacity before the decision-gate call.
+    """
+    bucket = LocalTokenBucket()
+    scheduler = LLMScheduler(limits={"gpt-4.1": {"rpm": 60, "tpm": 1_000_000}}, bucket=bucket)
+    for _ in range(60):
+        bucket.reserve("gpt-4.1", 60, 1_000_000, 1)
+
+    order = []
+    def worker(name, priority):
+        scheduler.acquire("gpt-4.1", 1, priority)
+        order.append(name)
+
+    gate = threading.Thread(target=worker, args=("decision_gate", llm_scheduler.PRIORITY_DECISION_GATE))
+    gate.start()
+    while scheduler.queue_depth("gpt-4.1") < 1:
+        time.sleep(0.001)
+    host = threading.Thread(target=worker, args=("host_llm", llm_scheduler.PRIORITY_HOST_LLM))
+    host.start()
+    gate.join(timeout=5)
+    host.join(timeout=5)
+
+    assert order == ["host_llm", "decision_gate"]
+    assert scheduler.queue_depth() == 0
+
+
+def test_scheduler_times_out_when_capacity_never_frees():
+    """
+    GIVEN: A scheduler with a tiny maximum wait and an exhausted bucket.
+    WHEN: A call is acquired.
+    THEN: `RateLimitTimeout` is raised and the call leaves the queue.
+    """
+    bucket = LocalTokenBucket()
+    scheduler = LLMScheduler(limits={"gpt-4.1": {"rpm": 1, "tpm": 1_000}}, bucket=bucket, max_wait_seconds=0.05)
+    scheduler.acquire("gpt-4.1", 1)
+
+    with pytest.raises(RateLimitTimeout):
+        scheduler.acquire("gpt-4.1", 1)
+    assert scheduler.queue_depth("gpt-4.1") == 0
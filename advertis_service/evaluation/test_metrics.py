@@ -0,0 +1,82 @@
+"""
+test_metrics.py
+
+Unit tests for the lock-free metrics registry in `app.services.metrics` and for
+the instrumentation of the `GamingAgent` nodes. They validate the Prometheus
+text rendering, that per-thread shards are merged correctly at scrape time, and
+that running a node records its step latency.
+"""
+import threading
+
+from app.services import metrics
+from app.services.metrics import Counter, Histogram
+from app.services.verticals.gaming.agent import GamingAgent, ConversationAnalysis
+from evaluation.test_utils import MockChromaCollection, MockLLM
+
+
+def test_counter_merges_shards_from_many_threads():
+    """
+    GIVEN: A labelled counter incremented from 8 threads, 1000 times each.
+    WHEN: The counter is read and rendered.
+    THEN: No increments are lost and the rendered line carries the label.
+    """
+    counter = Counter("test_events_total", "Test events.", ["kind"])
+
+    def work():
+        for _ in range(1000):
+            counter.inc(kind="a")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value(kind="a") == 8000
+    assert counter.render() == ['test_events_total{kind="a"} 8000.0']
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    GIVEN: A histogram with buckets at 0.1 and 1.0.
+    WHEN: Values 0.05, 0.5 and 5.0 are observed.
+    THEN: Buckets are cumulative, and sum and count are exported.
+    """
+    histogram = Histogram("test_latency_seconds", "Test latency.", ["step"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, step="gate")
+
+    assert histogram.render() == [
+        'test_latency_seconds_bucket{step="gate",le="0.1"} 1',
+        'test_latency_seconds_bucket{step="gate",le="1.0"} 2',
+        'test_latency_seconds_bucket{step="gate",le="+Inf"} 3',
+        'test_latency_seconds_sum{step="gate"} 5.55',
+        'test_latency_seconds_count{step="gate"} 3',
+    ]
+
+
+def test_render_latest_includes_service_metrics():
+    """
+    GIVEN: The service's registered metrics.
+    WHEN: The registry is rendered for a scrape.
+    THEN: HELP/TYPE headers are present for the node latency histogram and gate counter.
+    """
+    output = metrics.render_latest()
+    assert "# TYPE advertis_agent_step_duration_seconds histogram" in output
+    assert "# TYPE advertis_gate_rejections_total counter" in output
+
+
+def test_decision_gate_node_records_step_latency(mocker):
+    """
+    GIVEN: A GamingAgent with a mocked decision gate LLM.
+    WHEN: The `decision_gate_node` is executed.
+    THEN: One more observation is recorded for the decision_gate step.
+    """
+    mock_llm = MockLLM(response_map={"Brand Safety Analyst": ConversationAnalysis(opportunity=True, reasoning="ok")})
+    mocker.patch('app.services.verticals.gaming.agent.ChatOpenAI', return_value=mock_llm)
+    agent = GamingAgent(chroma_collection=MockChromaCollection())
+    before = metrics.AGENT_STEP_LATENCY.count(step="decision_gate")
+
+    agent.decision_gate_node({"conversation_history": [{"role": "user", "content": "I enter the bar."}]})
+
+    assert metrics.AGENT_STEP_LATENCY.count(step="decision_gate") == before + 1
@@ -0,0 +1,126 @@
+"""
+test_model_router.py
+
+Unit tests for per-node model routing in `app.services.model_router`: route
+resolution from defaults, global, scheduled and tenant overrides; fallback
+ordering driven by errors, latency and cost; and the GamingAgent falling back
+along a route's chain when a model fails.
+"""
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services import metrics, model_router
+from app.services.verticals.gaming.agent import GamingAgent, ConversationAnalysis
+from evaluation.test_utils import MockChromaCollection, MockLLM
+
+ROUTES = {
+    "nodes": {"host_llm": {"models": ["gpt-4.1", "gpt-4.1-mini"], "latency_budget_seconds": 5}},
+    "schedule": [{"hours": [22, 6], "nodes": {"host_llm": {"models": ["gpt-4.1-mini"]}}}],
+    "tenants": {"budget-co": {"host_llm": {"models": ["gpt-4.1-nano"], "temperature": 0.2}}},
+}
+NOON = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+NIGHT = datetime(2026, 1, 1, 2, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("node, tenant, now, models, temperature", [
+    ("decision_gate", None, NOON, ["gpt-4.1-mini"], 0),  # Built-in default
+    ("host_llm", None, NOON, ["gpt-4.1", "gpt-4.1-mini"], 0.7),  # Global override
+    ("host_llm", None, NIGHT, ["gpt-4.1-mini"], 0.7),  # Schedule wrapping midnight
+    ("host_llm", "budget-co", NIGHT, ["gpt-4.1-nano"], 0.2),  # Tenant beats schedule
+    ("host_llm", "other", NOON, ["gpt-4.1", "gpt-4.1-mini"], 0.7),
+])
+def test_resolve_layers_overrides(node, tenant, now, models, temperature):
+    """
+    GIVEN: Global, scheduled and tenant route overrides.
+    WHEN: A node's route is resolved for a tenant at a time of day.
+    THEN: The most specific override applies, field by field over the defaults.
+    """
+    route = model_router.ModelRouter(ROUTES).resolve(node, tenant, now=now)
+
+    assert route.models == models
+    assert route.temperature == temperature
+
+
+def test_plan_demotes_failing_and_slow_models():
+    """
+    GIVEN: A route with two models and a latency budget.
+    WHEN: The primary keeps erroring, and separately when it is too slow.
+    THEN: It is moved behind the fallback, but still tried as a last resort.
+    """
+    router = model_router.ModelRouter(ROUTES, min_samples=3, failure_threshold=2, cooldown_seconds=60)
+    route = router.resolve("host_llm", now=NOON)
+    assert router.plan(route) == ["gpt-4.1", "gpt-4.1-mini"]
+
+    for _ in range(2):
+        router.record_failure(route, "gpt-4.1", RuntimeError("500"))
+    assert router.plan(route) == ["gpt-4.1-mini", "gpt-4.1"]
+
+    slow_router = model_router.ModelRouter(ROUTES, min_samples=3)
+    skips = metrics.MODEL_ROUTE_SKIPS.value(route="host_llm", model="gpt-4.1", reason="latency_budget")
+    for _ in range(3):
+        slow_router.record_success(route, "gpt-4.1", 9.0, {"input_tokens": 100, "output_tokens": 50})
+    assert slow_router.plan(route) == ["gpt-4.1-mini", "gpt-4.1"]
+    assert metrics.MODEL_ROUTE_SKIPS.value(route="host_llm", model="gpt-4.1", reason="latency_budget") == skips + 1
+
+
+def test_cost_is_tracked_and_budgeted():
+    """
+    GIVEN: A route with a per-call cost budget, and list prices.
+    WHEN: Calls report their token usage.
+    THEN: Spend is counted, and a model averaging over budget is demoted.
+    """
+    router = model_router.ModelRouter(
+        {"nodes": {"orchestrator": {"models": ["gpt-4.1", "gpt-4.1-mini"], "cost_budget_usd": 0.001}}}, min_samples=1,
+    )
+    route = router.resolve("orchestrator")
+    assert router.cost("gpt-4.1", {"input_tokens": 1_000_000, "output_tokens": 0}) == 2.0
+
+    spent = metrics.LLM_COST_USD.value(route="orchestrator", model="gpt-4.1")
+    router.record_success(route, "gpt-4.1", 1.0, {"input_tokens": 1000, "output_tokens": 500})
+
+    assert metrics.LLM_COST_USD.value(route="orchestrator", model="gpt-4.1") == pytest.approx(spent + 0.006)
+    assert router.plan(route) == ["gpt-4.1-mini", "gpt-4.1"]
+
+
+def test_agent_falls_back_along_the_chain(mocker):
+    """
+    GIVEN: A decision-gate route of two models whose first model errors.
+    WHEN: The `decision_gate_node` is executed.
+    THEN: The second model answers, and the failure is recorded for the first.
+    """
+    router = model_router.ModelRouter({"nodes": {"decision_gate": {"models": ["gpt-4.1-mini", "gpt-4.1"]}}})
+    failing = MagicMock()
+    failing.with_structured_output.return_value = failing
+    failing.invoke.side_effect = RuntimeError("upstream 503")
+    working = MockLLM(response_map={"Brand Safety Analyst": ConversationAnalysis(opportunity=True, reasoning="Scene.")})
+    chat = mocker.patch(
+        "app.services.verticals.gaming.agent.ChatOpenAI",
+        side_effect=lambda model, **kwargs: failing if model == "gpt-4.1-mini" else working,
+    )
+    agent = GamingAgent(chroma_collection=MockChromaCollection(), router=router)
+    errors = metrics.MODEL_ROUTE_CALLS.value(route="decision_gate", model="gpt-4.1-mini", outcome="error")
+
+    result = agent.decision_gate_node({"conversation_history": [{"role": "user", "content": "I enter the bar."}]})
+
+    assert result["opportunity_assessment"]["opportunity"] is True
+    assert [call.kwargs["model"] for call in chat.call_args_list] == ["gpt-4.1-mini", "gpt-4.1"]
+    assert metrics.MODEL_ROUTE_CALLS.value(route="decision_gate", model="gpt-4.1-mini", outcome="error") == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_speculation_uses_the_tenants_route(mocker):
+    """
+    GIVEN: A tenant whose decision gate is routed to a different model.
+    WHEN: The agent speculates on a turn for that tenant.
+    THEN: The speculative gate decision comes from the tenant's model.
+    """
+    router = model_router.ModelRouter({"tenants": {"budget-co": {"decision_gate": {"models": ["gpt-4.1-nano"]}}}})
+    mock_llm = MockLLM(response_map={"Brand Safety Analyst": ConversationAnalysis(opportunity=True, reasoning="Scene.")})
+    chat = mocker.patch("app.services.verticals.gaming.agent.ChatOpenAI", return_value=mock_llm)
+    agent = GamingAgent(chroma_collection=MockChromaCollection(), router=router)
+
+    await agent.speculate([{"role": "user", "content": "I enter the bar."}], tenant_id="budget-co")
+
+    assert [call.kwargs["model"] for call in chat.call_args_list] == ["gpt-4.1-nano"]
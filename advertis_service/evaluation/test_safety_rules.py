@@ -0,0 +1,146 @@
+"""
+test_safety_rules.py
+
+Unit tests for `app.services.safety_rules`. They check that the published
+ruleset document agrees with the gate the service runs, that its version
+only changes when the rules do, and that keywords match whole words, merge
+across vertical/locale scopes, and reload from file without a restart.
+"""
+import json
+import os
+import re
+import time
+
+import pytest
+
+from app import config
+from app.services import safety_rules
+
+
+def test_version_is_stable_and_tracks_the_rules():
+    """
+    GIVEN: Two rulesets built from the same keywords and one with an extra keyword.
+    WHEN: Their versions are compared.
+    THEN: Identical rules share a version; different rules do not.
+    """
+    first = safety_rules.SafetyRuleset(["help", "stuck"])
+    again = safety_rules.SafetyRuleset(["help", "stuck", "help"])
+    changed = safety_rules.SafetyRuleset(["help", "stuck", "hint"])
+
+    assert first.version == again.version
+    assert first.version != changed.version
+    assert first.document["version"] == first.version
+
+
+def test_document_compiles_to_the_same_gate():
+    """
+    GIVEN: The default ruleset's published document.
+    WHEN: Its patterns are compiled the way the SDK compiles them.
+    THEN: It agrees with the service's own gate on safe and unsafe messages.
+    """
+    ruleset = safety_rules.current()
+    document = ruleset.document
+    client_regex = re.compile("|".join(document["patterns"]), re.IGNORECASE)
+
+    for message in ["I'm STUCK here", "any hint?", "I open the chest", "What a lovely day"]:
+        assert bool(client_regex.search(message)) == ruleset.matches(message)
+    assert document["format"] == safety_rules.RULES_FORMAT
+
+
+def test_keywords_are_matched_literally():
+    """
+    GIVEN: A keyword containing regex metacharacters.
+    WHEN: Messages are matched against it.
+    THEN: Only the literal text matches.
+    """
+    ruleset = safety_rules.SafetyRuleset(["a.b"])
+    assert ruleset.matches("see a.b now")
+    assert not ruleset.matches("see axb now")
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("I'm stuck.", True),
+    ("Any hints?", True),
+    ("OK, I give   up", True),
+    ("The wizard shelps the gold", False),  # Old substring matching flagged this
+    ("I read the rulebook", False),
+    ("What a helpful innkeeper", False),
+    ("I give you the sword", False),
+])
+def test_default_rules_match_whole_words_and_phrases(message, expected):
+    """
+    GIVEN: The default keyword set.
+    WHEN: Messages with keywords, phrases, and keyword-containing words are checked.
+    THEN: Only whole keywords and complete phrases match.
+    """
+    assert safety_rules.current().matches(message) == expected
+
+
+def test_prefix_keywords_match_word_stems():
+    """
+    GIVEN: A keyword ending in "*".
+    WHEN: Messages with words starting with it are checked.
+    THEN: Any word with that stem matches, but not the stem inside a word.
+    """
+    ruleset = safety_rules.SafetyRuleset(["confus*"])
+    assert ruleset.matches("This is confusing")
+    assert ruleset.matches("confusion reigns")
+    assert not ruleset.matches("unconfused")
+
+
+def test_rulebook_merges_scopes_for_vertical_and_locale():
+    """
+    GIVEN: Keyword sets for all traffic, for Spanish, for gaming, and for Spanish gaming.
+    WHEN: Rulesets are built for several vertical/locale pairs.
+    THEN: Each pair sees exactly the keywords of its matching scopes.
+    """
+    rulebook = safety_rules.SafetyRulebook({
+        "*": ["help"], "*:es": ["ayuda"], "gaming": ["walkthrough"], "gaming:es": ["atascado"],
+    })
+
+    gaming_es = rulebook.ruleset("gaming", "es-MX")
+    assert all(gaming_es.matches(m) for m in ["help", "ayuda", "walkthrough", "estoy atascado"])
+    assert not rulebook.ruleset("gaming", "en").matches("ayuda")
+    assert not rulebook.ruleset("travel", "es").matches("walkthrough")
+    assert rulebook.ruleset("travel", "es").matches("ayuda")
+    assert rulebook.ruleset("gaming", "es") is gaming_es
+
+
+def test_unconfigured_verticals_and_locales_share_one_ruleset():
+    """
+    GIVEN: A rulebook with gaming and Spanish scopes.
+    WHEN: Rulesets are requested for many verticals and locales no scope names.
+    THEN: They all get the same "*" ruleset, so client input can't grow the cache.
+    """
+    rulebook = safety_rules.SafetyRulebook({"*": ["help"], "*:es": ["ayuda"], "gaming": ["walkthrough"]})
+
+    rulesets = {id(rulebook.ruleset(f"vertical-{i}", f"x{i}")) for i in range(100)}
+
+    assert rulesets == {id(rulebook.ruleset(None, "fr"))}
+    assert rulebook.ruleset("travel", "es").matches("ayuda")
+    assert len(rulebook._compiled) == 2
+
+
+def test_keyword_file_is_hot_reloaded(tmp_path, monkeypatch):
+    """
+    GIVEN: Rules loaded from a keyword file.
+    WHEN: The file changes, and later is replaced by malformed content.
+    THEN: The change is picked up without a restart, and the malformed file
+          is rejected while the previous rules stay in force.
+    """
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps({"*": ["help"]}))
+    monkeypatch.setattr(config, "SAFETY_KEYWORDS_PATH", str(path))
+    monkeypatch.setattr(config, "SAFETY_RULES_RELOAD_SECONDS", 0.0)
+    monkeypatch.setattr(safety_rules, "_rulebook", safety_rules._build_rulebook())
+
+    assert safety_rules.current().matches("help")
+
+    path.write_text(json.dumps({"*": ["stuck"]}))
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    assert safety_rules.current().matches("stuck")
+    assert not safety_rules.current().matches("help")
+
+    path.write_text(json.dumps({"*": "not a list"}))
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert safety_rules.current().matches("stuck")
@@ -0,0 +1,168 @@
+"""
+test_scene_vectors.py
+
+Unit tests for the rolling per-session scene embedding in
+`app.services.scene_vectors`: each retrieval embeds only the messages not
+folded into the scene yet, in one call (including those of turns the gates
+stopped, up to a cap), a repeated turn embeds nothing, and retrieval queries
+with the blended vector when a session is bound.
+"""
+import math
+
+import pytest
+
+from app.services import redis_client, scene_vectors, tracing
+from app.services.verticals.gaming.agent import GamingAgent
+from evaluation.test_utils import MockRedisClient
+
+VECTORS = {
+    "I walk into the tavern.": [1.0, 0.0, 0.0],
+    "The barkeep nods.": [0.0, 1.0, 0.0],
+    "I order a drink.": [0.0, 0.0, 1.0],
+    "He pours you an ale.": [1.0, 0.0, 0.0],
+    "I look at the bard.": [0.0, 1.0, 0.0],
+}
+TURNS = [
+    {"role": "user", "content": "I walk into the tavern."},
+    {"role": "assistant", "content": "The barkeep nods."},
+    {"role": "user", "content": "I order a drink."},
+    {"role": "assistant", "content": "He pours you an ale."},
+    {"role": "user", "content": "I look at the bard."},
+]
+SYSTEM = {"role": "system", "content": "You are a GM."}
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [VECTORS[text] for text in texts]
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = MockRedisClient()
+    monkeypatch.setattr(redis_client, "redis_client", client)
+    return client
+
+
+def _history(messages):
+    return [SYSTEM] + TURNS[:messages]
+
+
+def test_each_retrieval_embeds_only_the_new_messages(redis):
+    """
+    GIVEN: A tracker with decay 0.5.
+    WHEN: Two consecutive turns of one session are tracked.
+    THEN: The first embeds its message, the second embeds just the reply and
+          the new message in one call, and the scene is the decayed mean of
+          all three.
+    """
+    embedder = CountingEmbedder()
+    tracker = scene_vectors.SceneTracker(embedder, decay=0.5)
+
+    tracker.update("s1", _history(1))
+    vectors = tracker.update("s1", _history(3))
+
+    assert embedder.calls == [["I walk into the tavern."], ["The barkeep nods.", "I order a drink."]]
+    assert vectors["message"] == [0.0, 0.0, 1.0]
+    assert vectors["scene"] == pytest.approx([0.25, 0.25, 0.5])
+
+
+def test_turns_skipped_by_the_gates_are_folded_in_on_the_next_retrieval(redis):
+    """
+    GIVEN: A scene last updated on the first turn.
+    WHEN: The next turn to reach retrieval comes two turns later, as a partial
+          history of its last four messages (as a speculative run sees it).
+    THEN: Every message since the first turn is folded in, in one call.
+    """
+    embedder = CountingEmbedder()
+    tracker = scene_vectors.SceneTracker(embedder, decay=0.5)
+    tracker.update("s1", _history(1))
+
+    vectors = tracker.update("s1", TURNS[1:5])
+
+    assert embedder.calls[1] == ["The barkeep nods.", "I order a drink.", "He pours you an ale.", "I look at the bard."]
+    assert vectors["scene"] == pytest.approx([0.3125, 0.5625, 0.125])
+
+
+def test_cold_start_embeds_only_the_recent_messages(redis):
+    """
+    GIVEN: A long session with no stored scene (new, or expired from Redis).
+    WHEN: Its next turn is tracked.
+    THEN: Only the last MAX_FOLDED_MESSAGES messages are embedded, in one call.
+    """
+    history = [SYSTEM] + TURNS * 20
+    embedder = CountingEmbedder()
+    tracker = scene_vectors.SceneTracker(embedder, decay=0.5)
+
+    vectors = tracker.update("s1", history)
+
+    assert embedder.calls == [[m["content"] for m in history[-scene_vectors.MAX_FOLDED_MESSAGES:]]]
+    assert vectors["message"] == [0.0, 1.0, 0.0]
+
+
+def test_repeated_turn_reuses_the_stored_scene(redis):
+    """
+    GIVEN: A turn that has already been tracked.
+    WHEN: The same turn is tracked again (a retry or a speculative run).
+    THEN: Nothing is embedded and the scene doesn't move.
+    """
+    embedder = CountingEmbedder()
+    tracker = scene_vectors.SceneTracker(embedder, decay=0.5)
+    tracker.update("s1", _history(1))
+    first = tracker.update("s1", _history(3))
+
+    again = tracker.update("s1", _history(3))
+
+    assert len(embedder.calls) == 2
+    assert again == first
+
+
+def test_query_vector_blends_message_and_scene(redis):
+    """
+    GIVEN: A scene built from two turns and a blend weight of 0.3.
+    WHEN: The query vector for the second turn is requested.
+    THEN: It leans towards the last message, keeps part of the scene, and is
+          unit length.
+    """
+    tracker = scene_vectors.SceneTracker(CountingEmbedder(), decay=0.5, blend_weight=0.3)
+    tracker.update("s1", _history(1))
+
+    query = tracker.query_vector("s1", _history(3))
+
+    assert math.sqrt(sum(v * v for v in query)) == pytest.approx(1.0)
+    assert query[2] > query[0] > 0.0
+
+
+def test_retrieval_queries_with_the_scene_when_a_session_is_bound(redis):
+    """
+    GIVEN: An agent with a scene tracker.
+    WHEN: Candidates are retrieved with and without a bound session.
+    THEN: With a session the collection is queried by the blended embedding;
+          without one it falls back to the last message's text.
+    """
+    class CapturingCollection:
+        def __init__(self):
+            self.queries = []
+
+        def query(self, n_results, where, **query):
+            self.queries.append(query)
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+    collection = CapturingCollection()
+    tracker = scene_vectors.SceneTracker(CountingEmbedder())
+    agent = GamingAgent(chroma_collection=collection, scene_tracker=tracker)
+    state = {"conversation_history": _history(1)}
+
+    tracing.bind_session("s1")
+    try:
+        agent.retrieve_candidates(state)
+    finally:
+        tracing.bind_session(None)
+    agent.retrieve_candidates(state)
+
+    assert collection.queries[0] == {"query_embeddings": [pytest.approx([1.0, 0.0, 0.0])]}
+    assert collection.queries[1] == {"query_texts": ["I walk into the tavern."]}
@@ -0,0 +1,118 @@
+"""
+test_speculation.py
+
+Unit tests for speculative pipeline work (`app.services.speculation`) and the
+GamingAgent's use of it: results are handed to the matching /get-response,
+stale or mismatched work is discarded and reported, and an agent run seeded
+with precomputed results skips the steps already done.
+"""
+import asyncio
+
+import pytest
+
+from app.services import metrics, speculation
+from app.services.verticals.gaming.agent import GamingAgent, ConversationAnalysis
+from evaluation.test_utils import MockChromaCollection, MockLLM
+
+HISTORY = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "I walk into the bar."},
+]
+RESULT = {"opportunity_assessment": {"opportunity": True, "reasoning": "Scene."}, "candidate_products": ["Product 1"]}
+
+
+@pytest.mark.asyncio
+async def test_claim_attaches_to_in_flight_work():
+    """
+    GIVEN: Speculative work that is still running.
+    WHEN: The same turn's history claims it.
+    THEN: The claim waits for the work and returns its result; the work runs once.
+    """
+    registry = speculation.SpeculationRegistry(ttl_seconds=10)
+    release = asyncio.Event()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await release.wait()
+        return RESULT
+
+    used_before = metrics.SPECULATIONS.value(outcome="used")
+    registry.start("spec-1", HISTORY, work)
+    claim = asyncio.create_task(registry.claim("spec-1", HISTORY))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await claim == RESULT
+    assert calls == [1]
+    assert metrics.SPECULATIONS.value(outcome="used") == used_before + 1
+    assert await registry.claim("spec-1", HISTORY) is None  # Claimed only once
+
+
+@pytest.mark.asyncio
+async def test_mismatched_and_expired_work_is_wasted():
+    """
+    GIVEN: One speculation for a different history and one past its TTL.
+    WHEN: They are claimed.
+    THEN: Neither is used, and both are reported as waste with their reason.
+    """
+    async def work():
+        return RESULT
+
+    registry = speculation.SpeculationRegistry(ttl_seconds=10)
+    mismatches = metrics.SPECULATIONS.value(outcome="mismatch")
+    registry.start("spec-2", HISTORY, work)
+    other_turn = HISTORY + [{"role": "assistant", "content": "..."}, {"role": "user", "content": "I leave."}]
+    assert await registry.claim("spec-2", other_turn) is None
+    assert metrics.SPECULATIONS.value(outcome="mismatch") == mismatches + 1
+
+    expired_registry = speculation.SpeculationRegistry(ttl_seconds=0)
+    expirations = metrics.SPECULATIONS.value(outcome="expired")
+    expired_registry.start("spec-3", HISTORY, work)
+    await asyncio.sleep(0.01)
+    assert await expired_registry.claim("spec-3", HISTORY) is None
+    assert metrics.SPECULATIONS.value(outcome="expired") == expirations + 1
+    assert metrics.SPECULATION_WASTED_SECONDS.value(reason="expired") > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_work_falls_back_to_a_full_run():
+    """
+    GIVEN: Speculative work that raised.
+    WHEN: It is claimed.
+    THEN: The claim returns None so /get-response runs the agent from scratch.
+    """
+    async def work():
+        raise RuntimeError("LLM down")
+
+    registry = speculation.SpeculationRegistry(ttl_seconds=10)
+    registry.start("spec-4", HISTORY, work)
+    assert await registry.claim("spec-4", HISTORY) is None
+
+
+@pytest.mark.asyncio
+async def test_agent_speculates_gate_and_retrieval_then_reuses_them(mocker):
+    """
+    GIVEN: A GamingAgent whose decision gate rejects the turn.
+    WHEN: It speculates on the turn, and then runs with the speculative result.
+    THEN: Speculation returns the gate verdict and candidates, and the run
+          skips without calling the LLM or the vector store again.
+    """
+    collection = MockChromaCollection()
+    collection.set_query_results(ids=["jack-daniels"], documents=["Whiskey"], metadatas=[{"name": "Jack Daniel's"}])
+    mock_llm = MockLLM(response_map={"Brand Safety Analyst": ConversationAnalysis(opportunity=False, reasoning="Too early.")})
+    chat = mocker.patch("app.services.verticals.gaming.agent.ChatOpenAI", return_value=mock_llm)
+    agent = GamingAgent(chroma_collection=collection)
+
+    precomputed = await agent.speculate(HISTORY)
+
+    assert precomputed["opportunity_assessment"]["opportunity"] is False
+    assert len(precomputed["candidate_products"]) == 1
+
+    chat.reset_mock()
+    retrieve = mocker.spy(agent, "retrieve_candidates")
+    result = await agent.run(history=HISTORY, precomputed=precomputed)
+
+    assert result == {"status": "skip", "response_text": None}
+    chat.assert_not_called()
+    retrieve.assert_not_called()
@@ -0,0 +1,161 @@
+"""
+test_structured_logging.py
+
+Unit tests for `app.services.structured_logging`. They check the JSON line
+format, per-node level parsing, payload sampling, and that the configured
+debug session still gets the old human-readable output.
+"""
+import contextvars
+import json
+import logging
+import queue
+
+import pytest
+
+from app import config
+from app.services import structured_logging, tracing
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured():
+    """Attaches a collecting handler to a node logger and the debug-session logger."""
+    handler = ListHandler()
+    node_logger = structured_logging.get_logger("agent.test_node")
+    debug_logger = logging.getLogger(structured_logging.DEBUG_SESSION_LOGGER)
+    node_logger.addHandler(handler)
+    debug_logger.addHandler(handler)
+    node_logger.setLevel(logging.DEBUG)
+    yield node_logger, handler
+    node_logger.removeHandler(handler)
+    debug_logger.removeHandler(handler)
+    node_logger.setLevel(logging.NOTSET)
+
+
+def test_json_formatter_includes_context_and_fields():
+    """
+    GIVEN: A record stamped with trace/session IDs and structured fields.
+    WHEN: It is formatted.
+    THEN: One JSON object is produced carrying the event, IDs, and fields.
+    """
+    def run():
+        tracing.start_trace("trace-7")
+        tracing.bind_session("session-7")
+        record = logging.LogRecord("advertis.agent.orchestrator", logging.INFO, __file__, 1, "orchestrator_result", None, None)
+        record.fields = {"decision": "inject", "product_id": "p1"}
+        structured_logging.ContextFilter().filter(record)
+        return record
+
+    line = structured_logging.JsonFormatter().format(contextvars.copy_context().run(run))
+    entry = json.loads(line)
+    assert entry["event"] == "orchestrator_result"
+    assert entry["level"] == "INFO"
+    assert entry["trace_id"] == "trace-7"
+    assert entry["session_id"] == "session-7"
+    assert entry["decision"] == "inject"
+
+
+def test_queued_errors_keep_the_event_name_and_traceback():
+    """
+    GIVEN: The queue handler in front of the JSON listener.
+    WHEN: An error is logged with `exc_info=True` and formatted off the queue.
+    THEN: The event is still the bare event name, and the traceback is its own
+          `exc_info` field next to the structured fields.
+    """
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("advertis.test_queued_errors")
+    handler = structured_logging.EventQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            raise RuntimeError("upstream 503")
+        except RuntimeError:
+            logger.error("get_response_failed", exc_info=True, extra={"fields": {"error": "upstream 503"}})
+    finally:
+        logger.removeHandler(handler)
+
+    entry = json.loads(structured_logging.JsonFormatter().format(log_queue.get_nowait()))
+    assert entry["event"] == "get_response_failed"
+    assert entry["error"] == "upstream 503"
+    assert entry["exc_info"].startswith("Traceback (most recent call last):")
+    assert "RuntimeError: upstream 503" in entry["exc_info"]
+
+
+def test_parse_node_levels():
+    """
+    GIVEN: A per-node level spec with spacing and a malformed entry.
+    WHEN: It is parsed.
+    THEN: Only well-formed entries are kept, with upper-cased levels.
+    """
+    levels = structured_logging._parse_node_levels("orchestrator=debug, host_llm = WARNING,junk")
+    assert levels == {"orchestrator": "DEBUG", "host_llm": "WARNING"}
+
+
+def test_payload_dumps_are_sampled(monkeypatch, captured):
+    """
+    GIVEN: A DEBUG-level node logger and no debug session.
+    WHEN: The payload sample rate is 0 and then 1.
+    THEN: Dumps are skipped at 0 and always taken at 1.
+    """
+    logger, _ = captured
+    monkeypatch.setattr(config, "LOG_DEBUG_SESSION_ID", None)
+
+    monkeypatch.setattr(config, "LOG_PAYLOAD_SAMPLE_RATE", 0.0)
+    assert not structured_logging.should_dump_payload(logger)
+
+    monkeypatch.setattr(config, "LOG_PAYLOAD_SAMPLE_RATE", 1.0)
+    assert structured_logging.should_dump_payload(logger)
+
+    logger.setLevel(logging.INFO)
+    assert not structured_logging.should_dump_payload(logger)
+
+
+def test_payload_sampling_is_decided_once_per_request(monkeypatch, captured):
+    """
+    GIVEN: A 50% payload sample rate.
+    WHEN: Many requests each ask several times whether to dump payloads.
+    THEN: Each request gets the same answer every time, and both answers occur.
+    """
+    logger, _ = captured
+    monkeypatch.setattr(config, "LOG_DEBUG_SESSION_ID", None)
+    monkeypatch.setattr(config, "LOG_PAYLOAD_SAMPLE_RATE", 0.5)
+
+    def request():
+        tracing.start_trace()
+        return {structured_logging.should_dump_payload(logger) for _ in range(5)}
+
+    decisions = [contextvars.copy_context().run(request) for _ in range(50)]
+
+    assert all(len(d) == 1 for d in decisions)
+    assert {d.pop() for d in decisions} == {True, False}
+
+
+def test_debug_session_gets_legacy_output(monkeypatch, captured):
+    """
+    GIVEN: A configured debug session ID.
+    WHEN: An event is logged inside that session and inside another one.
+    THEN: The debug session emits the legacy text; the other session emits the
+          structured event with its fields.
+    """
+    logger, handler = captured
+    monkeypatch.setattr(config, "LOG_DEBUG_SESSION_ID", "debug-me")
+
+    def log_in(session_id):
+        tracing.bind_session(session_id)
+        structured_logging.log_event(logger, logging.INFO, "ad_skipped", legacy_text="---AGENT: Skipping ad injection.---", node="skip_node")
+
+    contextvars.copy_context().run(log_in, "debug-me")
+    contextvars.copy_context().run(log_in, "someone-else")
+
+    legacy, structured = handler.records
+    assert legacy.getMessage() == "---AGENT: Skipping ad injection.---"
+    assert structured.getMessage() == "ad_skipped"
+    assert structured.fields == {"node": "skip_node"}
@@ -0,0 +1,76 @@
+"""
+test_tracing.py
+
+Unit tests for the per-request trace context in `app.services.tracing`. They
+check that trace IDs are validated, that step timings are collected for the
+active request only, and that the `Server-Timing` header is formatted with the
+step names the SDK expects.
+"""
+import contextvars
+
+from app.services import tracing
+
+
+def test_start_trace_keeps_valid_ids_and_replaces_malformed_ones():
+    """
+    GIVEN: A well-formed trace ID, a malformed one, and no ID at all.
+    WHEN: `start_trace` is called with each in a fresh context.
+    THEN: The valid ID is kept, while the others are replaced by a generated hex ID.
+    """
+    assert contextvars.copy_context().run(tracing.start_trace, "abc123") == "abc123"
+
+    replaced = contextvars.copy_context().run(tracing.start_trace, "bad id\nwith newline")
+    assert replaced != "bad id\nwith newline"
+    assert len(replaced) == 32
+
+    generated = contextvars.copy_context().run(tracing.start_trace, None)
+    assert len(generated) == 32
+
+
+def test_timed_step_accumulates_into_active_trace():
+    """
+    GIVEN: An active trace.
+    WHEN: The retrieval step is timed twice and the gate step once.
+    THEN: Both steps appear in the trace's timings, with retrieval accumulated.
+    """
+    def run():
+        tracing.start_trace("trace-1")
+        with tracing.timed_step("retrieval"):
+            pass
+        first = tracing.current_timings()["retrieval"]
+        with tracing.timed_step("retrieval"):
+            pass
+        with tracing.timed_step("decision_gate"):
+            pass
+        return first, tracing.current_timings()
+
+    first, timings = contextvars.copy_context().run(run)
+    assert set(timings) == {"retrieval", "decision_gate"}
+    assert timings["retrieval"] >= first
+
+
+def test_llm_run_config_tags_runs_with_trace_id():
+    """
+    GIVEN: An active trace.
+    WHEN: The LangChain run config is requested.
+    THEN: It carries the trace ID in both metadata and tags.
+    """
+    def run():
+        tracing.start_trace("trace-42")
+        return tracing.llm_run_config()
+
+    config = contextvars.copy_context().run(run)
+    assert config == {"metadata": {"trace_id": "trace-42"}, "tags": ["trace:trace-42"]}
+
+
+def test_server_timing_header_uses_public_step_names():
+    """
+    GIVEN: Timings for all four agent steps.
+    WHEN: The Server-Timing header is built.
+    THEN: Steps are reported in graph order, in milliseconds, followed by the total.
+    """
+    header = tracing.server_timing_header(
+        {"host_llm": 1.5, "decision_gate": 0.25, "retrieval": 0.01, "orchestrator_llm": 0.5},
+        total_seconds=2.5,
+    )
+    assert header == "gate;dur=250.0, retrieval;dur=10.0, orchestrator;dur=500.0, host_llm;dur=1500.0, total;dur=2500.0"
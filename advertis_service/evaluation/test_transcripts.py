@@ -0,0 +1,116 @@
+"""
+test_transcripts.py
+
+Unit tests for the server-side transcript cache in `app.services.transcripts`,
+which lets the SDK send only new messages. Redis is replaced by MockRedisClient.
+"""
+import pytest
+
+from app import config
+from app.models import AdRequest
+from app.services import redis_client, transcripts
+from evaluation.test_utils import MockRedisClient
+
+SYSTEM = {"role": "system", "content": "You are a GM."}
+USER = {"role": "user", "content": "I walk into the bar."}
+ASSISTANT = {"role": "assistant", "content": "The bartender nods."}
+
+
+@pytest.fixture(autouse=True)
+def mock_redis(monkeypatch):
+    client = MockRedisClient()
+    monkeypatch.setattr(redis_client, "redis_client", client)
+    return client
+
+
+def test_hash_chain_extends_without_rehashing():
+    """
+    GIVEN: A history split into a prefix and new messages.
+    WHEN: The prefix hash is extended with the new messages.
+    THEN: The result equals the hash of the whole history, and differs if any
+          message changes.
+    """
+    full = transcripts.extend_hash(transcripts.EMPTY_HASH, [SYSTEM, USER, ASSISTANT])
+    assert transcripts.extend_hash(transcripts.extend_hash("", [SYSTEM]), [USER, ASSISTANT]) == full
+    assert transcripts.extend_hash("", [SYSTEM, USER, {**ASSISTANT, "content": "changed"}]) != full
+
+
+def test_delta_rebuilds_history_from_stored_transcript():
+    """
+    GIVEN: A session whose full history was stored.
+    WHEN: New messages are applied on top of the returned hash.
+    THEN: The reconstructed history is the stored one plus the new messages.
+    """
+    _, base_hash = transcripts.replace("s1", [SYSTEM, USER])
+
+    history, new_hash = transcripts.apply_delta("s1", base_hash, [ASSISTANT, USER])
+
+    assert history == [SYSTEM, USER, ASSISTANT, USER]
+    assert new_hash == transcripts.extend_hash("", history)
+    assert transcripts.load("s1")["hash"] == new_hash
+
+
+def test_delta_on_wrong_base_or_missing_transcript_is_a_mismatch():
+    """
+    GIVEN: A stored transcript, and a session with none.
+    WHEN: A delta is applied with a stale hash, or to the unknown session.
+    THEN: TranscriptMismatch is raised and the stored transcript is unchanged.
+    """
+    _, base_hash = transcripts.replace("s1", [SYSTEM, USER])
+
+    with pytest.raises(transcripts.TranscriptMismatch):
+        transcripts.apply_delta("s1", "stale", [ASSISTANT])
+    with pytest.raises(transcripts.TranscriptMismatch):
+        transcripts.apply_delta("unknown", base_hash, [ASSISTANT])
+    assert transcripts.load("s1")["hash"] == base_hash
+
+
+def test_stored_transcript_is_capped_but_keeps_system_prompt(monkeypatch):
+    """
+    GIVEN: A cap of two messages.
+    WHEN: A longer history is stored.
+    THEN: The system prompt and the two newest messages are kept.
+    """
+    monkeypatch.setattr(config, "TRANSCRIPT_MAX_MESSAGES", 2)
+    transcripts.replace("s1", [SYSTEM, USER, ASSISTANT, USER])
+    assert transcripts.load("s1")["messages"] == [SYSTEM, ASSISTANT, USER]
+
+
+def test_full_and_delta_histories_give_the_agent_the_same_context(monkeypatch):
+    """
+    GIVEN: A cap of two messages.
+    WHEN: The same conversation arrives once in full and once as a delta.
+    THEN: Both return the same capped history.
+    """
+    monkeypatch.setattr(config, "TRANSCRIPT_MAX_MESSAGES", 2)
+    full, _ = transcripts.replace("s-full", [SYSTEM, USER, ASSISTANT, USER])
+    _, base_hash = transcripts.replace("s-delta", [SYSTEM, USER, ASSISTANT])
+    delta, _ = transcripts.apply_delta("s-delta", base_hash, [USER])
+
+    assert full == delta == [SYSTEM, ASSISTANT, USER]
+
+
+def test_ad_request_requires_full_history_or_delta():
+    """
+    GIVEN: Request payloads in both forms, and one with neither.
+    WHEN: They are validated.
+    THEN: The full and delta forms are accepted and the empty one is rejected.
+    """
+    AdRequest(session_id="s1", app_vertical="gaming", conversation_history=[SYSTEM])
+    AdRequest(session_id="s1", app_vertical="gaming", new_messages=[USER], base_hash="abc")
+    with pytest.raises(ValueError):
+        AdRequest(session_id="s1", app_vertical="gaming", new_messages=[USER])
+
+
+def test_retried_delta_is_accepted_once_applied():
+    """
+    GIVEN: A delta that was already applied to the stored transcript.
+    WHEN: The same delta is sent again (an SDK retry).
+    THEN: The stored history and hash are returned without a mismatch or a second append.
+    """
+    _, base_hash = transcripts.replace("s-retry", [SYSTEM, USER])
+    first = transcripts.apply_delta("s-retry", base_hash, [ASSISTANT])
+    retried = transcripts.apply_delta("s-retry", base_hash, [ASSISTANT])
+
+    assert retried == first
+    assert retried[0] == [SYSTEM, USER, ASSISTANT]
@@ -0,0 +1,84 @@
+# advertis_service/scripts/benchmark_safety_gate.py
+"""
+Microbenchmark for the safety gate's matcher over long messages and large
+keyword sets. Three matchers are timed on the same inputs:
+
+  substring    - the old gate: `any(keyword in message.lower())`.
+  alternation  - one regex joining every keyword with "|".
+  trie         - the compiled ruleset the gate uses (a trie-shaped regex).
+
+Usage:
+    python advertis_service/scripts/benchmark_safety_gate.py --keywords 50 1000 5000 --message-words 2000
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+# Add the parent directory to the path to allow app imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.services.safety_rules import SafetyRuleset
+
+
+# Keywords and messages are drawn from disjoint alphabets (every matcher is
+# case-insensitive, so changing case wouldn't keep them apart). No message
+# contains a keyword, so every matcher scans each message to the end.
+KEYWORD_LETTERS = "abcdefghijklm"
+MESSAGE_LETTERS = "nopqrstuvwxyz"
+
+
+def random_word(rng: random.Random, letters: str) -> str:
+    return "".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+
+
+def time_matcher(match, messages, repeats: int) -> float:
+    """Median time (ms) to check every message once."""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for message in messages:
+            match(message)
+        samples.append((time.perf_counter() - started) * 1000 / len(messages))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", type=int, nargs="+", default=[5, 100, 1000, 5000])
+    parser.add_argument("--message-words", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    messages = [
+        " ".join(random_word(rng, MESSAGE_LETTERS) for _ in range(args.message_words))
+        for _ in range(args.messages)
+    ]
+
+    print(f"{'keywords':>9} {'substring ms':>13} {'alternation ms':>15} {'trie ms':>9}")
+    for count in args.keywords:
+        keywords = list({random_word(rng, KEYWORD_LETTERS) for _ in range(count * 2)})[:count]
+        ruleset = SafetyRuleset(keywords)
+        alternation = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, keywords)) + r")(?!\w)", re.IGNORECASE)
+        matchers = {
+            "substring": lambda m: any(k in m.lower() for k in keywords),
+            "alternation": alternation.search,
+            "trie": ruleset.matches,
+        }
+        for name, match in matchers.items():
+            assert not any(match(m) for m in messages), f"{name} matched a message; timings would include early exits"
+
+        substring_ms = time_matcher(matchers["substring"], messages, args.repeats)
+        alternation_ms = time_matcher(matchers["alternation"], messages, args.repeats)
+        trie_ms = time_matcher(matchers["trie"], messages, args.repeats)
+        print(f"{count:>9} {substring_ms:>13.3f} {alternation_ms:>15.3f} {trie_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# advertis_service/scripts/compare_embeddings.py
+"""
+Compares embedding providers on the gaming inventory: each provider seeds an
+in-memory collection with the ad inventory, then retrieves candidates for the
+evaluation dataset's cases exactly as the orchestrator does (last message,
+top 5, gaming only).
+
+Reported per provider:
+  - hit@5: cases with at least one expected ad in the top 5
+  - recall@5: share of each case's expected ads found in the top 5
+  - MRR: mean reciprocal rank of the first expected ad
+  - seed time, and query latency (embedding + search) p50 / p95
+
+Providers that can't be built here (no API key, no local ONNX model) are
+reported as skipped.
+
+Usage:
+    python advertis_service/scripts/compare_embeddings.py --providers hashing openai
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+# Add the parent directory to the path to allow app imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "compare")
+
+import chromadb
+
+from app.services import embeddings
+from app.services.ad_inventory import GAMING_AD_INVENTORY
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "..", "evaluation", "data", "test_dataset.json")
+TOP_K = 5
+
+
+def load_cases(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [case for case in json.load(f) if case.get("expected_ad_ids")]
+
+
+def evaluate(provider: str, cases: List[Dict]) -> Dict:
+    backend = embeddings.create_backend(provider)
+    client = chromadb.EphemeralClient()
+    name = f"compare-{provider}"
+    if name in [c.name for c in client.list_collections()]:
+        client.delete_collection(name)
+    collection = client.create_collection(
+        name=name, embedding_function=backend.function, metadata={embeddings.SPACE_KEY: backend.space}
+    )
+
+    started = time.perf_counter()
+    collection.add(
+        ids=[ad["id"] for ad in GAMING_AD_INVENTORY],
+        documents=[ad["document"] for ad in GAMING_AD_INVENTORY],
+        metadatas=[ad["metadata"] for ad in GAMING_AD_INVENTORY],
+    )
+    seed_seconds = time.perf_counter() - started
+
+    hits, recall, reciprocal_ranks, latencies = 0, 0.0, 0.0, []
+    for case in cases:
+        started = time.perf_counter()
+        results = collection.query(query_texts=[case["last_message"]], n_results=TOP_K, where={"target_vertical": "gaming"})
+        latencies.append(time.perf_counter() - started)
+
+        retrieved = results["ids"][0]
+        expected = set(case["expected_ad_ids"])
+        found = [rank for rank, ad_id in enumerate(retrieved, start=1) if ad_id in expected]
+        hits += bool(found)
+        recall += len(found) / len(expected)
+        reciprocal_ranks += 1.0 / found[0] if found else 0.0
+
+    latencies.sort()
+    return {
+        "space": backend.space,
+        "hit@5": hits / len(cases),
+        "recall@5": recall / len(cases),
+        "mrr": reciprocal_ranks / len(cases),
+        "seed_ms": seed_seconds * 1000,
+        "query_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "query_p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", default=sorted(embeddings.PROVIDERS), choices=sorted(embeddings.PROVIDERS))
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    args = parser.parse_args()
+
+    cases = load_cases(args.dataset)
+    print(f"{len(GAMING_AD_INVENTORY)} ads, {len(cases)} cases with expected ads.\n")
+    print(f"{'provider':<10} {'hit@5':>6} {'recall@5':>9} {'MRR':>6} {'seed ms':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for provider in args.providers:
+        try:
+            result = evaluate(provider, cases)
+        except Exception as e:
+            print(f"{provider:<10} skipped: {e}")
+            continue
+        print(
+            f"{provider:<10} {result['hit@5']:>6.2f} {result['recall@5']:>9.2f} {result['mrr']:>6.2f} "
+            f"{result['seed_ms']:>9.1f} {result['query_p50_ms']:>8.2f} {result['query_p95_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
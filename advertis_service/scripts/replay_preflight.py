@@ -0,0 +1,86 @@
+# advertis_service/scripts/replay_preflight.py
+"""
+Replays recorded turns through the pre-flight history gate and reports how
+many /get-response calls it would have avoided, and whether the decision gate
+agreed with each avoided call.
+
+Turns come from the evaluation dataset (cases that pass today's pre-flight
+check and reach the decision gate) and from decision logs collected with
+GATE_DECISION_LOG_PATH, which record every turn the LLM gate judged.
+
+Usage:
+    python advertis_service/scripts/replay_preflight.py --decision-log gate_decisions.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Add the parent directory to the path to allow app imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+from app.services import redis_client
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "..", "evaluation", "data", "test_dataset.json")
+
+# (history, whether the decision gate saw an opportunity)
+Turn = Tuple[List[Dict], bool]
+
+
+def load_dataset(path: str) -> List[Turn]:
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)
+    return [
+        (case["history"], "orchestrator" in case["expected_paths"])
+        for case in cases if "decision_gate" in case["expected_paths"]
+    ]
+
+
+def load_decision_log(path: str) -> List[Turn]:
+    # Logged histories hold the last 4 messages; a short conversation is logged
+    # whole, so the turn count is exact wherever the initial-turn rule applies.
+    with open(path, encoding="utf-8") as f:
+        return [(entry["history"], bool(entry["opportunity"])) for entry in map(json.loads, f) if entry]
+
+
+def replay(turns: List[Turn]) -> Dict:
+    avoided: Counter = Counter()
+    wrongly_avoided: Counter = Counter()
+    for history, opportunity in turns:
+        messages = [m for m in history if m.get("role") != "system"]
+        last_message = messages[-1].get("content") if messages else None
+        passed, reason = redis_client.run_history_gate(last_message, len(messages))
+        if not passed:
+            avoided[reason] += 1
+            if opportunity:
+                wrongly_avoided[reason] += 1
+    gate_skips = sum(not opportunity for _, opportunity in turns)
+    return {"turns": len(turns), "gate_skips": gate_skips, "avoided": avoided, "wrongly_avoided": wrongly_avoided}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Pass an empty string to skip the dataset")
+    parser.add_argument("--decision-log", action="append", default=[], help="JSONL written via GATE_DECISION_LOG_PATH (repeatable)")
+    args = parser.parse_args()
+
+    sources = ([("dataset", load_dataset(args.dataset))] if args.dataset else []) + [
+        (path, load_decision_log(path)) for path in args.decision_log
+    ]
+    for name, turns in sources:
+        result = replay(turns)
+        total_avoided = sum(result["avoided"].values())
+        print(f"\n{name}: {result['turns']} turns reached /get-response; the decision gate skipped {result['gate_skips']}.")
+        print(f"  Avoided by the history gate: {total_avoided} ({total_avoided / max(result['turns'], 1):.1%} of calls)")
+        for reason, count in result["avoided"].most_common():
+            print(f"    {reason}: {count} (gate disagreed on {result['wrongly_avoided'][reason]})")
+        if result["gate_skips"]:
+            caught = total_avoided - sum(result["wrongly_avoided"].values())
+            print(f"  Gate skips caught before the LLM: {caught}/{result['gate_skips']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# advertis_service/scripts/train_gate_classifier.py
+"""
+Trains the local decision-gate classifier and writes its JSON artifact.
+
+Examples come from the evaluation dataset (cases that reach the decision gate,
+labelled by whether they go on to the orchestrator) and from any decision logs
+collected with GATE_DECISION_LOG_PATH. Confidence thresholds are picked from
+k-fold cross-validated probabilities so that each side the classifier answers
+locally meets the target precision; everything in between defers to the LLM.
+
+Usage:
+    python advertis_service/scripts/train_gate_classifier.py \\
+        --decision-log gate_decisions.jsonl --out gate_classifier.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Add the parent directory to the path to allow app imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "training")
+
+from app.services import gate_classifier
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), "..", "evaluation", "data", "test_dataset.json")
+
+Example = Tuple[List[Dict], bool]
+
+
+def load_dataset(path: str) -> List[Example]:
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)
+    return [
+        (case["history"][-4:], "orchestrator" in case["expected_paths"])
+        for case in cases if "decision_gate" in case["expected_paths"]
+    ]
+
+
+def load_decision_log(path: str) -> List[Example]:
+    with open(path, encoding="utf-8") as f:
+        return [(entry["history"], bool(entry["opportunity"])) for entry in map(json.loads, f) if entry]
+
+
+def cross_validated_probabilities(examples: List[Example], folds: int, args) -> List[Tuple[float, bool]]:
+    order = list(range(len(examples)))
+    random.Random(args.seed).shuffle(order)
+    scored = []
+    for fold in range(folds):
+        held_out = set(order[fold::folds])
+        model = gate_classifier.train(
+            [e for i, e in enumerate(examples) if i not in held_out],
+            dim=args.dim, epochs=args.epochs, seed=args.seed,
+        )
+        scored += [(model.probability(examples[i][0]), examples[i][1]) for i in held_out]
+    return scored
+
+
+def pick_threshold(scored: Sequence[Tuple[float, bool]], positive: bool, target: float, min_support: int) -> Optional[float]:
+    """
+    The threshold that answers the most examples on one side while keeping that
+    side's precision at or above `target`; None if no threshold qualifies.
+    """
+    ranked = sorted(scored, key=lambda s: s[0], reverse=positive)
+    best, correct = None, 0
+    for n, (p, label) in enumerate(ranked, start=1):
+        correct += label == positive
+        if n >= min_support and correct / n >= target and (n == len(ranked) or ranked[n][0] != p):
+            best = p
+    return best
+
+
+def report(scored: Sequence[Tuple[float, bool]], skip_below: float, opportunity_above: float) -> Dict:
+    """Precision and recall of each locally answered side, and how much traffic is deferred."""
+    def side(positive: bool) -> Dict:
+        answered = [label for p, label in scored if (p >= opportunity_above if positive else p <= skip_below)]
+        relevant = sum(label == positive for _, label in scored)
+        hits = sum(label == positive for label in answered)
+        return {
+            "answered": len(answered),
+            "precision": round(hits / len(answered), 3) if answered else None,
+            "recall": round(hits / relevant, 3) if relevant else None,
+        }
+
+    opportunity, skip = side(True), side(False)
+    local = opportunity["answered"] + skip["answered"]
+    return {
+        "examples": len(scored),
+        "opportunity": opportunity,
+        "skip": skip,
+        "answered_locally": round(local / len(scored), 3) if scored else 0.0,
+        "deferred_to_llm": len(scored) - local,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--decision-log", action="append", default=[], help="JSONL written via GATE_DECISION_LOG_PATH (repeatable)")
+    parser.add_argument("--out", default="gate_classifier.json")
+    parser.add_argument("--dim", type=int, default=gate_classifier.DEFAULT_DIM)
+    parser.add_argument("--epochs", type=int, default=40)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--target-precision", type=float, default=0.95)
+    parser.add_argument("--min-support", type=int, default=3, help="Fewest examples a threshold must answer")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    examples = load_dataset(args.dataset)
+    for path in args.decision_log:
+        examples += load_decision_log(path)
+    positives = sum(label for _, label in examples)
+    print(f"Training on {len(examples)} examples ({positives} opportunity, {len(examples) - positives} skip).")
+
+    scored = cross_validated_probabilities(examples, args.folds, args)
+    opportunity_above = pick_threshold(scored, True, args.target_precision, args.min_support)
+    skip_below = pick_threshold(scored, False, args.target_precision, args.min_support)
+    # A side with no qualifying threshold is never answered locally.
+    opportunity_above = 1.0 + 1e-9 if opportunity_above is None else opportunity_above
+    skip_below = -1e-9 if skip_below is None else skip_below
+
+    cv_report = report(scored, skip_below, opportunity_above)
+    model = gate_classifier.train(examples, dim=args.dim, epochs=args.epochs, seed=args.seed)
+    model.skip_below, model.opportunity_above = skip_below, opportunity_above
+    model.report = {"cross_validated": cv_report, "folds": args.folds, "target_precision": args.target_precision}
+    model.save(args.out)
+
+    print(f"Thresholds: skip if p <= {skip_below:.3f}, opportunity if p >= {opportunity_above:.3f}")
+    print(f"{'side':<12} {'answered':>8} {'precision':>10} {'recall':>7}")
+    for side in ("opportunity", "skip"):
+        r = cv_report[side]
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"{side:<12} {r['answered']:>8} {fmt(r['precision']):>10} {fmt(r['recall']):>7}")
+    print(f"Answered locally: {cv_report['answered_locally']:.1%}; deferred to the LLM: {cv_report['deferred_to_llm']}")
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,56 @@
 import streamlit as st
 import uuid
-import asyncio
 
 # Conditional imports to handle both direct execution and package imports
 try:
     # Try relative import first (works when run as part of host_app package)
-    from .services import database, advertis_client, fallback_llm
+    from . import config
+    from .services import database, advertis_client, fallback_llm, history_cache, event_loop
 except ImportError:
     # Fall back to absolute import (works when run directly in Docker)
-    from services import database, advertis_client, fallback_llm
+    import config
+    from services import database, advertis_client, fallback_llm, history_cache, event_loop
 
-# Module-level placeholders for dependencies used by get_final_response
-db_session = None
+# Module-level placeholder for the vertical used by get_final_response
 selected_vertical = None
 
 
-async def get_final_response(db_session, session_id: uuid.UUID, prompt: str) -> str:
+# --- Async DB Work ---
+# Per-turn database work runs on the background loop through the async engine,
+# so a turn's reads and writes share its connection pool instead of each
+# script run holding a sync connection.
+async def start_chat_session(user_id: int, system_prompt: str, app_vertical: str) -> database.ChatSession:
+    """Creates a chat session and its system message."""
+    async with database.async_session_scope() as db_session:
+        return await database.create_chat_session_async(db_session, user_id, system_prompt, app_vertical)
+
+
+async def build_history(session_id: uuid.UUID, prompt: str):
+    """
+    The history sent for a turn: the system prompt plus the recent turns (from
+    memory after the first turn) and the new prompt, which is not saved yet;
+    it is persisted together with the reply.
+    """
+    async with database.async_session_scope() as db_session:
+        history = await database.get_cached_chat_history_async(db_session, session_id)
+    return history_cache.trim_history(
+        history + [{"role": "user", "content": prompt}],
+        max_messages=config.HISTORY_MAX_MESSAGES,
+        max_tokens=config.HISTORY_MAX_TOKENS,
+    )
+
+
+async def save_turn(session_id: uuid.UUID, messages):
+    """Saves a turn's (role, content) pairs in one transaction."""
+    async with database.async_session_scope() as db_session:
+        await database.save_turn_async(db_session, session_id, messages)
+
+
+async def get_final_response(session_id: uuid.UUID, prompt: str) -> str:
     """
     Orchestrates getting the final response by calling the simplified SDK wrapper.
     """
-    # Get the full history from the database
-    history = database.get_chat_history(db_session, session_id)
+    history = await build_history(session_id, prompt)
 
     # The implementation is now just a single, declarative line!
     return await advertis_client.get_monetized_response(
@@ -31,14 +61,89 @@ async def get_final_response(db_session, session_id: uuid.UUID, prompt: str) ->
     )
 
 
+async def stream_final_response(session_id: uuid.UUID, history):
+    """
+    Streaming version of `get_final_response`: yields the reply in chunks as
+    they arrive, so the UI can render from the first token. The history is
+    built beforehand (see `build_history`), so nothing but the stream itself
+    runs while the loop is iterating it.
+    """
+    async for chunk in advertis_client.stream_monetized_response(
+        session_id=str(session_id),
+        app_vertical=selected_vertical,
+        history=history,
+        fallback_stream_func=fallback_llm.stream_fallback_response
+    ):
+        yield chunk
+
+
+def trim_window(messages, earlier_pages, window: int):
+    """
+    Keeps the system message plus the last `window` messages in the rendered
+    window. Messages pushed out of it move to the newest earlier page if the
+    user has paged back (so they stay visible), and are otherwise dropped from
+    memory; they remain in the database.
+    """
+    head = messages[:1] if messages and messages[0]["role"] == "system" else []
+    body = messages[len(head):]
+    overflow = max(0, len(body) - window)
+    if overflow and earlier_pages:
+        earlier_pages[-1].extend(body[:overflow])
+    return head + body[overflow:]
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def transcript_markdown(page) -> str:
+    """
+    Renders a page of earlier messages, given as (role, content) pairs, as one
+    markdown block. Cached, so unchanged pages are not re-rendered each rerun.
+    """
+    labels = {"user": "🧑 **You**", "assistant": "🤖 **Assistant**"}
+    return "\n\n---\n\n".join(f"{labels.get(role, role)}\n\n{content}" for role, content in page)
+
+
+def remember_message(role: str, content: str):
+    """Adds a message to the rendered window and trims the window to size."""
+    st.session_state.messages.append({"role": role, "content": content})
+    st.session_state.messages = trim_window(
+        st.session_state.messages, st.session_state.earlier_pages, config.RENDER_WINDOW_MESSAGES
+    )
+
+
+def render_earlier_messages(db_session):
+    """Shows the "load earlier" control and any earlier pages already loaded."""
+    pages = st.session_state.earlier_pages
+    in_window = len([m for m in st.session_state.messages if m["role"] != "system"])
+    shown = in_window + sum(len(page) for page in pages)
+    if st.session_state.get("more_earlier", in_window >= config.RENDER_WINDOW_MESSAGES):
+        if st.button("Load earlier messages"):
+            page = database.get_messages_page(
+                db_session, st.session_state.session_id, skip_newest=shown, limit=config.RENDER_PAGE_SIZE + 1
+            )
+            st.session_state.more_earlier = len(page) > config.RENDER_PAGE_SIZE
+            pages.insert(0, page[-config.RENDER_PAGE_SIZE:])
+            st.rerun()
+
+    for page in pages:
+        st.markdown(transcript_markdown(tuple((m["role"], m["content"]) for m in page)))
+    if pages:
+        st.divider()
+
+
 def main():
-    global db_session, selected_vertical
-    
     # Initialize database tables first
     database.init_db()
-    
-    # Initialize DB session and ensure dummy user exists at app start
-    db_session = next(database.get_db())
+
+    # One DB session per script run (i.e. per user interaction), so concurrent
+    # users never share a session
+    with database.session_scope() as db_session:
+        render(db_session)
+
+
+def render(db_session):
+    global selected_vertical
+
+    # Ensure dummy user exists
     dummy_user = database.get_or_create_dummy_user(db_session)
 
     # --- Page Configuration ---
@@ -65,17 +170,22 @@ def main():
     # Button to start a new chat
     if st.sidebar.button("Start New Chat"):
         # Create a new session in the database
-        new_session = database.create_chat_session(
-            db_session=db_session,
+        new_session = event_loop.run(start_chat_session(
             user_id=dummy_user.id,
             system_prompt=system_prompt,
             app_vertical=selected_vertical
-        )
+        ))
         # Store the new session ID and reset messages in Streamlit's state
         st.session_state.session_id = new_session.id
         st.session_state.messages = [{"role": "system", "content": system_prompt}]
+        st.session_state.earlier_pages = []
+        st.session_state.pop("more_earlier", None)
         st.rerun()  # Rerun the script to reflect the new state
 
+    # Hit rate of the in-memory chat history cache
+    with st.sidebar.expander("History Cache"):
+        st.json(database.history_cache.stats())
+
     # --- Main Chat Interface ---
     st.title("🤖 Advertis Protocol Demo")
     st.caption("This application simulates a customer integrating the Advertis monetization service.")
@@ -83,8 +193,14 @@ def main():
     # Initialize chat history in session state if it doesn't exist
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "earlier_pages" not in st.session_state:
+        st.session_state.earlier_pages = []
 
-    # Display past messages from session state
+    # Earlier messages are only loaded from the database on demand
+    if "session_id" in st.session_state:
+        render_earlier_messages(db_session)
+
+    # Display the recent window of messages from session state
     for message in st.session_state.messages:
         if message["role"] != "system":  # Don't display the system prompt
             with st.chat_message(message["role"]):
@@ -98,23 +214,32 @@ def main():
             session_id = st.session_state.session_id
 
             # Add user message to state and display it
-            st.session_state.messages.append({"role": "user", "content": prompt})
+            remember_message("user", prompt)
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            # Save user message to DB
-            database.save_message(db_session, session_id, "user", prompt)
-
             # --- THIS IS THE REFACTORED ORCHESTRATION LOGIC ---
-            with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    # Call the async orchestrator function just once
-                    final_response_text = asyncio.run(get_final_response(db_session, session_id, prompt))
-                    st.markdown(final_response_text)
-
-            # Add AI response to state and save to DB
-            st.session_state.messages.append({"role": "assistant", "content": final_response_text})
-            database.save_message(db_session, session_id, "assistant", final_response_text)
+            final_response_text = None
+            try:
+                history = event_loop.run(build_history(session_id, prompt))
+                with st.chat_message("assistant"):
+                    # Stream the reply from the long-lived background loop (so pooled
+                    # clients are reused across turns), rendering tokens as they arrive
+                    final_response_text = st.write_stream(
+                        event_loop.iterate(stream_final_response(session_id, history))
+                    )
+                    if not isinstance(final_response_text, str):  # An empty stream returns a list
+                        final_response_text = "".join(final_response_text)
+            finally:
+                # Save the whole turn to DB in one transaction; if the reply failed
+                # or the run was interrupted, the prompt is still kept
+                turn = [("user", prompt)]
+                if final_response_text is not None:
+                    turn.append(("assistant", final_response_text))
+                event_loop.run(save_turn(session_id, turn))
+
+            # Add AI response to state
+            remember_message("assistant", final_response_text)
 
 
 if __name__ == "__main__":
@@ -6,11 +6,45 @@ load_dotenv()
 
 # URL for the host app's own database
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Async driver URL; derived from DATABASE_URL (postgresql+asyncpg://) when unset.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+# Connection pool sizing, applied to both the sync and async engines.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
 # URL to connect to our other microservice
 ADVERTIS_API_URL = os.getenv("ADVERTIS_API_URL", "http://advertis_service:8000")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# How often the SDK revalidates its local copy of the service's safety rules.
+SAFETY_RULES_SYNC_SECONDS = int(os.getenv("SAFETY_RULES_SYNC_SECONDS", "300"))
+# Language of the conversation; selects the safety gate's keyword set.
+ADVERTIS_LOCALE = os.getenv("ADVERTIS_LOCALE", "en")
+# Send the recent messages with the pre-flight check so the service can start
+# the turn's work early (it must also have SPECULATION_ENABLED).
+ADVERTIS_SPECULATE = os.getenv("ADVERTIS_SPECULATE", "false").lower() == "true"
+
+# How much chat history is sent with each turn: the system prompt plus at most
+# this many recent messages and, if set, this many (estimated) tokens.
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "40"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "0")) or None
+# Number of sessions whose recent history is kept in memory between turns.
+HISTORY_CACHE_MAX_SESSIONS = int(os.getenv("HISTORY_CACHE_MAX_SESSIONS", "256"))
+
+# Chat UI: how many recent messages are rendered, and how many earlier ones
+# each "Load earlier messages" click pages in from the database.
+RENDER_WINDOW_MESSAGES = int(os.getenv("RENDER_WINDOW_MESSAGES", "50"))
+RENDER_PAGE_SIZE = int(os.getenv("RENDER_PAGE_SIZE", "50"))
+
+# When enabled, a turn's messages are written by a background thread that
+# batches inserts across sessions, instead of on the Streamlit thread.
+PERSIST_WRITE_BEHIND = os.getenv("PERSIST_WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "200"))
+WRITE_BEHIND_MAX_DELAY_MS = int(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "50"))
+
 if not DATABASE_URL:
     raise ValueError("FATAL: DATABASE_URL environment variable is missing.")
\ No newline at end of file
@@ -1,6 +1,13 @@
 # host_app/app/services/advertis_client.py
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from collections import OrderedDict
 import httpx
-from typing import List, Dict, Optional, Callable, Awaitable
+from typing import List, Dict, Optional, Callable, Awaitable, AsyncIterator, Tuple
 from pydantic import BaseModel
 # Conditional imports to handle both direct execution and package imports
 try:
@@ -10,49 +17,404 @@ except ImportError:
     # Fall back to absolute import (works when run directly in Docker)
     import config
 
+TRACE_HEADER = "X-Trace-Id"
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
 # --- Pydantic Models for Deserialization ---
+class EligibilityHints(BaseModel):
+    session_exhausted: bool = False
+    turns_until_eligible: int = 0
+    next_eligible_turn: int = 0
+    earliest_eligible_at: int = 0
+    seconds_until_eligible: int = 0
+
 class CheckResponse(BaseModel):
     proceed: bool
     reason: str
+    hints: Optional[EligibilityHints] = None
+    rules_version: Optional[str] = None
+    # Filled by the SDK from the `Server-Timing` response header (milliseconds).
+    server_timing: Dict[str, float] = {}
 
 class AdResponse(BaseModel):
     status: str
     response_text: Optional[str] = None
+    transcript_hash: Optional[str] = None
+    hints: Optional[EligibilityHints] = None
+    server_timing: Dict[str, float] = {}
+
+class MonetizedResponse(BaseModel):
+    """The final text of a turn plus where it came from and how long each part took."""
+    text: str
+    source: str  # "advertis" or "fallback"
+    trace_id: str
+    # Per-call breakdowns in milliseconds, e.g.
+    # {"check_opportunity": {"total": 4.1}, "get_response": {"gate": 310.0, ...}, "fallback": {"total": 900.0}}
+    timings: Dict[str, Dict[str, float]] = {}
+
+# --- Helpers ---
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parses a `Server-Timing` header like 'gate;dur=12.3, total;dur=40.0' into {name: ms}."""
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    timings[name] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+SPECULATION_MESSAGES = 4  # What the service's decision gate looks at
+
+def summarize_history(history: List[Dict]) -> Dict:
+    """
+    The pre-flight check's view of the conversation: how many turns it has, so
+    the service can reject turns the decision gate would skip without the full
+    history. (With speculation on, the last few messages are sent separately.)
+    """
+    return {"turn_count": len([m for m in history if m.get("role") != "system"])}
+
+# --- Connection Pool ---
+# One AsyncClient per event loop, reused for every call so connections stay
+# warm across turns. A client is tied to the loop it was created on, so a new
+# one is made if the SDK is used from a different loop.
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+        _client_loop = loop
+    return _client
+
+async def aclose():
+    """Closes the SDK's pooled HTTP client (e.g. on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# --- Delta History Sync ---
+# The service keeps a copy of each session's transcript, identified by a
+# chained hash. Once a session is synced, only the messages added since the
+# last call are sent, together with the hash of the transcript they extend.
+# The SDK remembers that hash and the last few messages it synced, to find
+# where the new messages start in the next history it is given.
+SYNC_TAIL_MESSAGES = 4
+SYNC_MAX_SESSIONS = 1024
+_synced: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+
+def _canonical(message: Dict) -> str:
+    return json.dumps(message, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def extend_hash(base_hash: str, messages: List[Dict]) -> str:
+    """Chained transcript hash; must match `transcripts.extend_hash` in the service."""
+    digest = base_hash
+    for message in messages:
+        digest = hashlib.sha256((digest + _canonical(message)).encode("utf-8")).hexdigest()
+    return digest
+
+def _fingerprint(message: Dict) -> str:
+    return hashlib.sha256(_canonical(message).encode("utf-8")).hexdigest()
+
+def _history_delta(session_id: str, history: List[Dict]) -> Optional[Tuple[str, List[Dict]]]:
+    """
+    Returns (base_hash, new_messages) if `history` continues the transcript
+    last synced for the session, or None if it has to be sent in full.
+    """
+    state = _synced.get(session_id)
+    if state is None:
+        return None
+    base_hash, tail = state
+    prints = [_fingerprint(message) for message in history]
+    for end in range(len(prints), len(tail) - 1, -1):
+        if prints[end - len(tail):end] == tail:
+            return base_hash, history[end:]
+    return None
+
+def _remember_sync(session_id: str, transcript_hash: Optional[str], history: List[Dict]):
+    if transcript_hash is None:
+        _synced.pop(session_id, None)
+        return
+    _synced[session_id] = (transcript_hash, [_fingerprint(m) for m in history[-SYNC_TAIL_MESSAGES:]])
+    _synced.move_to_end(session_id)
+    while len(_synced) > SYNC_MAX_SESSIONS:
+        _synced.popitem(last=False)
+
+# --- Local Eligibility Hints ---
+# The service says when a session can next be eligible for an ad. Until then
+# the SDK answers pre-flight checks itself, counting the turns it skipped so
+# the service's turn count stays right when it is next called.
+HINTS_TTL_SECONDS = 7200  # The service forgets idle sessions after 2 hours
+HINTS_MAX_SESSIONS = 1024
+
+class _LocalHints:
+    def __init__(self, hints: EligibilityHints):
+        now = time.monotonic()
+        self.exhausted = hints.session_exhausted
+        self.turns_left = hints.turns_until_eligible
+        # Relative to the server's clock, so client clock skew doesn't matter
+        self.eligible_after = now + hints.seconds_until_eligible
+        self.expires = now + HINTS_TTL_SECONDS
+
+_hints: "OrderedDict[str, _LocalHints]" = OrderedDict()
+_skipped_turns: Dict[str, int] = {}
+
+def _update_hints(session_id: str, hints: Optional[EligibilityHints]):
+    if hints is None:
+        _hints.pop(session_id, None)
+        return
+    _hints[session_id] = _LocalHints(hints)
+    _hints.move_to_end(session_id)
+    while len(_hints) > HINTS_MAX_SESSIONS:
+        _hints.popitem(last=False)
+
+def _local_skip_reason(session_id: str) -> Optional[str]:
+    """
+    Returns why this turn is certain to be rejected, based on the last hints,
+    and counts it as skipped; returns None if the service must be asked.
+    """
+    hints = _hints.get(session_id)
+    if hints is None:
+        return None
+    if time.monotonic() >= hints.expires:
+        del _hints[session_id]
+        return None
+
+    if hints.exhausted:
+        reason = "Session ad limit reached"
+    elif hints.turns_left > 0:
+        hints.turns_left -= 1
+        reason = "Turn frequency cap not met"
+    elif time.monotonic() < hints.eligible_after:
+        reason = "Cooldown period active"
+    else:
+        return None
+    _skipped_turns[session_id] = _skipped_turns.get(session_id, 0) + 1
+    return f"SDK: Skipped locally ({reason})"
+
+# --- Local Safety Gate ---
+# A copy of the service's safety ruleset, so turns the gate would reject never
+# leave the host. It is fetched when the service reports a version we don't
+# have, and revalidated with its ETag every SAFETY_RULES_SYNC_SECONDS. The
+# service still enforces the gate itself, so a stale copy can't bypass it.
+SUPPORTED_RULES_FORMAT = 1
+SAFETY_REJECT_REASON = "SDK: Safety Gate: REJECTED (High-consequence keyword detected)"
+
+class _SafetyRules:
+    def __init__(self, document: Dict, etag: Optional[str]):
+        flags = re.IGNORECASE if "IGNORECASE" in document.get("flags", []) else 0
+        patterns = document["patterns"]
+        self.version = document["version"]
+        self.etag = etag
+        self.regex = re.compile("|".join(patterns), flags) if patterns else None
+        self.synced_at = time.monotonic()
+
+# Rules are fetched per vertical; the locale is fixed by config.ADVERTIS_LOCALE.
+_safety_rules: Dict[Optional[str], _SafetyRules] = {}
+_rules_sync_tasks: Dict[Optional[str], asyncio.Task] = {}
+
+async def sync_safety_rules(app_vertical: Optional[str] = None) -> Optional[str]:
+    """Fetches (or revalidates) the service's safety ruleset for a vertical; returns the version in use."""
+    url = f"{config.ADVERTIS_API_URL}/v1/rules/safety"
+    params = {k: v for k, v in {"vertical": app_vertical, "locale": config.ADVERTIS_LOCALE}.items() if v}
+    rules = _safety_rules.get(app_vertical)
+    headers = {"If-None-Match": rules.etag} if rules and rules.etag else {}
+    try:
+        response = await _get_client().get(url, params=params, headers=headers, timeout=2.0)
+        if response.status_code == 304 and rules:
+            rules.synced_at = time.monotonic()
+        else:
+            response.raise_for_status()
+            document = response.json()
+            if document.get("format") != SUPPORTED_RULES_FORMAT:
+                print(f"SDK LOG: Unsupported safety rules format {document.get('format')}; gate stays server-side.")
+                _safety_rules.pop(app_vertical, None)
+            else:
+                _safety_rules[app_vertical] = _SafetyRules(document, response.headers.get("ETag"))
+    except (httpx.HTTPStatusError, httpx.RequestError, ValueError, KeyError, re.error) as e:
+        print(f"SDK LOG: Could not sync safety rules: {e}")
+        if rules:
+            rules.synced_at = time.monotonic()  # Keep the old rules; retry next interval
+    rules = _safety_rules.get(app_vertical)
+    return rules.version if rules else None
+
+def _schedule_rules_sync(app_vertical: Optional[str], server_version: Optional[str]):
+    """Starts a background sync if our rules are missing, outdated, or due for revalidation."""
+    task = _rules_sync_tasks.get(app_vertical)
+    if task is not None and not task.done():
+        return
+    rules = _safety_rules.get(app_vertical)
+    if rules is None:
+        due = server_version is not None
+    else:
+        due = (server_version is not None and server_version != rules.version) or \
+            time.monotonic() - rules.synced_at >= config.SAFETY_RULES_SYNC_SECONDS
+    if due:
+        _rules_sync_tasks[app_vertical] = asyncio.get_running_loop().create_task(sync_safety_rules(app_vertical))
+
+def _locally_unsafe(last_message: Optional[str], app_vertical: Optional[str] = None) -> bool:
+    rules = _safety_rules.get(app_vertical)
+    return bool(last_message and rules and rules.regex and rules.regex.search(last_message))
 
 # --- Low-Level API Functions ---
-async def _check_opportunity(session_id: str, last_message: str) -> CheckResponse:
-    """Makes the fast 'pre-flight' call to the advertis service."""
+async def _check_opportunity(
+    session_id: str,
+    last_message: str,
+    trace_id: Optional[str] = None,
+    app_vertical: Optional[str] = None,
+    history_summary: Optional[Dict] = None,
+    recent_history: Optional[List[Dict]] = None,
+) -> CheckResponse:
+    """
+    Makes the fast 'pre-flight' call to the advertis service, unless earlier
+    eligibility hints already show the turn will be rejected.
+    """
+    skip_reason = _local_skip_reason(session_id)
+    if skip_reason:
+        return CheckResponse(proceed=False, reason=skip_reason)
+    if _locally_unsafe(last_message, app_vertical):
+        # The service would reject (and count) this turn; count it as skipped
+        _skipped_turns[session_id] = _skipped_turns.get(session_id, 0) + 1
+        _schedule_rules_sync(app_vertical, None)
+        return CheckResponse(proceed=False, reason=SAFETY_REJECT_REASON)
+
     url = f"{config.ADVERTIS_API_URL}/v1/check-opportunity"
     payload = {"session_id": session_id, "last_message": last_message}
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload, timeout=5.0)
-            response.raise_for_status()
-            return CheckResponse.model_validate(response.json())
-        except (httpx.HTTPStatusError, httpx.RequestError) as e:
-            print(f"SDK LOG: Error in check_opportunity: {e}")
-            return CheckResponse(proceed=False, reason="Advertis service error")
+    if app_vertical:
+        payload["app_vertical"] = app_vertical
+    if config.ADVERTIS_LOCALE:
+        payload["locale"] = config.ADVERTIS_LOCALE
+    if history_summary:
+        payload["history_summary"] = history_summary
+    if recent_history:
+        payload["recent_history"] = recent_history
+    skipped_turns = _skipped_turns.pop(session_id, 0)
+    if skipped_turns:
+        payload["skipped_turns"] = skipped_turns
+    headers = {TRACE_HEADER: trace_id} if trace_id else {}
+
+    client = _get_client()
+    try:
+        response = await client.post(url, json=payload, headers=headers, timeout=5.0)
+        response.raise_for_status()
+        check = CheckResponse.model_validate(response.json())
+        check.server_timing = parse_server_timing(response.headers.get("Server-Timing"))
+        _update_hints(session_id, check.hints)
+        _schedule_rules_sync(app_vertical, check.rules_version)
+        return check
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        print(f"SDK LOG: Error in check_opportunity (trace {trace_id}): {e}")
+        if skipped_turns:  # Report them on the next successful call instead
+            _skipped_turns[session_id] = _skipped_turns.get(session_id, 0) + skipped_turns
+        return CheckResponse(proceed=False, reason="Advertis service error")
 
-async def _get_response(session_id: str, app_vertical: str, history: List[Dict]) -> AdResponse:
-    """Makes the main call to get a potentially monetized response."""
+async def _get_response(session_id: str, app_vertical: str, history: List[Dict], trace_id: Optional[str] = None) -> AdResponse:
+    """
+    Makes the main call to get a potentially monetized response. Only the new
+    messages are sent when the service already holds the rest of the history;
+    if it no longer does (409), the full history is sent instead.
+    """
     url = f"{config.ADVERTIS_API_URL}/v1/get-response"
-    payload = {
-        "session_id": session_id,
-        "app_vertical": app_vertical,
-        "conversation_history": history
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload, timeout=20.0)
-            response.raise_for_status()
-            return AdResponse.model_validate(response.json())
-        except (httpx.HTTPStatusError, httpx.RequestError) as e:
-            print(f"SDK LOG: Error in get_response: {e}")
-            return AdResponse(status="skip", response_text=None)
+    payload = {"session_id": session_id, "app_vertical": app_vertical}
+    if config.ADVERTIS_LOCALE:
+        payload["locale"] = config.ADVERTIS_LOCALE
+    headers = {TRACE_HEADER: trace_id} if trace_id else {}
+
+    delta = _history_delta(session_id, history)
+    if delta:
+        base_hash, new_messages = delta
+        payload.update(new_messages=new_messages, base_hash=base_hash)
+        expected_hash = extend_hash(base_hash, new_messages)
+    else:
+        payload["conversation_history"] = history
+        expected_hash = extend_hash("", history)
+    # The transcript's hash identifies the turn, so a double submit or retry of
+    # it is answered from the service's first run instead of running again
+    headers[IDEMPOTENCY_HEADER] = expected_hash[:32]
+
+    client = _get_client()
+    try:
+        response = await client.post(url, json=payload, headers=headers, timeout=20.0)
+        if response.status_code == 409 and delta:
+            print(f"SDK LOG: Transcript out of sync (trace {trace_id}). Resending full history.")
+            _synced.pop(session_id, None)
+            return await _get_response(session_id, app_vertical, history, trace_id)
+        response.raise_for_status()
+        ad_response = AdResponse.model_validate(response.json())
+        ad_response.server_timing = parse_server_timing(response.headers.get("Server-Timing"))
+        if ad_response.hints:
+            _update_hints(session_id, ad_response.hints)
+        # Only build on the service's transcript if it is the one we expect
+        _remember_sync(session_id, ad_response.transcript_hash if ad_response.transcript_hash == expected_hash else None, history)
+        return ad_response
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        print(f"SDK LOG: Error in get_response (trace {trace_id}): {e}")
+        _synced.pop(session_id, None)
+        return AdResponse(status="skip", response_text=None)
+
+async def _advertis_decision(
+    session_id: str,
+    app_vertical: str,
+    history: List[Dict],
+    trace_id: str,
+    timings: Dict[str, Dict[str, float]],
+) -> Optional[str]:
+    """
+    Runs the pre-flight check and, if it passes, the main call. Returns the
+    text to inject, or None if the host should use its fallback. The service's
+    timings are recorded in `timings`.
+    """
+    last_message = history[-1]["content"]
+    opportunity = await _check_opportunity(
+        session_id, last_message, trace_id, app_vertical, summarize_history(history),
+        history[-SPECULATION_MESSAGES:] if config.ADVERTIS_SPECULATE else None,
+    )
+    timings["check_opportunity"] = opportunity.server_timing
+    if not opportunity.proceed:
+        print(f"SDK LOG: Pre-flight check failed ({opportunity.reason}, trace {trace_id}). Using fallback.")
+        return None
+
+    ad_response = await _get_response(session_id, app_vertical, history, trace_id)
+    timings["get_response"] = ad_response.server_timing
+    if ad_response.status != "inject":
+        print(f"SDK LOG: Advertis skipped (trace {trace_id}). Using fallback.")
+        return None
+    if not ad_response.response_text:
+        print(f"SDK LOG: Advertis injected an empty response (trace {trace_id}). Using fallback.")
+        return None
+    print(f"SDK LOG: Injecting response from Advertis (trace {trace_id}).")
+    return ad_response.response_text
+
+# --- HIGH-LEVEL SDK WRAPPER FUNCTIONS (FOR CUSTOMERS) ---
+async def get_monetized_response_with_timings(
+    session_id: str,
+    app_vertical: str,
+    history: List[Dict],
+    fallback_func: Callable[[List[Dict]], Awaitable[str]]
+) -> MonetizedResponse:
+    """
+    Same as `get_monetized_response`, but also returns the turn's trace ID and
+    the service's per-step timings so the host can correlate and debug slow turns.
+    """
+    trace_id = uuid.uuid4().hex
+    timings: Dict[str, Dict[str, float]] = {}
+
+    injected = await _advertis_decision(session_id, app_vertical, history, trace_id, timings)
+    if injected is not None:
+        return MonetizedResponse(text=injected, source="advertis", trace_id=trace_id, timings=timings)
+
+    started = time.perf_counter()
+    text = await fallback_func(history)
+    timings["fallback"] = {"total": (time.perf_counter() - started) * 1000}
+    return MonetizedResponse(text=text, source="fallback", trace_id=trace_id, timings=timings)
 
-# --- HIGH-LEVEL SDK WRAPPER FUNCTION (FOR CUSTOMERS) ---
 async def get_monetized_response(
     session_id: str,
     app_vertical: str,
@@ -62,17 +424,25 @@ async def get_monetized_response(
     """
     The main SDK function. It orchestrates the hybrid model logic.
     """
-    last_message = history[-1]["content"]
-    opportunity = await _check_opportunity(session_id, last_message)
+    result = await get_monetized_response_with_timings(session_id, app_vertical, history, fallback_func)
+    return result.text
 
-    if opportunity.proceed:
-        ad_response = await _get_response(session_id, app_vertical, history)
-        if ad_response.status == "inject":
-            print("SDK LOG: Injecting response from Advertis.")
-            return ad_response.response_text
-        else:
-            print("SDK LOG: Advertis skipped. Using fallback.")
-            return await fallback_func(history)
-    else:
-        print(f"SDK LOG: Pre-flight check failed ({opportunity.reason}). Using fallback.")
-        return await fallback_func(history)
\ No newline at end of file
+async def stream_monetized_response(
+    session_id: str,
+    app_vertical: str,
+    history: List[Dict],
+    fallback_stream_func: Callable[[List[Dict]], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """
+    Streaming version of `get_monetized_response`. Yields the turn's text in
+    chunks: an injected Advertis response arrives complete and is yielded as a
+    single chunk, while the fallback is streamed token by token.
+    """
+    trace_id = uuid.uuid4().hex
+    injected = await _advertis_decision(session_id, app_vertical, history, trace_id, {})
+    if injected is not None:
+        yield injected
+        return
+
+    async for chunk in fallback_stream_func(history):
+        yield chunk
@@ -1,26 +1,51 @@
 # host_app/app/services/database.py
+import asyncio
 import uuid
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
 from sqlalchemy import (create_engine, Column, Integer, String, 
-                        DateTime, ForeignKey, Text, CheckConstraint)
+                        DateTime, ForeignKey, Text, CheckConstraint, Index, select)
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 
 # Conditional imports to handle both direct execution and package imports
 try:
     # Try relative import first (works when run as part of host_app package)
     from .. import config
+    from .history_cache import HistoryCache, trim_history
+    from .write_behind import WriteBehindWriter
 except ImportError:
     # Fall back to absolute import (works when run directly in Docker)
     import config
+    from services.history_cache import HistoryCache, trim_history
+    from services.write_behind import WriteBehindWriter
 
 # --- Database Setup ---
-engine = create_engine(config.DATABASE_URL)
+def pool_options(url: str) -> Dict:
+    """Connection pool settings from config. SQLite manages its own pooling."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+engine = create_engine(config.DATABASE_URL, **pool_options(config.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Recent history of active sessions, kept coherent by the write helpers below.
+history_cache = HistoryCache(
+    max_sessions=config.HISTORY_CACHE_MAX_SESSIONS,
+    max_messages=config.HISTORY_MAX_MESSAGES,
+)
+
 
 # --- ORM Models (Defines our tables) ---
 class User(Base):
@@ -51,12 +76,21 @@ class ChatMessage(Base):
     
     session = relationship("ChatSession", back_populates="messages")
 
+    # Serves the per-turn "latest messages of this session" lookup.
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_created_at", "session_id", "created_at"),
+    )
+
 
 # --- Database Initialization ---
 def init_db():
     """Creates all database tables if they don't exist."""
     print("DATABASE: Initializing database and creating tables...")
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add any index that was
+    # introduced after the table was first created.
+    for index in ChatMessage.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
     print("DATABASE: Tables created successfully.")
 
 
@@ -91,8 +125,7 @@ def create_chat_session(db_session, user_id: int, system_prompt: str, app_vertic
         app_vertical=app_vertical
     )
     db_session.add(new_session)
-    db_session.commit()
-    db_session.refresh(new_session) # This populates the new_session.id from the DB
+    db_session.flush() # Assigns new_session.id without ending the transaction
 
     # Step 2: Now that the session has an ID, create the system message
     system_message = ChatMessage(
@@ -101,18 +134,280 @@ def create_chat_session(db_session, user_id: int, system_prompt: str, app_vertic
         content=system_prompt
     )
     db_session.add(system_message)
-    db_session.commit() # Commit the new message
+    db_session.commit() # One commit for the session and its system message
 
+    history_cache.put(new_session.id, [{"role": "system", "content": system_prompt}])
     return new_session
 
 def get_chat_history(db_session, session_id: uuid.UUID) -> List[Dict]:
     """Retrieves the conversation history for a given session."""
-    messages = db_session.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at).all()
-    return [{"role": msg.role, "content": msg.content} for msg in messages]
+    rows = (
+        db_session.query(ChatMessage.role, ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .all()
+    )
+    return [{"role": role, "content": content} for role, content in rows]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+def get_recent_chat_history(db_session, session_id: uuid.UUID,
+                            max_messages: Optional[int] = None,
+                            max_tokens: Optional[int] = None) -> List[Dict]:
+    """
+    Retrieves the system message plus only the most recent turns of a session,
+    limited to `max_messages` and/or a `max_tokens` budget (the newest message
+    is always kept). Rows are read newest-first through the
+    (session_id, created_at) index as plain tuples, so the cost of a turn does
+    not grow with the length of the session.
+    """
+    system_row = (
+        db_session.query(ChatMessage.role, ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id, ChatMessage.role == "system")
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .first()
+    )
+
+    tail_query = (
+        db_session.query(ChatMessage.role, ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id, ChatMessage.role != "system")
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+    )
+    if max_messages is not None:
+        tail_query = tail_query.limit(max_messages)
+
+    tail = []
+    budget = max_tokens
+    for role, content in tail_query.yield_per(100):
+        if budget is not None:
+            budget -= estimate_tokens(content)
+            if budget < 0 and tail:
+                break
+        tail.append({"role": role, "content": content})
+    tail.reverse()
+
+    if system_row:
+        return [{"role": system_row.role, "content": system_row.content}] + tail
+    return tail
+
+def get_messages_page(db_session, session_id: uuid.UUID, skip_newest: int, limit: int) -> List[Dict]:
+    """
+    Returns up to `limit` non-system messages that come before the newest
+    `skip_newest` ones, in chronological order. Used to page backwards through
+    a long transcript.
+    """
+    if turn_writer is not None:
+        turn_writer.flush()
+    rows = (
+        db_session.query(ChatMessage.role, ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id, ChatMessage.role != "system")
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .offset(skip_newest)
+        .limit(limit)
+        .all()
+    )
+    return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+def get_cached_chat_history(db_session, session_id: uuid.UUID,
+                            max_messages: Optional[int] = None,
+                            max_tokens: Optional[int] = None) -> List[Dict]:
+    """
+    Same result as `get_recent_chat_history`, served from the history cache.
+    The database is only read the first time a session is seen by this process
+    (or after it was evicted).
+    """
+    messages = history_cache.get(session_id)
+    if messages is None:
+        if turn_writer is not None:
+            turn_writer.flush() # Don't miss messages still queued for this session
+        messages = get_recent_chat_history(db_session, session_id, max_messages=history_cache.max_messages)
+        history_cache.put(session_id, messages)
+    return trim_history(messages, max_messages=max_messages, max_tokens=max_tokens)
+
+def save_turn(db_session, session_id: uuid.UUID, messages: List[Tuple[str, str]]):
+    """
+    Saves a turn's messages, given as (role, content) pairs in order, in a
+    single transaction. With write-behind enabled, the insert is queued (as one
+    item, so the turn still commits in one transaction) and this returns
+    immediately.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"session_id": session_id, "role": role, "content": content, "created_at": now}
+        for role, content in messages
+    ]
+    if turn_writer is not None:
+        turn_writer.submit(rows)
+    else:
+        db_session.execute(ChatMessage.__table__.insert(), rows)
+        db_session.commit()
+    for role, content in messages:
+        history_cache.append(session_id, role, content)
+
+def _insert_turns(turns: List[List[Dict]]):
+    """Writes a write-behind batch of turns (possibly spanning sessions) in one transaction."""
+    with SessionLocal() as db_session:
+        db_session.execute(ChatMessage.__table__.insert(), [row for rows in turns for row in rows])
+        db_session.commit()
+
+def _forget_dropped_turn(rows: List[Dict]):
+    """The cache already holds a turn the writer gave up on; reload the session from the database instead."""
+    history_cache.invalidate(rows[0]["session_id"])
+
+# Background writer for save_turn, only started when write-behind is enabled.
+turn_writer: Optional[WriteBehindWriter] = (
+    WriteBehindWriter(
+        _insert_turns,
+        max_batch=config.WRITE_BEHIND_MAX_BATCH,
+        max_delay_seconds=config.WRITE_BEHIND_MAX_DELAY_MS / 1000,
+        on_drop=_forget_dropped_turn,
+    )
+    if config.PERSIST_WRITE_BEHIND else None
+)
 
 def save_message(db_session, session_id: uuid.UUID, role: str, content: str):
     """Saves a new message to the conversation history."""
     new_message = ChatMessage(session_id=session_id, role=role, content=content)
     db_session.add(new_message)
     db_session.commit()
+    history_cache.append(session_id, role, content)
+
+
+
+@contextmanager
+def session_scope():
+    """
+    A session for one unit of work (e.g. one Streamlit script run). Each user
+    interaction gets its own session instead of sharing one across users.
+    """
+    db_session = SessionLocal()
+    try:
+        yield db_session
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        db_session.close()
+
+
+# --- Async Engine (asyncpg) ---
+# The async path lets concurrent users share a pool of connections from one
+# event loop. It is created on first use, so sync-only deployments never
+# need the async driver.
+_async_engine = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+def to_async_url(url: str) -> str:
+    """Maps a sync database URL to its async driver, e.g. postgresql:// -> postgresql+asyncpg://."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Returns the async session factory, creating the async engine on first use."""
+    global _async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        url = config.ASYNC_DATABASE_URL or to_async_url(config.DATABASE_URL)
+        _async_engine = create_async_engine(url, **pool_options(url))
+        AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return AsyncSessionLocal
+
+@asynccontextmanager
+async def async_session_scope():
+    """An async session for one request; rolled back on error and always closed."""
+    async with get_async_sessionmaker()() as db_session:
+        try:
+            yield db_session
+        except Exception:
+            await db_session.rollback()
+            raise
+
+async def create_chat_session_async(db_session: AsyncSession, user_id: int, system_prompt: str, app_vertical: str) -> ChatSession:
+    """Async version of `create_chat_session`."""
+    new_session = ChatSession(user_id=user_id, system_prompt=system_prompt, app_vertical=app_vertical)
+    db_session.add(new_session)
+    await db_session.flush()
+    db_session.add(ChatMessage(session_id=new_session.id, role="system", content=system_prompt))
+    await db_session.commit()
+
+    history_cache.put(new_session.id, [{"role": "system", "content": system_prompt}])
+    return new_session
+
+async def get_chat_history_async(db_session: AsyncSession, session_id: uuid.UUID) -> List[Dict]:
+    """Async version of `get_chat_history`."""
+    result = await db_session.execute(
+        select(ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+    )
+    return [{"role": role, "content": content} for role, content in result]
+
+async def get_recent_chat_history_async(db_session: AsyncSession, session_id: uuid.UUID,
+                                        max_messages: Optional[int] = None,
+                                        max_tokens: Optional[int] = None) -> List[Dict]:
+    """Async version of `get_recent_chat_history`."""
+    system_row = (await db_session.execute(
+        select(ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id, ChatMessage.role == "system")
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .limit(1)
+    )).first()
+
+    tail_statement = (
+        select(ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id, ChatMessage.role != "system")
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+    )
+    if max_messages is not None:
+        tail_statement = tail_statement.limit(max_messages)
+
+    tail = []
+    budget = max_tokens
+    for role, content in await db_session.execute(tail_statement):
+        if budget is not None:
+            budget -= estimate_tokens(content)
+            if budget < 0 and tail:
+                break
+        tail.append({"role": role, "content": content})
+    tail.reverse()
+
+    if system_row:
+        return [{"role": system_row.role, "content": system_row.content}] + tail
+    return tail
+
+async def get_cached_chat_history_async(db_session: AsyncSession, session_id: uuid.UUID,
+                                        max_messages: Optional[int] = None,
+                                        max_tokens: Optional[int] = None) -> List[Dict]:
+    """Async version of `get_cached_chat_history`."""
+    messages = history_cache.get(session_id)
+    if messages is None:
+        if turn_writer is not None:
+            await asyncio.to_thread(turn_writer.flush) # Waits without blocking the loop
+        messages = await get_recent_chat_history_async(db_session, session_id, max_messages=history_cache.max_messages)
+        history_cache.put(session_id, messages)
+    return trim_history(messages, max_messages=max_messages, max_tokens=max_tokens)
+
+async def save_turn_async(db_session: AsyncSession, session_id: uuid.UUID, messages: List[Tuple[str, str]]):
+    """Async version of `save_turn`; with write-behind enabled, the insert is queued the same way."""
+    now = datetime.utcnow()
+    rows = [
+        {"session_id": session_id, "role": role, "content": content, "created_at": now}
+        for role, content in messages
+    ]
+    if turn_writer is not None:
+        turn_writer.submit(rows)
+    else:
+        await db_session.execute(ChatMessage.__table__.insert(), rows)
+        await db_session.commit()
+    for role, content in messages:
+        history_cache.append(session_id, role, content)
 
+async def save_message_async(db_session: AsyncSession, session_id: uuid.UUID, role: str, content: str):
+    """Async version of `save_message`."""
+    await save_turn_async(db_session, session_id, [(role, content)])
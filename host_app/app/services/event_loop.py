@@ -0,0 +1,88 @@
+# host_app/app/services/event_loop.py
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+
+class BackgroundLoop:
+    """
+    A long-lived asyncio event loop running in a daemon thread, with a sync
+    facade for code (like a Streamlit script) that cannot await.
+
+    Because the loop outlives each script run, anything bound to it (the
+    SDK's HTTP connection pool, the fallback LLM client, async DB pools,
+    streams) is reused across turns instead of being torn down by a
+    per-turn `asyncio.run`.
+    """
+    def __init__(self, name: str = "host-app-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedules a coroutine on the loop and returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Runs a coroutine on the loop and blocks the calling thread for its result."""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    """Returns the process-wide background loop, starting it on first use."""
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+            atexit.register(_background_loop.stop)
+        return _background_loop
+
+def run(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Sync facade: runs `coro` on the background loop and returns its result."""
+    return get_background_loop().run(coro, timeout)
+
+def iterate(async_iterator: AsyncIterator, timeout: Optional[float] = None) -> Iterator:
+    """
+    Sync facade over an async iterator: each item is produced on the background
+    loop and yielded to the calling thread as soon as it is ready (e.g. for
+    `st.write_stream`).
+
+    If the consumer stops early (the generator is closed, it raises, or an item
+    times out), the async iterator is closed on the loop, so e.g. an open
+    streaming response is released right away rather than at garbage collection.
+    """
+    loop = get_background_loop()
+    exhausted = False
+    try:
+        while True:
+            future = loop.submit(async_iterator.__anext__())
+            try:
+                item = future.result(timeout)
+            except StopAsyncIteration:
+                exhausted = True
+                return
+            except BaseException:
+                future.cancel()  # e.g. a timeout; stop waiting for the item
+                raise
+            yield item
+    finally:
+        aclose = getattr(async_iterator, "aclose", None)
+        if not exhausted and aclose is not None:
+            try:
+                loop.run(aclose(), timeout)
+            except Exception as e:
+                print(f"EVENT LOOP: Could not close an abandoned stream: {e}")
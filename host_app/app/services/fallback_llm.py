@@ -1,5 +1,5 @@
 # host_app/app/services/fallback_llm.py
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 from langchain_openai import ChatOpenAI
 # Conditional imports to handle both direct execution and package imports
 try:
@@ -9,6 +9,23 @@ except ImportError:
     # Fall back to absolute import (works when run directly in Docker)
     import config
 
+_llm = None
+
+def get_llm() -> ChatOpenAI:
+    """
+    Returns the shared fallback model client, creating it on first use. It is
+    reused across turns so its HTTP connection pool stays warm; the host app
+    runs every turn on one long-lived event loop, which makes this safe.
+    """
+    global _llm
+    if _llm is None:
+        _llm = ChatOpenAI(
+            model="gpt-4.1", 
+            temperature=0.7, 
+            api_key=config.OPENAI_API_KEY
+        )
+    return _llm
+
 async def get_fallback_response(history: List[Dict]) -> str:
     """
     Generates a standard, non-monetized response using the app's own LLM.
@@ -17,12 +34,7 @@ async def get_fallback_response(history: List[Dict]) -> str:
     print("---FALLBACK: Generating response using host app's LLM...---")
     
     try:
-        # Initialize the language model
-        llm = ChatOpenAI(
-            model="gpt-4.1", 
-            temperature=0.7, 
-            api_key=config.OPENAI_API_KEY
-        )
+        llm = get_llm()
         
         # The history already contains the system prompt as the first message.
         # We just need to invoke the model with it.
@@ -33,4 +45,25 @@ async def get_fallback_response(history: List[Dict]) -> str:
     except Exception as e:
         print(f"An error occurred in get_fallback_response: {e}")
         # Return a generic error message if the LLM fails
-        return "I'm sorry, I've encountered an error and can't respond right now."
\ No newline at end of file
+        return "I'm sorry, I've encountered an error and can't respond right now."
+
+async def stream_fallback_response(history: List[Dict]) -> AsyncIterator[str]:
+    """
+    Streaming version of `get_fallback_response`: yields the reply's text
+    chunks as the model produces them, so the UI can show the first tokens
+    without waiting for the full completion.
+    """
+    print("---FALLBACK: Streaming response using host app's LLM...---")
+
+    streamed_any = False
+    try:
+        async for chunk in get_llm().astream(history):
+            if chunk.content:
+                streamed_any = True
+                yield chunk.content
+
+    except Exception as e:
+        print(f"An error occurred in stream_fallback_response: {e}")
+        # Only replace the reply if nothing has been shown yet
+        if not streamed_any:
+            yield "I'm sorry, I've encountered an error and can't respond right now."
@@ -0,0 +1,106 @@
+# host_app/app/services/history_cache.py
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def trim_history(messages: List[Dict], max_messages: Optional[int] = None,
+                 max_tokens: Optional[int] = None) -> List[Dict]:
+    """
+    Applies the same limits as `database.get_recent_chat_history` to a history
+    held in memory: the leading system message is kept, followed by at most
+    `max_messages` recent messages that fit in `max_tokens` (the newest message
+    is always kept).
+    """
+    head = messages[:1] if messages and messages[0]["role"] == "system" else []
+    body = messages[len(head):]
+    if max_messages is not None:
+        body = body[-max_messages:] if max_messages > 0 else []
+    if max_tokens is not None:
+        budget = max_tokens
+        kept = 0
+        for message in reversed(body):
+            budget -= len(message["content"]) // 4 + 1
+            if budget < 0 and kept:
+                break
+            kept += 1
+        body = body[len(body) - kept:]
+    return head + body
+
+
+class HistoryCache:
+    """
+    A bounded, in-process cache of recent chat history, keyed by session.
+
+    Each entry holds the session's system message plus up to `max_messages`
+    recent messages. Sessions are evicted least-recently-used once more than
+    `max_sessions` are cached. Entries are only correct if every write to a
+    cached session goes through `append` (the database helpers do this), so
+    the cache is per process and assumes one host app process owns a session.
+    """
+    def __init__(self, max_sessions: int = 256, max_messages: int = 40):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._entries: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id) -> Optional[List[Dict]]:
+        """Returns a copy of the cached history, or None on a miss."""
+        key = str(session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry)
+
+    def put(self, session_id, messages: List[Dict]):
+        """Caches a session's history, e.g. after a cold load from the database."""
+        key = str(session_id)
+        with self._lock:
+            self._entries[key] = self._bounded(list(messages))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def append(self, session_id, role: str, content: str):
+        """Write-through for a message just saved. Uncached sessions are left cold."""
+        key = str(session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.append({"role": role, "content": content})
+            # Trim in chunks rather than on every append, so the list is
+            # only rebuilt once every `max_messages` writes.
+            if len(entry) > 2 * self.max_messages + 1:
+                self._entries[key] = self._bounded(entry)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._entries.pop(str(session_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _bounded(self, messages: List[Dict]) -> List[Dict]:
+        return trim_history(messages, max_messages=self.max_messages)
@@ -0,0 +1,90 @@
+# host_app/app/services/write_behind.py
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+
+class WriteBehindWriter:
+    """
+    Buffers items on a queue and hands them to `write_batch` from a single
+    background thread, so callers never wait on a database round trip.
+
+    A batch is written once `max_batch` items are waiting or `max_delay_seconds`
+    after its first item arrived, whichever comes first. Items from many
+    sessions share a batch (and so a transaction); an item is never split
+    across batches. If a batch fails, its items are retried one at a time, so
+    only the items that keep failing are dropped (and passed to `on_drop`).
+    Pending items are flushed when the process exits.
+    """
+    def __init__(self, write_batch: Callable[[List[Any]], None],
+                 max_batch: int = 200, max_delay_seconds: float = 0.05, max_retries: int = 3,
+                 on_drop: Optional[Callable[[Any], None]] = None):
+        self.write_batch = write_batch
+        self.on_drop = on_drop
+        self.max_batch = max_batch
+        self.max_delay_seconds = max_delay_seconds
+        self.max_retries = max_retries
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, item: Any):
+        """Queues one item (e.g. all the rows of a turn) for writing."""
+        if self._stopped.is_set():
+            raise RuntimeError("WriteBehindWriter is closed")
+        self._queue.put(item)
+
+    def flush(self):
+        """Blocks until everything submitted so far has been written (or dropped)."""
+        self._queue.join()
+
+    def close(self):
+        """Writes what is pending and stops the background thread."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch: List[Any]):
+        try:
+            self.write_batch(batch)
+            return
+        except Exception as e:
+            print(f"WRITE-BEHIND: Failed to write batch of {len(batch)}: {e}. Retrying item by item.")
+        # One bad item must not take the rest of the batch down with it
+        for item in batch:
+            self._write_item(item)
+
+    def _write_item(self, item: Any):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.write_batch([item])
+                return
+            except Exception as e:
+                print(f"WRITE-BEHIND: Failed to write item (attempt {attempt}/{self.max_retries}): {e}")
+                time.sleep(0.1 * attempt)
+        print(f"WRITE-BEHIND: Dropping item after {self.max_retries} attempts.")
+        if self.on_drop is not None:
+            self.on_drop(item)
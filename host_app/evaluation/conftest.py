@@ -11,7 +11,10 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.types import TypeDecorator, CHAR
 from sqlalchemy.dialects.postgresql import UUID
 
-from host_app.app.services.database import Base
+from host_app.app import config
+from host_app.app.services import database
+from host_app.app.services.database import Base, User
+from host_app.app.services.history_cache import HistoryCache
 
 
 class GUID(TypeDecorator):
@@ -83,3 +86,24 @@ def db_session():
     finally:
         db.close()
         Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+async def async_db(tmp_path, monkeypatch):
+    """
+    Points the lazily created async engine at a fresh SQLite file (through
+    `aiosqlite`, standing in for Postgres/asyncpg) with the dummy user.
+    """
+    monkeypatch.setattr(config, "ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'host.db'}")
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    monkeypatch.setattr(database, "history_cache", HistoryCache(max_sessions=100, max_messages=40))
+
+    database.get_async_sessionmaker()
+    async with database._async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with database.async_session_scope() as db_session:
+        db_session.add(User(id=1, username="dummy_user"))
+        await db_session.commit()
+    yield
+    await database._async_engine.dispose()
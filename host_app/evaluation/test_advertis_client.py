@@ -0,0 +1,455 @@
+"""
+test_advertis_client.py
+
+Unit tests for the Advertis SDK in `host_app/app/services/advertis_client.py`.
+The service is simulated with `httpx.MockTransport`, so these tests run without
+the `advertis_service` container and make no real network calls.
+"""
+import json
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock
+
+from host_app.app.services import advertis_client
+
+HISTORY = [
+    {"role": "system", "content": "You are a GM."},
+    {"role": "user", "content": "I walk into the bar."},
+]
+
+
+def _patch_transport(mocker, handler):
+    """Routes every AsyncClient the SDK creates through the given handler."""
+    real_client = httpx.AsyncClient
+    mocker.patch.object(
+        advertis_client.httpx, "AsyncClient",
+        side_effect=lambda *args, **kwargs: real_client(transport=httpx.MockTransport(handler)),
+    )
+
+
+def test_parse_server_timing():
+    """
+    GIVEN: A Server-Timing header with several entries and one malformed value.
+    WHEN: It is parsed.
+    THEN: Valid durations are returned by name and the malformed one is ignored.
+    """
+    timings = advertis_client.parse_server_timing("gate;dur=12.5, retrieval;dur=3, bad;dur=x, total;dur=40.0")
+    assert timings == {"gate": 12.5, "retrieval": 3.0, "total": 40.0}
+    assert advertis_client.parse_server_timing(None) == {}
+
+
+@pytest.mark.asyncio
+async def test_sdk_sends_one_trace_id_and_exposes_timings(mocker):
+    """
+    GIVEN: A service that passes the pre-flight check and injects a response.
+    WHEN: `get_monetized_response_with_timings` is called.
+    THEN: Both calls carry the same trace ID, and the Server-Timing breakdowns
+          are returned alongside the injected text.
+    """
+    seen_trace_ids = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_trace_ids.append(request.headers.get("X-Trace-Id"))
+        if request.url.path.endswith("/check-opportunity"):
+            return httpx.Response(200, json={"proceed": True, "reason": "ok"}, headers={"Server-Timing": "total;dur=2.0"})
+        return httpx.Response(
+            200, json={"status": "inject", "response_text": "A bottle of Jack Daniel's sits on the bar."},
+            headers={"Server-Timing": "gate;dur=300.0, retrieval;dur=20.0, orchestrator;dur=800.0, host_llm;dur=1500.0, total;dur=2650.0"},
+        )
+
+    _patch_transport(mocker, handler)
+    fallback = AsyncMock(return_value="fallback")
+
+    result = await advertis_client.get_monetized_response_with_timings("s1", "gaming", HISTORY, fallback)
+
+    assert result.source == "advertis"
+    assert "Jack Daniel's" in result.text
+    assert seen_trace_ids == [result.trace_id, result.trace_id]
+    assert result.timings["check_opportunity"] == {"total": 2.0}
+    assert result.timings["get_response"]["host_llm"] == 1500.0
+    fallback.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_sdk_falls_back_and_times_fallback_on_rejection(mocker):
+    """
+    GIVEN: A service whose pre-flight check rejects the turn.
+    WHEN: `get_monetized_response` is called.
+    THEN: Only the check call is made and the fallback text is returned.
+    """
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        return httpx.Response(200, json={"proceed": False, "reason": "Safety Gate: REJECTED"})
+
+    _patch_transport(mocker, handler)
+    fallback = AsyncMock(return_value="fallback text")
+
+    text = await advertis_client.get_monetized_response("s1", "gaming", HISTORY, fallback)
+
+    assert text == "fallback text"
+    assert paths == ["/v1/check-opportunity"]
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_injected_response_as_one_chunk(mocker):
+    """
+    GIVEN: A service that injects a response.
+    WHEN: `stream_monetized_response` is consumed.
+    THEN: The injected text arrives as a single chunk and the fallback stream is not used.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/check-opportunity"):
+            return httpx.Response(200, json={"proceed": True, "reason": "ok"})
+        return httpx.Response(200, json={"status": "inject", "response_text": "A bottle of Jack Daniel's sits on the bar."})
+
+    _patch_transport(mocker, handler)
+    fallback_calls = []
+
+    async def fallback_stream(history):
+        fallback_calls.append(history)
+        yield "unused"
+
+    chunks = await _collect(advertis_client.stream_monetized_response("s1", "gaming", HISTORY, fallback_stream))
+
+    assert chunks == ["A bottle of Jack Daniel's sits on the bar."]
+    assert fallback_calls == []
+
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_to_token_stream_on_rejection(mocker):
+    """
+    GIVEN: A service whose pre-flight check rejects the turn.
+    WHEN: `stream_monetized_response` is consumed.
+    THEN: The fallback's chunks are passed through as they are produced.
+    """
+    _patch_transport(mocker, lambda request: httpx.Response(200, json={"proceed": False, "reason": "Frequency Gate"}))
+
+    async def fallback_stream(history):
+        for token in ["The ", "rain ", "falls."]:
+            yield token
+
+    chunks = await _collect(advertis_client.stream_monetized_response("s1", "gaming", HISTORY, fallback_stream))
+
+    assert chunks == ["The ", "rain ", "falls."]
+
+
+@pytest.mark.asyncio
+async def test_inject_without_text_falls_back_in_both_paths(mocker):
+    """
+    GIVEN: A service that answers "inject" but with no response text.
+    WHEN: Both the streaming and the non-streaming SDK calls are made.
+    THEN: Neither returns or yields None; both use the fallback.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/check-opportunity"):
+            return httpx.Response(200, json={"proceed": True, "reason": "ok"})
+        return httpx.Response(200, json={"status": "inject", "response_text": None})
+
+    _patch_transport(mocker, handler)
+
+    async def fallback_stream(history):
+        yield "The rain falls."
+
+    chunks = await _collect(advertis_client.stream_monetized_response("s1", "gaming", HISTORY, fallback_stream))
+    result = await advertis_client.get_monetized_response_with_timings(
+        "s2", "gaming", HISTORY, AsyncMock(return_value="The rain falls.")
+    )
+
+    assert chunks == ["The rain falls."]
+    assert (result.text, result.source) == ("The rain falls.", "fallback")
+
+
+@pytest.mark.asyncio
+async def test_get_response_sends_only_new_messages_once_synced(mocker):
+    """
+    GIVEN: A service that keeps transcripts and returns their hash.
+    WHEN: Two turns of the same session are sent, the second with two more messages.
+    THEN: The first call sends the full history and the second only the two
+          new messages, built on the hash the service returned.
+    """
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        payloads.append(payload)
+        if "conversation_history" in payload:
+            transcript_hash = advertis_client.extend_hash("", payload["conversation_history"])
+        else:
+            transcript_hash = advertis_client.extend_hash(payload["base_hash"], payload["new_messages"])
+        return httpx.Response(200, json={"status": "skip", "transcript_hash": transcript_hash})
+
+    _patch_transport(mocker, handler)
+    turn_two = HISTORY + [{"role": "assistant", "content": "The bartender nods."}, {"role": "user", "content": "I order a drink."}]
+
+    await advertis_client._get_response("sync-1", "gaming", HISTORY)
+    await advertis_client._get_response("sync-1", "gaming", turn_two)
+
+    assert payloads[0]["conversation_history"] == HISTORY
+    assert "conversation_history" not in payloads[1]
+    assert payloads[1]["new_messages"] == turn_two[2:]
+    assert payloads[1]["base_hash"] == advertis_client.extend_hash("", HISTORY)
+
+
+@pytest.mark.asyncio
+async def test_get_response_resends_full_history_on_conflict(mocker):
+    """
+    GIVEN: A synced session whose transcript the service has since lost.
+    WHEN: The next turn is sent as a delta and the service answers 409.
+    THEN: The SDK resends the full history in a second request.
+    """
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        payloads.append(payload)
+        if "new_messages" in payload:
+            return httpx.Response(409, json={"detail": "Transcript mismatch"})
+        return httpx.Response(200, json={
+            "status": "skip", "transcript_hash": advertis_client.extend_hash("", payload["conversation_history"]),
+        })
+
+    _patch_transport(mocker, handler)
+    turn_two = HISTORY + [{"role": "assistant", "content": "Hm."}, {"role": "user", "content": "Another."}]
+
+    await advertis_client._get_response("sync-2", "gaming", HISTORY)
+    result = await advertis_client._get_response("sync-2", "gaming", turn_two)
+
+    assert result.status == "skip"
+    assert [("new_messages" in p) for p in payloads] == [False, True, False]
+    assert payloads[-1]["conversation_history"] == turn_two
+
+
+@pytest.mark.asyncio
+async def test_check_is_skipped_locally_until_hinted_turns_pass(mocker):
+    """
+    GIVEN: A pre-flight check that is rejected with a hint of two more turns.
+    WHEN: The SDK is asked to check the next three turns.
+    THEN: The next two are rejected without a network call, and the third call
+          reports the two skipped turns to the service.
+    """
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        hints = {"turns_until_eligible": 2} if len(payloads) == 1 else {}
+        return httpx.Response(200, json={"proceed": len(payloads) > 1, "reason": "Frequency Gate", "hints": hints})
+
+    _patch_transport(mocker, handler)
+
+    first = await advertis_client._check_opportunity("hints-1", "hello")
+    skipped = [await advertis_client._check_opportunity("hints-1", "hello") for _ in range(2)]
+    third = await advertis_client._check_opportunity("hints-1", "hello")
+
+    assert first.proceed is False
+    assert all(not c.proceed and "Skipped locally" in c.reason for c in skipped)
+    assert third.proceed is True
+    assert len(payloads) == 2
+    assert payloads[1]["skipped_turns"] == 2
+
+
+@pytest.mark.asyncio
+async def test_exhausted_or_cooling_down_sessions_never_call_the_service(mocker):
+    """
+    GIVEN: One session hinted as exhausted and another in a 60-second cooldown.
+    WHEN: Each is checked again.
+    THEN: Both are rejected locally without any network call.
+    """
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        session_id = json.loads(request.content)["session_id"]
+        hints = {"session_exhausted": True} if session_id == "hints-exhausted" else {"seconds_until_eligible": 60}
+        return httpx.Response(200, json={"proceed": False, "reason": "Frequency Gate", "hints": hints})
+
+    _patch_transport(mocker, handler)
+
+    for session_id in ("hints-exhausted", "hints-cooldown"):
+        await advertis_client._check_opportunity(session_id, "hello")
+        again = await advertis_client._check_opportunity(session_id, "hello")
+        assert again.proceed is False and "Skipped locally" in again.reason
+
+    assert len(calls) == 2
+
+
+RULES = {"format": 1, "patterns": ["help", "stuck"], "flags": ["IGNORECASE"], "version": "v1"}
+
+
+@pytest.fixture
+def no_local_rules(monkeypatch):
+    """Starts each test without a synced ruleset."""
+    monkeypatch.setattr(advertis_client, "_safety_rules", {})
+    monkeypatch.setattr(advertis_client, "_rules_sync_tasks", {})
+
+
+@pytest.mark.asyncio
+async def test_unsafe_turns_are_rejected_locally_once_rules_are_synced(mocker, no_local_rules):
+    """
+    GIVEN: A service that publishes a ruleset flagging "stuck".
+    WHEN: The rules are synced and an unsafe turn is checked, then a safe one.
+    THEN: The unsafe turn is rejected without a check call, and the safe turn's
+          check reports it as a skipped turn.
+    """
+    paths, payloads = [], []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path.endswith("/rules/safety"):
+            return httpx.Response(200, json=RULES, headers={"ETag": '"v1"'})
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json={"proceed": True, "reason": "ok", "rules_version": "v1"})
+
+    _patch_transport(mocker, handler)
+
+    assert await advertis_client.sync_safety_rules() == "v1"
+    unsafe = await advertis_client._check_opportunity("rules-1", "I'm STUCK in this cave")
+    safe = await advertis_client._check_opportunity("rules-1", "I open the chest")
+
+    assert unsafe.proceed is False and unsafe.reason == advertis_client.SAFETY_REJECT_REASON
+    assert safe.proceed is True
+    assert paths == ["/v1/rules/safety", "/v1/check-opportunity"]
+    assert payloads[0]["skipped_turns"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rules_are_revalidated_with_etag(mocker, no_local_rules):
+    """
+    GIVEN: Synced rules and a service whose ruleset has not changed.
+    WHEN: The rules are synced again.
+    THEN: The request carries the ETag and the 304 keeps the existing rules.
+    """
+    seen_etags = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_etags.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=RULES, headers={"ETag": '"v1"'})
+
+    _patch_transport(mocker, handler)
+
+    await advertis_client.sync_safety_rules()
+    assert await advertis_client.sync_safety_rules() == "v1"
+    assert seen_etags == [None, '"v1"']
+
+
+@pytest.mark.asyncio
+async def test_new_rules_version_triggers_a_sync(mocker, no_local_rules):
+    """
+    GIVEN: An SDK without local rules and a service reporting rules version v1.
+    WHEN: A turn is checked.
+    THEN: A background sync fetches the ruleset, after which unsafe turns stay local.
+    """
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/rules/safety"):
+            return httpx.Response(200, json=RULES, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json={"proceed": True, "reason": "ok", "rules_version": "v1"})
+
+    _patch_transport(mocker, handler)
+
+    await advertis_client._check_opportunity("rules-2", "hello", app_vertical="gaming")
+    await advertis_client._rules_sync_tasks["gaming"]
+
+    assert advertis_client._safety_rules["gaming"].version == "v1"
+    assert advertis_client._locally_unsafe("help me", "gaming")
+    assert not advertis_client._locally_unsafe("help me", "travel")
+
+
+@pytest.mark.asyncio
+async def test_unsupported_rules_format_leaves_gate_to_the_service(mocker, no_local_rules):
+    """
+    GIVEN: A service publishing a ruleset in a newer format.
+    WHEN: The rules are synced.
+    THEN: No local rules are installed, so every turn still reaches the service.
+    """
+    _patch_transport(mocker, lambda request: httpx.Response(200, json={**RULES, "format": 2}))
+
+    assert await advertis_client.sync_safety_rules() is None
+    assert not advertis_client._locally_unsafe("help me")
+
+
+@pytest.mark.asyncio
+async def test_rules_are_requested_for_the_vertical_and_locale(mocker, no_local_rules, monkeypatch):
+    """
+    GIVEN: An SDK configured for Spanish conversations.
+    WHEN: The gaming vertical's rules are synced and a turn is checked.
+    THEN: Both requests name the vertical and the locale.
+    """
+    monkeypatch.setattr(advertis_client.config, "ADVERTIS_LOCALE", "es")
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("/rules/safety"):
+            return httpx.Response(200, json=RULES)
+        return httpx.Response(200, json={"proceed": True, "reason": "ok"})
+
+    _patch_transport(mocker, handler)
+
+    await advertis_client.sync_safety_rules("gaming")
+    await advertis_client._check_opportunity("rules-3", "hola", app_vertical="gaming")
+
+    assert dict(requests[0].url.params) == {"vertical": "gaming", "locale": "es"}
+    payload = json.loads(requests[1].content)
+    assert (payload["app_vertical"], payload["locale"]) == ("gaming", "es")
+
+
+def test_summarize_history_counts_turns_only():
+    """
+    GIVEN: A history with a system prompt and six turns.
+    WHEN: It is summarized for the pre-flight check.
+    THEN: The summary is just the count of the six turns; no message text is sent.
+    """
+    turns = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(6)]
+
+    assert advertis_client.summarize_history([HISTORY[0], *turns]) == {"turn_count": 6}
+
+
+@pytest.mark.asyncio
+async def test_check_sends_history_summary(mocker):
+    """
+    GIVEN: A service whose pre-flight check rejects the turn.
+    WHEN: `get_monetized_response` is called.
+    THEN: The check call carries a summary of the history, and (without
+          speculation) no message text beyond the last message.
+    """
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json={"proceed": False, "reason": "History Gate: REJECTED (Initial user interaction)"})
+
+    _patch_transport(mocker, handler)
+
+    await advertis_client.get_monetized_response("summary-1", "gaming", HISTORY, AsyncMock(return_value="fallback"))
+
+    assert payloads[0]["history_summary"] == {"turn_count": 1}
+    assert "recent_history" not in payloads[0]
+
+
+@pytest.mark.asyncio
+async def test_speculating_sdk_sends_recent_history(mocker, monkeypatch):
+    """
+    GIVEN: An SDK with speculation turned on.
+    WHEN: `get_monetized_response` is called.
+    THEN: The check call carries the last messages verbatim for the service to work ahead on.
+    """
+    monkeypatch.setattr(advertis_client.config, "ADVERTIS_SPECULATE", True)
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json={"proceed": False, "reason": "Frequency Gate"})
+
+    _patch_transport(mocker, handler)
+
+    await advertis_client.get_monetized_response("speculate-1", "gaming", HISTORY, AsyncMock(return_value="fallback"))
+
+    assert payloads[0]["recent_history"] == HISTORY
@@ -0,0 +1,73 @@
+"""
+test_async_database.py
+
+Tests for the async database path in `host_app/app/services/database.py`.
+They run against a temporary SQLite file through `aiosqlite`, standing in for
+Postgres/asyncpg, and include a small concurrency load test in which many
+simulated users write and read their own sessions at the same time.
+"""
+import asyncio
+
+import pytest
+
+from host_app.app.services import database
+
+
+def test_to_async_url():
+    """
+    GIVEN: Sync database URLs.
+    WHEN: They are mapped to async URLs.
+    THEN: Postgres uses asyncpg and SQLite uses aiosqlite.
+    """
+    assert database.to_async_url("postgresql://u:p@db:5432/host") == "postgresql+asyncpg://u:p@db:5432/host"
+    assert database.to_async_url("postgresql+psycopg2://u:p@db/host") == "postgresql+asyncpg://u:p@db/host"
+    assert database.to_async_url("sqlite:///./host.db") == "sqlite+aiosqlite:///./host.db"
+
+
+async def test_async_session_lifecycle(async_db):
+    """
+    GIVEN: The async engine.
+    WHEN: A session is created, a turn is saved, and the history is read back.
+    THEN: The history matches what the sync functions would return.
+    """
+    async with database.async_session_scope() as db_session:
+        session = await database.create_chat_session_async(db_session, 1, "System prompt", "gaming")
+        await database.save_message_async(db_session, session.id, "user", "Hello there.")
+        await database.save_turn_async(db_session, session.id, [("assistant", "General Kenobi."), ("user", "You are a bold one.")])
+
+    async with database.async_session_scope() as db_session:
+        history = await database.get_chat_history_async(db_session, session.id)
+        recent = await database.get_recent_chat_history_async(db_session, session.id, max_messages=1)
+
+    assert [m["content"] for m in history] == ["System prompt", "Hello there.", "General Kenobi.", "You are a bold one."]
+    assert recent == [history[0], history[-1]]
+
+
+async def test_concurrent_users_keep_their_histories_separate(async_db):
+    """
+    GIVEN: 20 simulated users, each with its own request-scoped session.
+    WHEN: They all play 5 turns concurrently.
+    THEN: Every session ends up with exactly its own messages, in order.
+    """
+    users, turns = 20, 5
+
+    async def play(user_index: int):
+        async with database.async_session_scope() as db_session:
+            session = await database.create_chat_session_async(db_session, 1, f"Prompt {user_index}", "gaming")
+        for turn in range(turns):
+            async with database.async_session_scope() as db_session:
+                await database.save_turn_async(db_session, session.id, [
+                    ("user", f"u{user_index}-t{turn}"), ("assistant", f"a{user_index}-t{turn}"),
+                ])
+                await asyncio.sleep(0)
+        return user_index, session.id
+
+    results = await asyncio.gather(*(play(i) for i in range(users)))
+
+    for user_index, session_id in results:
+        async with database.async_session_scope() as db_session:
+            history = await database.get_chat_history_async(db_session, session_id)
+        expected = [f"Prompt {user_index}"] + [
+            text for turn in range(turns) for text in (f"u{user_index}-t{turn}", f"a{user_index}-t{turn}")
+        ]
+        assert [m["content"] for m in history] == expected
@@ -0,0 +1,47 @@
+"""
+test_chat_window.py
+
+Unit tests for the windowed transcript rendering helpers in `host_app/app/app.py`.
+"""
+from host_app.app import app as host_main_app
+
+SYSTEM = {"role": "system", "content": "You are a GM."}
+
+
+def _messages(count):
+    return [{"role": "user", "content": f"m{i}"} for i in range(count)]
+
+
+def test_trim_window_keeps_system_message_and_recent_messages():
+    """
+    GIVEN: A window of three and no earlier pages loaded.
+    WHEN: Five messages are held.
+    THEN: The system message and the last three are kept; the rest are dropped.
+    """
+    trimmed = host_main_app.trim_window([SYSTEM] + _messages(5), [], window=3)
+    assert trimmed == [SYSTEM] + _messages(5)[2:]
+
+
+def test_trim_window_moves_overflow_into_loaded_earlier_pages():
+    """
+    GIVEN: A window of three and one earlier page already loaded.
+    WHEN: The window overflows by two messages.
+    THEN: The overflow is appended to the newest earlier page, so nothing
+          disappears from view.
+    """
+    earlier_pages = [[{"role": "user", "content": "old"}]]
+    trimmed = host_main_app.trim_window([SYSTEM] + _messages(5), earlier_pages, window=3)
+
+    assert [m["content"] for m in trimmed[1:]] == ["m2", "m3", "m4"]
+    assert [m["content"] for m in earlier_pages[0]] == ["old", "m0", "m1"]
+
+
+def test_transcript_markdown_renders_a_page_as_one_block():
+    """
+    GIVEN: A page of earlier messages.
+    WHEN: It is rendered.
+    THEN: Every message appears, in order, in a single markdown string.
+    """
+    markdown = host_main_app.transcript_markdown((("user", "I open the door."), ("assistant", "It creaks.")))
+    assert markdown.index("I open the door.") < markdown.index("It creaks.")
+    assert "**You**" in markdown and "**Assistant**" in markdown
@@ -135,4 +135,93 @@ def test_save_and_get_chat_history(db_session):
     assert history[1]['content'] == 'Hello there.'
 
     assert history[2]['role'] == 'assistant'
-    assert history[2]['content'] == 'General Kenobi.'
\ No newline at end of file
+    assert history[2]['content'] == 'General Kenobi.'
+
+def test_get_recent_chat_history_returns_system_message_and_tail(db_session):
+    """
+    GIVEN: A chat session with a system prompt and ten further messages.
+    WHEN: `get_recent_chat_history` is called with a limit of three messages.
+    THEN: It returns the system message followed by the last three messages,
+          in chronological order.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    for i in range(10):
+        database.save_message(db_session, session.id, "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+    history = database.get_recent_chat_history(db_session, session.id, max_messages=3)
+
+    assert [m["content"] for m in history] == ["System prompt", "message 7", "message 8", "message 9"]
+    assert history[0]["role"] == "system"
+
+
+def test_get_recent_chat_history_respects_token_budget(db_session):
+    """
+    GIVEN: A chat session whose messages are each roughly 25 tokens long.
+    WHEN: `get_recent_chat_history` is called with a 60-token budget, and then
+          with a budget smaller than a single message.
+    THEN: Only the messages that fit are returned, but the newest message is
+          always kept.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    for i in range(5):
+        database.save_message(db_session, session.id, "user", f"{i}" * 100)
+
+    history = database.get_recent_chat_history(db_session, session.id, max_tokens=60)
+    assert [m["content"][0] for m in history[1:]] == ["3", "4"]
+
+    history = database.get_recent_chat_history(db_session, session.id, max_tokens=1)
+    assert [m["content"][0] for m in history[1:]] == ["4"]
+
+
+def test_create_chat_session_commits_once(db_session, mocker):
+    """
+    GIVEN: A user.
+    WHEN: `create_chat_session` is called.
+    THEN: The session and its system message are written in a single commit.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    commit_spy = mocker.spy(db_session, "commit")
+
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+
+    assert commit_spy.call_count == 1
+    assert database.get_chat_history(db_session, session.id) == [{"role": "system", "content": "System prompt"}]
+
+
+def test_save_turn_writes_messages_in_one_transaction(db_session, mocker):
+    """
+    GIVEN: A chat session.
+    WHEN: A user message and the assistant reply are saved with `save_turn`.
+    THEN: Both are written with a single commit and come back in order.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    commit_spy = mocker.spy(db_session, "commit")
+
+    database.save_turn(db_session, session.id, [("user", "Hello there."), ("assistant", "General Kenobi.")])
+
+    assert commit_spy.call_count == 1
+    assert database.get_chat_history(db_session, session.id)[1:] == [
+        {"role": "user", "content": "Hello there."},
+        {"role": "assistant", "content": "General Kenobi."},
+    ]
+
+
+def test_get_messages_page_pages_backwards(db_session):
+    """
+    GIVEN: A chat session with ten messages after the system prompt.
+    WHEN: Pages of four are requested, skipping the newest three and then seven.
+    THEN: Each page holds the messages just before the skipped ones, in
+          chronological order, and the system prompt is never included.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    database.save_turn(db_session, session.id, [("user", f"message {i}") for i in range(10)])
+
+    first = database.get_messages_page(db_session, session.id, skip_newest=3, limit=4)
+    second = database.get_messages_page(db_session, session.id, skip_newest=7, limit=4)
+
+    assert [m["content"] for m in first] == ["message 3", "message 4", "message 5", "message 6"]
+    assert [m["content"] for m in second] == ["message 0", "message 1", "message 2"]
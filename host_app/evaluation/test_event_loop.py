@@ -0,0 +1,97 @@
+"""
+test_event_loop.py
+
+Unit tests for the background event loop in `host_app/app/services/event_loop.py`
+and for the pooled SDK client that relies on it.
+"""
+import asyncio
+
+import pytest
+
+from host_app.app.services import advertis_client, event_loop
+
+
+def test_run_executes_on_one_persistent_loop():
+    """
+    GIVEN: The background loop.
+    WHEN: Coroutines are run through the sync facade on separate "turns".
+    THEN: They return their results and all run on the same, still-running loop.
+    """
+    async def current_loop():
+        await asyncio.sleep(0)
+        return asyncio.get_running_loop()
+
+    first = event_loop.run(current_loop())
+    second = event_loop.run(current_loop())
+
+    assert first is second
+    assert first.is_running()
+    assert event_loop.get_background_loop() is event_loop.get_background_loop()
+
+
+def test_run_propagates_exceptions():
+    """
+    GIVEN: A coroutine that raises.
+    WHEN: It is run through the sync facade.
+    THEN: The exception is re-raised in the calling thread.
+    """
+    async def boom():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        event_loop.run(boom())
+
+
+def test_sdk_client_is_reused_across_turns():
+    """
+    GIVEN: The SDK running on the background loop.
+    WHEN: Its HTTP client is requested on two separate turns.
+    THEN: The same pooled client is returned both times.
+    """
+    async def client():
+        return advertis_client._get_client()
+
+    assert event_loop.run(client()) is event_loop.run(client())
+
+
+def test_iterate_bridges_async_generators():
+    """
+    GIVEN: An async generator that runs on the background loop.
+    WHEN: It is consumed through the sync `iterate` facade.
+    THEN: Its items are yielded in order, each produced on the background loop.
+    """
+    background = event_loop.get_background_loop().loop
+
+    async def tokens():
+        for token in ["a", "b", "c"]:
+            assert asyncio.get_running_loop() is background
+            yield token
+
+    assert list(event_loop.iterate(tokens())) == ["a", "b", "c"]
+
+
+def test_iterate_closes_the_stream_when_the_consumer_stops_early():
+    """
+    GIVEN: An async generator that holds a resource until it is closed.
+    WHEN: The sync consumer stops after the first item, once by breaking out
+          and once by raising.
+    THEN: The generator is closed on the background loop each time.
+    """
+    closed = []
+
+    async def stream():
+        try:
+            for token in ["a", "b", "c"]:
+                yield token
+        finally:
+            closed.append(asyncio.get_running_loop())
+
+    for token in event_loop.iterate(stream()):
+        break
+    assert closed == [event_loop.get_background_loop().loop]
+
+    with pytest.raises(RuntimeError):
+        for token in event_loop.iterate(stream()):
+            raise RuntimeError("st.write_stream failed")
+    assert len(closed) == 2
+
@@ -0,0 +1,66 @@
+"""
+test_fallback_llm.py
+
+Unit tests for the host app's fallback LLM in `host_app/app/services/fallback_llm.py`.
+The model client is replaced by a fake, so no OpenAI calls are made.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from host_app.app.services import fallback_llm
+
+HISTORY = [{"role": "system", "content": "You are a GM."}, {"role": "user", "content": "I look around."}]
+
+
+class FakeStreamingLLM:
+    def __init__(self, tokens, fail_after=None):
+        self.tokens = tokens
+        self.fail_after = fail_after
+
+    async def astream(self, history):
+        for i, token in enumerate(self.tokens):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError("connection reset")
+            yield SimpleNamespace(content=token)
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_llm_client_is_reused(monkeypatch):
+    """
+    GIVEN: No fallback client yet.
+    WHEN: The client is requested twice.
+    THEN: The same instance is returned.
+    """
+    monkeypatch.setattr(fallback_llm, "_llm", None)
+    assert fallback_llm.get_llm() is fallback_llm.get_llm()
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_non_empty_tokens(mocker):
+    """
+    GIVEN: A model that streams tokens, including an empty one.
+    WHEN: `stream_fallback_response` is consumed.
+    THEN: Each non-empty token is yielded in order.
+    """
+    mocker.patch.object(fallback_llm, "get_llm", return_value=FakeStreamingLLM(["Neon ", "", "hums."]))
+    assert await _collect(fallback_llm.stream_fallback_response(HISTORY)) == ["Neon ", "hums."]
+
+
+@pytest.mark.asyncio
+async def test_stream_error_before_first_token_yields_apology(mocker):
+    """
+    GIVEN: A model that fails before producing any tokens, and one that fails midway.
+    WHEN: `stream_fallback_response` is consumed.
+    THEN: The first yields the standard error message; the second keeps what
+          was already streamed and stops.
+    """
+    mocker.patch.object(fallback_llm, "get_llm", return_value=FakeStreamingLLM(["a"], fail_after=0))
+    chunks = await _collect(fallback_llm.stream_fallback_response(HISTORY))
+    assert chunks == ["I'm sorry, I've encountered an error and can't respond right now."]
+
+    mocker.patch.object(fallback_llm, "get_llm", return_value=FakeStreamingLLM(["a", "b"], fail_after=1))
+    assert await _collect(fallback_llm.stream_fallback_response(HISTORY)) == ["a"]
@@ -0,0 +1,108 @@
+"""
+test_history_cache.py
+
+Unit tests for the per-session chat history cache in
+`host_app/app/services/history_cache.py` and its use by the database helpers.
+They check LRU eviction across sessions, write-through from `save_message`
+and `create_chat_session`, and that the database is only read for cold sessions.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from host_app.app.services import database
+from host_app.app.services.database import Base
+from host_app.app.services.history_cache import HistoryCache, trim_history
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """An in-memory SQLite session, set up the same way as in test_database.py."""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """Replaces the module-level cache with a small, empty one."""
+    fresh = HistoryCache(max_sessions=2, max_messages=4)
+    monkeypatch.setattr(database, "history_cache", fresh)
+    return fresh
+
+
+def test_lru_eviction_across_sessions():
+    """
+    GIVEN: A cache that holds two sessions.
+    WHEN: Three sessions are cached, with the first one read in between.
+    THEN: The least recently used session is the one evicted.
+    """
+    cache = HistoryCache(max_sessions=2, max_messages=4)
+    cache.put("a", [{"role": "system", "content": "A"}])
+    cache.put("b", [{"role": "system", "content": "B"}])
+    assert cache.get("a") is not None
+    cache.put("c", [{"role": "system", "content": "C"}])
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_trim_history_keeps_system_message_and_budget():
+    """
+    GIVEN: A history with a system message and five turns.
+    WHEN: It is trimmed by message count and by token budget.
+    THEN: The system message is always kept, followed by the newest turns.
+    """
+    history = [{"role": "system", "content": "S"}] + [{"role": "user", "content": str(i) * 100} for i in range(5)]
+
+    assert [m["content"][0] for m in trim_history(history, max_messages=2)] == ["S", "3", "4"]
+    assert [m["content"][0] for m in trim_history(history, max_tokens=60)] == ["S", "3", "4"]
+
+
+def test_cached_history_reads_database_only_for_cold_sessions(cache, db_session, mocker):
+    """
+    GIVEN: A session created and written through the database helpers.
+    WHEN: Its history is requested on several turns.
+    THEN: The database is never read, every lookup is a hit, and the result
+          matches what the database holds.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    db_read = mocker.spy(database, "get_recent_chat_history")
+
+    for i in range(6):
+        database.save_message(db_session, session.id, "user", f"message {i}")
+        history = database.get_cached_chat_history(db_session, session.id, max_messages=4)
+
+    db_read.assert_not_called()
+    assert history == database.get_recent_chat_history(db_session, session.id, max_messages=4)
+    assert cache.stats()["hits"] == 6
+
+
+def test_cold_session_is_loaded_once(cache, db_session, mocker):
+    """
+    GIVEN: A session with messages that is not in the cache (e.g. after a restart).
+    WHEN: Its history is requested twice.
+    THEN: The first request reads the database and the second is served from memory.
+    """
+    user = database.get_or_create_dummy_user(db_session)
+    session = database.create_chat_session(db_session, user.id, "System prompt", "gaming")
+    database.save_message(db_session, session.id, "user", "Hello there.")
+    cache.clear()
+    db_read = mocker.spy(database, "get_recent_chat_history")
+
+    first = database.get_cached_chat_history(db_session, session.id)
+    second = database.get_cached_chat_history(db_session, session.id)
+
+    assert db_read.call_count == 1
+    assert first == second == [
+        {"role": "system", "content": "System prompt"},
+        {"role": "user", "content": "Hello there."},
+    ]
+    assert cache.stats()["misses"] == 1
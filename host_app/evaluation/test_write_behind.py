@@ -0,0 +1,90 @@
+"""
+test_write_behind.py
+
+Unit tests for the background batching writer in
+`host_app/app/services/write_behind.py`. The database is replaced by a
+recording callable, so these tests only check batching, ordering, flushing
+and failure handling.
+"""
+import threading
+import time
+
+from host_app.app.services.write_behind import WriteBehindWriter
+
+
+def test_items_are_batched_in_order_and_flushed():
+    """
+    GIVEN: A writer with a batch size of 3.
+    WHEN: Seven items are submitted and the writer is flushed.
+    THEN: All items are written in submission order, in batches of at most 3.
+    """
+    batches = []
+    writer = WriteBehindWriter(batches.append, max_batch=3, max_delay_seconds=0.5)
+    for item in range(7):
+        writer.submit(item)
+    writer.flush()
+    writer.close()
+
+    assert [item for batch in batches for item in batch] == list(range(7))
+    assert max(len(batch) for batch in batches) <= 3
+
+
+def test_partial_batch_is_written_after_max_delay():
+    """
+    GIVEN: A writer with a large batch size and a short delay.
+    WHEN: A single item is submitted.
+    THEN: It is written within roughly the delay, without waiting for more items.
+    """
+    written = threading.Event()
+    writer = WriteBehindWriter(lambda batch: written.set(), max_batch=100, max_delay_seconds=0.02)
+    started = time.monotonic()
+    writer.submit("only")
+
+    assert written.wait(timeout=1.0)
+    assert time.monotonic() - started < 0.5
+    writer.close()
+
+
+def test_close_writes_pending_items_and_failed_batches_are_retried():
+    """
+    GIVEN: A writer whose first write attempt fails.
+    WHEN: Items are submitted and the writer is closed right away.
+    THEN: The item is retried whole and written before `close` returns.
+    """
+    attempts = []
+
+    def flaky_write(batch):
+        attempts.append(list(batch))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    writer = WriteBehindWriter(flaky_write, max_batch=10, max_delay_seconds=0.01)
+    writer.submit(["a", "b"])
+    writer.close()
+
+    assert len(attempts) == 2
+    assert attempts[-1] == [["a", "b"]]
+
+
+def test_a_failing_item_is_dropped_without_the_rest_of_its_batch():
+    """
+    GIVEN: A writer whose database rejects any batch containing one bad turn.
+    WHEN: Three turns, one of them bad, are written in the same batch.
+    THEN: The two good turns are written, and only the bad one is dropped
+          and reported to `on_drop`.
+    """
+    written, dropped = [], []
+
+    def write(batch):
+        if ["bad"] in batch:
+            raise RuntimeError("constraint violation")
+        written.extend(batch)
+
+    writer = WriteBehindWriter(write, max_batch=10, max_delay_seconds=0.05, max_retries=2, on_drop=dropped.append)
+    for turn in (["u1", "a1"], ["bad"], ["u2", "a2"]):
+        writer.submit(turn)
+    writer.flush()
+    writer.close()
+
+    assert written == [["u1", "a1"], ["u2", "a2"]]
+    assert dropped == [["bad"]]
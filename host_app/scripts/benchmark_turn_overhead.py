@@ -0,0 +1,101 @@
+# host_app/scripts/benchmark_turn_overhead.py
+"""
+Measures the per-turn overhead of how the host app drives async code, using a
+local stub of the two Advertis endpoints so only client-side costs are timed.
+
+  asyncio.run  - the old behaviour: a fresh event loop and a fresh HTTP
+                 client (new TCP connections) on every turn.
+  background   - one long-lived loop thread with the SDK's pooled client.
+
+Usage:
+    python host_app/scripts/benchmark_turn_overhead.py --turns 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the repo root to the path to allow host_app imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import httpx
+
+from host_app.app import config
+from host_app.app.services import advertis_client, event_loop
+
+HISTORY = [{"role": "system", "content": "You are a GM."}, {"role": "user", "content": "I enter the bar."}]
+
+
+class StubAdvertis(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/check-opportunity"):
+            body = {"proceed": True, "reason": "ok"}
+        else:
+            body = {"status": "inject", "response_text": "A bottle of Jack Daniel's sits on the bar."}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+async def fallback(history):
+    return "fallback"
+
+
+async def one_turn():
+    return await advertis_client.get_monetized_response("bench", "gaming", HISTORY, fallback)
+
+
+async def one_turn_fresh_client():
+    # What the SDK did before: a new client, and so new connections, per call.
+    async with httpx.AsyncClient() as client:
+        advertis_client._client, advertis_client._client_loop = client, asyncio.get_running_loop()
+        return await one_turn()
+
+
+def time_turns(run_turn, turns: int):
+    samples = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        run_turn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAdvertis)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.ADVERTIS_API_URL = f"http://127.0.0.1:{server.server_port}"
+
+    results = {
+        "asyncio.run": time_turns(lambda: asyncio.run(one_turn_fresh_client()), args.turns),
+        "background": time_turns(lambda: event_loop.run(one_turn()), args.turns),
+    }
+    for mode, samples in results.items():
+        samples.sort()
+        print(f"{mode:>12} | p50 {statistics.median(samples):6.2f} ms | "
+              f"p95 {samples[int(len(samples) * 0.95) - 1]:6.2f} ms | mean {statistics.mean(samples):6.2f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()